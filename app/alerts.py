@@ -0,0 +1,291 @@
+#Path: app/alerts.py
+
+import asyncio
+import discord
+from bisect import bisect_left, bisect_right
+from discord import app_commands
+from settings import *
+from store import store
+from jobs import jobs, reply
+from cripto import token_autocomplete, pair_autocomplete
+from utils import debug, time_now
+import metrics
+
+TRIGGERED = metrics.registry.counter("soa_alerts_triggered_total", "Price alerts triggered.")
+ACTIVE = metrics.registry.gauge("soa_alerts_active", "Price alerts waiting for their threshold.")
+
+
+class AlertBook:
+    """
+    Price alerts kept in per symbol sorted arrays.
+
+    Alerts waiting for the price to go above a threshold are sorted ascending,
+    a tick at `price` triggers exactly the prefix with threshold <= price.
+    Alerts waiting for the price to go below are sorted the same way and a tick
+    triggers the suffix with threshold >= price. Finding the crossed alerts is a
+    bisect, so a tick only touches the alerts it triggers.
+
+    Alerts are dicts: id, user, channel (None for a DM), symbol, direction
+    ("above" or "below"), price and date.
+    """
+    def __init__(self, alerts=()) -> None:
+        self.above = {}
+        self.below = {}
+        self.ids = {}
+        for alert in alerts:
+            self.add(alert)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def symbols(self):
+        return set(self.above) | set(self.below)
+
+    def add(self, alert):
+        side = self.above if alert["direction"] == "above" else self.below
+        thresholds, alerts = side.setdefault(alert["symbol"], ([], []))
+        # keys are (price, id) so equal thresholds keep a stable order
+        key = (alert["price"], alert["id"])
+        index = bisect_left(thresholds, key)
+        thresholds.insert(index, key)
+        alerts.insert(index, alert)
+        self.ids[alert["id"]] = alert
+
+    def remove(self, alert_id):
+        alert = self.ids.pop(alert_id, None)
+        if alert is None:
+            return None
+        side = self.above if alert["direction"] == "above" else self.below
+        thresholds, alerts = side[alert["symbol"]]
+        index = bisect_left(thresholds, (alert["price"], alert["id"]))
+        del thresholds[index], alerts[index]
+        if not thresholds:
+            del side[alert["symbol"]]
+        return alert
+
+    def tick(self, symbol, price):
+        """Remove and return the alerts of `symbol` crossed by `price`."""
+        triggered = []
+        if symbol in self.above:
+            thresholds, alerts = self.above[symbol]
+            index = bisect_right(thresholds, (price, float("inf")))
+            if index:
+                triggered += alerts[:index]
+                del thresholds[:index], alerts[:index]
+                if not thresholds:
+                    del self.above[symbol]
+        if symbol in self.below:
+            thresholds, alerts = self.below[symbol]
+            index = bisect_left(thresholds, (price, float("-inf")))
+            if index < len(thresholds):
+                triggered += alerts[index:]
+                del thresholds[index:], alerts[index:]
+                if not thresholds:
+                    del self.below[symbol]
+        for alert in triggered:
+            del self.ids[alert["id"]]
+        return triggered
+
+
+class AlertEngine:
+    """
+    Evaluates the price alerts against the shared ticker snapshot and delivers them.
+
+    The alerts are stored in the "alerts" store document, every change is a
+    compare and set on it so workers adding alerts don't overwrite each other.
+    The commands only change the document (on the job pool). Only the primary
+    worker runs the feed, which owns the book: it reloads it when another
+    worker changed the document, and the store IO runs on a thread so the
+    loop never waits for it.
+
+    Attributes:
+        client (discord.Client): The Discord client, used to deliver the alerts.
+        cripto (CriptoCurrency): Provides the ticker snapshot.
+        book (AlertBook): The alerts waiting for their threshold.
+    """
+    def __init__(self, client, cripto) -> None:
+        self.client = client
+        self.cripto = cripto
+        self.book = AlertBook()
+        self.version = None
+        ACTIVE.set_function(lambda: len(self.book))
+
+    def changed(self, version):
+        """(version, alerts) of the stored alerts, None if they are still at `version`. Blocking."""
+        current = store.version("alerts")
+        if current == version:
+            return None
+        return current, store.load("alerts") or []
+
+    async def refresh(self):
+        """Reload the book when the stored alerts changed."""
+        changed = await asyncio.to_thread(self.changed, self.version)
+        if changed:
+            self.version, alerts = changed
+            self.book = AlertBook(alerts)
+
+    def mutate(self, function, retries=5):
+        """Apply `function(alerts)` to the stored list of alerts and save it with a compare and set. Blocking.
+
+        Returns:
+            tuple: (result of the function, version it was applied to, version saved).
+        """
+        for _ in range(retries):
+            expected = store.version("alerts")
+            alerts = store.load("alerts") or []
+            result = function(alerts)
+            version = store.save_if("alerts", alerts, expected)
+            if version is not None:
+                return result, expected, version
+        raise RuntimeError("Too many concurrent changes to the alerts")
+
+    def create(self, user, symbol, direction, price, channel=None):
+        """Store a new alert, returns it (or None if the user has too many)."""
+        def add(alerts):
+            if sum(1 for alert in alerts if alert["user"] == user.id) >= ALERTS_PER_USER:
+                return None
+            alert = {"id": max((a["id"] for a in alerts), default=0) + 1, "user": user.id, "channel": channel,
+                     "symbol": symbol, "direction": direction, "price": price, "date": time_now()}
+            alerts.append(alert)
+            return alert
+        return self.mutate(add)[0]
+
+    def delete(self, user, alert_id):
+        def remove(alerts):
+            for alert in alerts:
+                if alert["id"] == alert_id and alert["user"] == user.id:
+                    alerts.remove(alert)
+                    return alert
+            return None
+        return self.mutate(remove)[0]
+
+    def user_alerts(self, user):
+        """The stored alerts of a user. Blocking."""
+        return [alert for alert in store.load("alerts") or [] if alert["user"] == user.id]
+
+    def process(self, ticks):
+        """Feed (symbol, price) ticks to the book.
+
+        Returns:
+            list: The alerts triggered, removed from the book.
+        """
+        triggered = []
+        for symbol, price in ticks:
+            triggered += self.book.tick(symbol, price)
+        return triggered
+
+    def snapshot_ticks(self, tickers):
+        """The ticks of the symbols that have alerts, taken from a ticker snapshot."""
+        for symbol in self.book.symbols():
+            ticker = tickers.get(symbol)
+            if ticker:
+                yield symbol, float(ticker["lastPrice"])
+
+    async def run(self, interval=ALERT_INTERVAL):
+        """Evaluate the alerts every `interval` seconds, forever."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh()
+                if not len(self.book):
+                    continue
+                tickers = await self.cripto.tickers.get()
+                triggered = self.process(self.snapshot_ticks(tickers))
+                if triggered:
+                    await self.discard(triggered)
+                    for alert in triggered:
+                        price = float(tickers[alert["symbol"]]["lastPrice"])
+                        await self.deliver(alert, price)
+            except Exception as e:
+                debug(f"Failed to evaluate alerts {e}", function="AlertEngine.run", type="ERROR")
+
+    async def discard(self, triggered):
+        """Remove the triggered alerts (already out of the book) from the store.
+
+        The book is kept when the save was on top of its version, any other
+        change reloads it on the next refresh. When the save fails the alerts
+        go back to the book, they are still stored and trigger again.
+        """
+        ids = {alert["id"] for alert in triggered}
+        def remove(alerts):
+            alerts[:] = [alert for alert in alerts if alert["id"] not in ids]
+        try:
+            _, expected, version = await asyncio.to_thread(self.mutate, remove)
+        except Exception:
+            for alert in triggered:
+                self.book.add(alert)
+            raise
+        if expected == self.version:
+            self.version = version
+
+    async def deliver(self, alert, price):
+        TRIGGERED.inc()
+        embed = discord.Embed(
+            title=f"🔔 {alert['symbol']} is {alert['direction']} {alert['price']:g}",
+            description=f"Price now: **{price:g}**\nAlert #{alert['id']} set on {alert['date']}",
+            color=discord.Color.gold()
+        )
+        embed.set_thumbnail(url=BINANCE_PNG)
+        embed.set_footer(text=f"{TITLE} | {VERSION}")
+        try:
+            if alert["channel"]:
+                await self.client.get_channel(alert["channel"]).send(f"<@{alert['user']}>", embed=embed)
+            else:
+                user = self.client.get_user(alert["user"]) or await self.client.fetch_user(alert["user"])
+                await user.send(embed=embed)
+            debug(f"Alert {alert['id']} delivered to {alert['user']}", function="AlertEngine.deliver", type="INFO")
+        except (discord.HTTPException, AttributeError) as e:
+            debug(f"Failed to deliver alert {alert['id']} {e}", function="AlertEngine.deliver", type="ERROR")
+
+    @app_commands.describe(token=TOKEN_TXT, pair=PAIR_TXT, direction="above or below", price="The price that triggers the alert",
+                           here="Send the alert on this channel instead of a DM")
+    @app_commands.autocomplete(token=token_autocomplete, pair=pair_autocomplete)
+    async def alert(self, interaction, token: str, pair: str = "USDT", direction: str = "above", price: float = 0.0, here: bool = False):
+        """Get notified when a token crosses a price."""
+        symbol = f"{token}{pair}".upper()
+        direction = direction.lower()
+        if direction not in ("above", "below") or price <= 0:
+            await reply(interaction, "Usage: /alert btc usdt above 70000")
+            return False
+
+        tickers = await jobs.wait(interaction, self.cripto.tickers.get(), progress=f"Checking {symbol}...")
+        if symbol not in tickers:
+            await reply(interaction, "Token not found!")
+            return False
+        now = float(tickers[symbol]["lastPrice"])
+        # the next tick would trigger it at once
+        if (now >= price) if direction == "above" else (now <= price):
+            await reply(interaction, f"{symbol} is already {direction} {price:g} (now {now:g})")
+            return False
+
+        channel = interaction.channel_id if here else None
+        alert = await jobs.run(interaction, self.create, interaction.user, symbol, direction, price, channel)
+        if alert is None:
+            await reply(interaction, f"You can have at most {ALERTS_PER_USER} alerts, remove one with /alerts remove")
+            return False
+        debug(f"{interaction.user} created alert {alert['id']} {symbol} {direction} {price}", function="AlertEngine.alert", type="CMD")
+        await reply(interaction, f"Alert #{alert['id']} set: {symbol} {direction} {price:g} (now {now:g})")
+        return True
+
+    @app_commands.describe(action="list (default) or remove", alert="The alert number to remove")
+    async def alerts(self, interaction, action: str = "list", alert: int = 0):
+        """List or remove your price alerts."""
+        if action.lower() == "remove":
+            removed = await jobs.run(interaction, self.delete, interaction.user, alert)
+            message = f"Alert #{alert} removed" if removed else f"Alert #{alert} not found"
+            debug(f"{interaction.user} removed alert {alert}: {bool(removed)}", function="AlertEngine.alerts", type="CMD")
+            await reply(interaction, message)
+            return bool(removed)
+
+        user_alerts = sorted(await jobs.run(interaction, self.user_alerts, interaction.user), key=lambda a: a["id"])
+        lines = [f"**#{a['id']}** {a['symbol']} {a['direction']} {a['price']:g}" + (" (channel)" if a["channel"] else "")
+                 for a in user_alerts]
+        embed = discord.Embed(
+            title=f"{interaction.user.name.upper()} Price Alerts",
+            description="\n".join(lines) or "You have no alerts, create one with /alert btc usdt above 70000",
+            color=discord.Color.green()
+        )
+        embed.set_footer(text=f"{TITLE} {VERSION} | {len(user_alerts)}/{ALERTS_PER_USER}")
+        debug(f"{interaction.user} listed alerts", function="AlertEngine.alerts", type="CMD")
+        await reply(interaction, embed=embed)
+        return True
@@ -0,0 +1,553 @@
+#Path: app/benchmark.py
+
+"""
+Offline benchmarks for the bot.
+
+Usage:
+    >>> python app/benchmark.py startup --runs 5
+    >>> python app/benchmark.py alerts --alerts 100000 --ticks recorded_ticks.jsonl
+    >>> python app/benchmark.py format --symbols 2000
+    >>> python app/benchmark.py market --symbols 2000
+    >>> python app/benchmark.py indicators --candles 1000
+    >>> python app/benchmark.py faults --requests 50
+    >>> python app/benchmark.py load --requests 200 --concurrency 20
+    >>> python app/benchmark.py parse --fixtures app/fixtures
+    >>> python app/benchmark.py gateway --guilds 20 --members 2000 --events 100000
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import time
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+APP_PATH = Path(__file__).parent
+
+
+def report(name, samples, unit="s"):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f"{name:<28} n={len(samples):<6} min={samples[0]:.4f}{unit} "
+          f"median={statistics.median(samples):.4f}{unit} p95={p95:.4f}{unit} max={samples[-1]:.4f}{unit}")
+
+def bench_startup(args):
+    """Time importing main.py (which builds the App) in a fresh interpreter, without connecting to Discord."""
+    code = ("import time; t = time.perf_counter(); import main; "
+            "print(time.perf_counter() - t)")
+    samples = []
+    for _ in range(args.runs):
+        out = subprocess.run([sys.executable, "-c", code], cwd=APP_PATH, capture_output=True, text=True, check=True)
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    report("startup (import + App())", samples)
+
+def load_ticks(path):
+    """Recorded ticks, one {"symbol": ..., "price": ...} json per line."""
+    with open(path, "r") as f:
+        return [(tick["symbol"], float(tick["price"])) for tick in map(json.loads, f) if tick]
+
+def generate_ticks(symbols, count, seed=0):
+    """Random walk ticks around 100 for each symbol, a stand in for a recorded feed."""
+    rng = random.Random(seed)
+    prices = dict.fromkeys(symbols, 100.0)
+    ticks = []
+    for _ in range(count):
+        symbol = rng.choice(symbols)
+        prices[symbol] *= 1 + rng.gauss(0, 0.002)
+        ticks.append((symbol, prices[symbol]))
+    return ticks
+
+def bench_alerts(args):
+    """Replay a tick stream against `--alerts` alerts, time the evaluation of each tick and check it against a brute force scan."""
+    from alerts import AlertBook
+    ticks = load_ticks(args.ticks) if args.ticks else generate_ticks([f"TK{i}USDT" for i in range(200)], 100000)
+    symbols = sorted({symbol for symbol, _ in ticks})
+    rng = random.Random(1)
+    alerts = [{"id": i, "user": i % 1000, "channel": None, "symbol": rng.choice(symbols),
+               "direction": rng.choice(("above", "below")), "price": 100 * rng.uniform(0.9, 1.1), "date": ""}
+              for i in range(args.alerts)]
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        book = AlertBook(alerts)
+        build = time.perf_counter() - start
+        samples, triggered = [], 0
+        for symbol, price in ticks:
+            start = time.perf_counter()
+            triggered += len(book.tick(symbol, price))
+            samples.append(time.perf_counter() - start)
+        print(f"built {len(alerts)} alerts in {build:.3f}s, {len(ticks)} ticks, {triggered} triggered")
+        report("alerts tick", [sample * 1e6 for sample in samples], unit="us")
+    mismatches = replay_alerts(alerts, ticks)
+    print(f"replay: {len(ticks) - mismatches}/{len(ticks)} ticks trigger the same alerts as a brute force scan")
+    if mismatches:
+        sys.exit(1)
+
+def replay_alerts(alerts, ticks):
+    """Replay the ticks against an AlertBook and a scan of every pending alert of the symbol, returns the ticks where they differ."""
+    from alerts import AlertBook
+    book, pending, mismatches = AlertBook(alerts), {}, 0
+    for alert in alerts:
+        pending.setdefault(alert["symbol"], []).append(alert)
+    for symbol, price in ticks:
+        crossed = {alert["id"] for alert in pending.get(symbol, ())
+                   if (price >= alert["price"] if alert["direction"] == "above" else price <= alert["price"])}
+        if crossed:
+            pending[symbol] = [alert for alert in pending[symbol] if alert["id"] not in crossed]
+        if {alert["id"] for alert in book.tick(symbol, price)} != crossed:
+            mismatches += 1
+    return mismatches
+
+def decimal_format(ticker, keys):
+    """The Decimal quantize path get_tkpair used before the tick size formatting."""
+    from decimal import Decimal
+    info = dict(ticker)
+    for key in keys:
+        info[key] = Decimal(info[key])
+        if info[key] > 1:
+            info[key] = info[key].quantize(Decimal("0.00"))
+        else:
+            info[key] = info[key].quantize(Decimal("0.0000001"))
+    return info
+
+def bench_format(args):
+    """Format `--symbols` random tickers with the Decimal path and format_price."""
+    from settings import PRICE_KEYS
+    from ticker import format_price
+    keys = PRICE_KEYS + ("volume",)
+    rng = random.Random(0)
+    tickers = [{key: f"{10 ** rng.uniform(-6, 5):.8f}" for key in keys} for _ in range(args.symbols)]
+    decimals = [rng.choice((2, 4, 8)) for _ in tickers]
+    timings = {"decimal": [], "format_price": []}
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        for ticker in tickers:
+            decimal_format(ticker, keys)
+        timings["decimal"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for ticker, d in zip(tickers, decimals):
+            {key: format_price(ticker[key], d) for key in keys}
+        timings["format_price"].append(time.perf_counter() - start)
+    for name, samples in timings.items():
+        report(f"{name} ({args.symbols} tickers)", samples)
+
+def fake_market(count, quote="USDT", seed=0):
+    """Exchange info and 24h tickers of `count` random symbols quoted in `quote`."""
+    rng = random.Random(seed)
+    info = {"symbols": [{"symbol": f"TK{i}{quote}", "status": "TRADING", "baseAsset": f"TK{i}", "quoteAsset": quote,
+                         "filters": [{"filterType": "PRICE_FILTER", "tickSize": rng.choice(("0.01", "0.0001", "0.00000001"))}]}
+                        for i in range(count)]}
+    tickers = {f"TK{i}{quote}": {"symbol": f"TK{i}{quote}", "lastPrice": f"{10 ** rng.uniform(-6, 5):.8f}",
+                                 "priceChangePercent": f"{rng.gauss(0, 5):.3f}", "quoteVolume": f"{rng.uniform(0, 1e8):.2f}"}
+               for i in range(count)}
+    return info, tickers
+
+def bench_market(args):
+    """Time the /market aggregation over `--symbols` symbols, without the embed."""
+    from cripto import CriptoCurrency
+    from ticker import SymbolCatalog
+    info, tickers = fake_market(args.symbols)
+    cripto = CriptoCurrency(None)
+    cripto.catalog = SymbolCatalog()
+    cripto.catalog.build(info)
+    cripto.market_overview(tickers)
+    samples = []
+    for _ in range(max(args.runs, 20)):
+        start = time.perf_counter()
+        cripto.market_overview(tickers)
+        samples.append(time.perf_counter() - start)
+    report(f"market ({args.symbols} symbols)", samples)
+
+def bench_indicators(args):
+    """Compare recomputing the indicators of `--candles` klines with extending them by one new candle."""
+    import numpy as np
+    from indicators import Indicators, IndicatorEngine
+    rng = random.Random(0)
+    closes = [100.0]
+    for _ in range(args.candles):
+        closes.append(closes[-1] * (1 + rng.gauss(0, 0.02)))
+    times, prices = np.arange(len(closes), dtype=np.int64) * 60000, np.array(closes)
+    full, extend = [], []
+    for _ in range(max(args.runs, 20)):
+        start = time.perf_counter()
+        Indicators(closes)
+        full.append(time.perf_counter() - start)
+
+        engine = IndicatorEngine()
+        engine.get("BENCH", "1m", times[:-1], prices[:-1])
+        start = time.perf_counter()
+        engine.get("BENCH", "1m", times, prices)
+        extend.append(time.perf_counter() - start)
+    report(f"indicators full ({args.candles})", full)
+    report("indicators new candle", extend)
+
+class FaultyUpstream:
+    """
+    Local HTTP stub with fault injection, answers {"value": n} on every path.
+
+    Attributes:
+        latency (float): Seconds added to every answer.
+        error_rate (float): Share of the requests answered with a 503.
+        down (bool): Every request answered with a 503.
+    """
+    def __init__(self, seed=0) -> None:
+        self.latency = 0.0
+        self.error_rate = 0.0
+        self.down = False
+        self.requests = 0
+        self.rng = random.Random(seed)
+        self.runner = None
+        self.url = None
+
+    async def handle(self, request):
+        from aiohttp import web
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        if self.down or self.rng.random() < self.error_rate:
+            return web.Response(status=503, text="injected fault")
+        return web.json_response({"value": self.requests})
+
+    async def start(self):
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_get("/{path:.*}", self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+        return self
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+async def timed(coroutine):
+    """(seconds, result or the exception raised) of a coroutine."""
+    start = time.perf_counter()
+    try:
+        result = await coroutine
+    except Exception as e:
+        result = e
+    return time.perf_counter() - start, result
+
+def check(name, ok):
+    print(f"{'ok' if ok else 'FAIL':<5}{name}")
+    return ok
+
+async def run_faults(args):
+    from net import HttpPool, CircuitOpen, UpstreamError
+    from cache import StaleCache
+    stub = await FaultyUpstream().start()
+    policy = {"timeout": 1, "retries": 1, "backoff": 0.01, "threshold": 3, "cooldown": 1}
+    pool = await HttpPool(policies={"stub": policy}, default=policy).start()
+    cache = StaleCache("stub", ttl=0, max_age=3600)
+    load = lambda: pool.get("stub", stub.url + "/value")
+    results = []
+    try:
+        healthy = [await timed(load()) for _ in range(args.requests)]
+        report("healthy request", [t for t, _ in healthy])
+        await cache.get("value", load)
+
+        stub.latency, stub.error_rate = 0.02, 0.3
+        flaky = [await timed(load()) for _ in range(args.requests)]
+        report("30% errors request", [t for t, _ in flaky])
+        results.append(check("retries absorb most injected errors",
+                             sum(isinstance(r, UpstreamError) for _, r in flaky) < args.requests * 0.3))
+
+        stub.latency, stub.error_rate, stub.down = 0.0, 0.0, True
+        pool.breakers.clear()
+        failing = []
+        while not isinstance(failing[-1][1] if failing else None, CircuitOpen) and len(failing) < 50:
+            failing.append(await timed(load()))
+        results.append(check(f"circuit opens after {policy['threshold']} failed requests", len(failing) == policy["threshold"] + 1))
+        before = stub.requests
+        open_circuit = [await timed(load()) for _ in range(args.requests)]
+        report("down request (retries)", [t for t, _ in failing[:-1]])
+        report("open circuit request", [t * 1e6 for t, _ in open_circuit], unit="us")
+        results.append(check("open circuit fails fast without requests",
+                             stub.requests == before and all(isinstance(r, CircuitOpen) for _, r in open_circuit)))
+
+        stale = [await timed(cache.get("value", load)) for _ in range(args.requests)]
+        report("stale cache while down", [t * 1e6 for t, _ in stale], unit="us")
+        results.append(check("stale value served while down", all(r[2] and r[0]["value"] for _, r in stale)))
+
+        stub.down = False
+        await asyncio.sleep(policy["cooldown"])
+        _, probe = await timed(load())
+        results.append(check("half open probe closes the circuit", isinstance(probe, dict)))
+        await asyncio.sleep(0.05)
+        await cache.get("value", load)
+        await asyncio.sleep(0.05)
+        results.append(check("background refresh replaces the stale value", cache.entries["value"][0]["value"] > stale[-1][1][0]["value"]))
+    finally:
+        await pool.close()
+        await stub.stop()
+    return all(results)
+
+def bench_faults(args):
+    """Run an HttpPool and a StaleCache against a local stub injecting latency, errors and downtime."""
+    if not asyncio.run(run_faults(args)):
+        sys.exit(1)
+
+def bench_load(args):
+    """Drive the slash commands with fake interactions against local upstream stubs, see loadtest.py."""
+    import loadtest
+    scenarios = args.commands.split(",") if args.commands else loadtest.LoadTest.SCENARIOS
+    unknown = set(scenarios) - set(loadtest.LoadTest.SCENARIOS)
+    if unknown:
+        sys.exit(f"Unknown commands {', '.join(sorted(unknown))}, choose from {', '.join(loadtest.LoadTest.SCENARIOS)}")
+    if not asyncio.run(loadtest.main(scenarios, args.requests, args.concurrency, args.latency,
+                                     args.fixtures, args.latency_scale, args.verbose)):
+        sys.exit(1)
+
+def bench_parse(args):
+    """Time the parsing and normalization of recorded payloads (see fixtures.py), at their real sizes."""
+    from fixtures import FIXTURES_PATH, load_fixtures, fixture_body
+    files = sorted(Path(args.fixtures or FIXTURES_PATH).glob("*.jsonl.gz"))
+    if not files:
+        sys.exit(f"No fixtures in {args.fixtures or FIXTURES_PATH}, record some with: python app/fixtures.py record")
+    recorded = {}
+    for file in files:
+        for entry in load_fixtures(file):
+            if entry["status"] == 200 and "json" in entry["content_type"]:
+                recorded.setdefault((file.name.split(".")[0], entry["path"]), fixture_body(entry))
+    runs = max(args.runs, 20)
+    for (upstream, path), body in sorted(recorded.items(), key=lambda item: -len(item[1]))[:10]:
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            json.loads(body)
+            samples.append(time.perf_counter() - start)
+        report(f"json {upstream}{path[:20]} {len(body) // 1024}KB", samples)
+
+    info, tickers = recorded.get(("binance", "/api/v3/exchangeInfo")), recorded.get(("binance", "/api/v3/ticker/24hr"))
+    if info and tickers:
+        from settings import PRICE_KEYS
+        from ticker import SymbolCatalog, TickerSnapshot, format_price
+        from cripto import CriptoCurrency
+        info, tickers = json.loads(info), json.loads(tickers)
+        tickers = tickers if isinstance(tickers, list) else [tickers]
+        timings = {"catalog build": [], "ticker snapshot": [], "format_price": [], "market overview": []}
+        cripto = CriptoCurrency(None)
+        async def fetch():
+            return tickers
+
+        loop = asyncio.new_event_loop()
+        for _ in range(runs):
+            catalog = SymbolCatalog()
+            start = time.perf_counter()
+            catalog.build(info)
+            timings["catalog build"].append(time.perf_counter() - start)
+            snapshot = TickerSnapshot(fetch, ttl=float("inf"))
+            start = time.perf_counter()
+            loop.run_until_complete(snapshot.load())
+            timings["ticker snapshot"].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            for ticker in tickers:
+                decimals = catalog.decimals(ticker["symbol"])[0]
+                {key: format_price(ticker[key], decimals) for key in PRICE_KEYS if key in ticker}
+            timings["format_price"].append(time.perf_counter() - start)
+            cripto.catalog = catalog
+            start = time.perf_counter()
+            cripto.market_overview(snapshot.tickers)
+            timings["market overview"].append(time.perf_counter() - start)
+        loop.close()
+        for name, samples in timings.items():
+            report(f"{name} ({len(tickers)} tickers)", samples)
+
+    klines = [json.loads(body) for (upstream, path), body in recorded.items() if path == "/api/v3/klines"]
+    if klines:
+        from indicators import Indicators
+        closes = [float(kline[4]) for kline in max(klines, key=len)]
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            Indicators(closes)
+            samples.append(time.perf_counter() - start)
+        report(f"indicators ({len(closes)} klines)", samples)
+
+def gateway_events(guilds, members, count, seed=0):
+    """
+    A generated gateway stream, (event, data) like the "t" and "d" of the
+    dispatches: GUILD_CREATE and GUILD_MEMBERS_CHUNK of `guilds` servers of
+    `members` members, then `count` events of busy servers, mostly presence
+    updates, messages and typing.
+    """
+    rng = random.Random(seed)
+    user = lambda i: {"id": str(10 ** 17 + i), "username": f"user{i}", "discriminator": "0", "avatar": None, "global_name": None}
+    member = lambda g, i: {"user": user(i), "roles": [str(g * 10 + i % 3)], "joined_at": "2020-01-01T00:00:00+00:00",
+                           "deaf": False, "mute": False, "flags": 0}
+    voice = lambda g, i, channel: {"guild_id": str(g), "channel_id": channel, "user_id": user(i)["id"], "session_id": "s",
+                                   "deaf": False, "mute": False, "self_deaf": False, "self_mute": False, "self_video": False,
+                                   "suppress": False, "request_to_speak_timestamp": None, "member": member(g, i)}
+    events = []
+    for g in range(1, guilds + 1):
+        text, speak = str(g * 1000 + 1), str(g * 1000 + 2)
+        users = range(g * members, (g + 1) * members)
+        events.append(("GUILD_CREATE", {
+            "id": str(g), "name": f"guild{g}", "owner_id": user(0)["id"], "member_count": members, "large": True, "unavailable": False,
+            "features": [], "emojis": [], "stickers": [], "threads": [], "stage_instances": [], "guild_scheduled_events": [],
+            "roles": [{"id": str(g * 10 + r), "name": f"role{r}", "permissions": "0", "position": r, "color": 0, "hoist": False,
+                       "managed": False, "mentionable": False} for r in range(3)],
+            "channels": [{"id": text, "type": 0, "name": "general", "position": 0, "permission_overwrites": []},
+                         {"id": speak, "type": 2, "name": "music", "position": 1, "permission_overwrites": [], "bitrate": 64000, "user_limit": 0}],
+            "members": [member(g, i) for i in users[:members // 10]],
+            "presences": [{"user": {"id": user(i)["id"]}, "status": "online", "activities": [], "client_status": {"desktop": "online"}}
+                          for i in users[:members // 10]],
+            "voice_states": [voice(g, i, speak) for i in users[:5]],
+        }))
+        events.append(("GUILD_MEMBERS_CHUNK", {"guild_id": str(g), "members": [member(g, i) for i in users], "chunk_index": 0, "chunk_count": 1}))
+    kinds = ("PRESENCE_UPDATE",) * 9 + ("MESSAGE_CREATE",) * 6 + ("TYPING_START",) * 3 + ("GUILD_MEMBER_UPDATE", "VOICE_STATE_UPDATE")
+    for n in range(count):
+        g = rng.randint(1, guilds)
+        i = rng.randrange(g * members, (g + 1) * members)
+        kind = rng.choice(kinds)
+        if kind == "PRESENCE_UPDATE":
+            data = {"user": {"id": user(i)["id"]}, "guild_id": str(g), "status": rng.choice(("online", "idle", "dnd")),
+                    "activities": [{"name": f"game {rng.randrange(50)}", "type": 0, "created_at": 0}], "client_status": {"desktop": "online"}}
+        elif kind == "MESSAGE_CREATE":
+            data = {"id": str(10 ** 18 + n), "channel_id": str(g * 1000 + 1), "guild_id": str(g), "author": user(i),
+                    "member": {key: value for key, value in member(g, i).items() if key != "user"}, "content": f"message {n} " * 8,
+                    "timestamp": "2024-01-01T00:00:00+00:00", "edited_timestamp": None, "tts": False, "mention_everyone": False,
+                    "mentions": [], "mention_roles": [], "attachments": [], "embeds": [], "pinned": False, "type": 0}
+        elif kind == "TYPING_START":
+            data = {"channel_id": str(g * 1000 + 1), "guild_id": str(g), "user_id": user(i)["id"], "timestamp": 0, "member": member(g, i)}
+        elif kind == "GUILD_MEMBER_UPDATE":
+            data = dict(member(g, i), guild_id=str(g), roles=[str(g * 10 + rng.randrange(3))])
+        else:
+            data = voice(g, i, rng.choice((str(g * 1000 + 2), None)))
+        events.append((kind, data))
+    return events
+
+def gateway_filter(event, data, intents):
+    """What Discord sends of an event to a client with `intents`, None if nothing."""
+    needs = {"PRESENCE_UPDATE": "presences", "TYPING_START": "guild_typing", "GUILD_MEMBER_UPDATE": "members",
+             "GUILD_MEMBERS_CHUNK": "members", "VOICE_STATE_UPDATE": "voice_states", "MESSAGE_CREATE": "guild_messages"}
+    if event in needs and not getattr(intents, needs[event]):
+        return None
+    if event == "MESSAGE_CREATE" and not intents.message_content:
+        return dict(data, content="")
+    if event == "GUILD_CREATE":
+        voice = {state["user_id"] for state in data["voice_states"]} if intents.voice_states else set()
+        return dict(data, presences=data["presences"] if intents.presences else [],
+                    voice_states=data["voice_states"] if intents.voice_states else [],
+                    members=data["members"] if intents.members else [m for m in data["members"] if m["user"]["id"] in voice])
+    return data
+
+def rss():
+    """Resident memory of the process in bytes (Linux)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+async def replay_gateway(profile, sample, events):
+    import discord
+    from gateway import client_options, MessageLog
+    message_log = MessageLog(sample=sample, seed=0)
+    logged = []
+
+    class ReplayClient(discord.Client):
+        async def on_message(self, message):
+            if message.author != self.user and message_log.wants(message):
+                message_log.log(message)
+                logged.append(message.id)
+
+    client = ReplayClient(**client_options(profile, log_messages=message_log.enabled))
+    await client._async_setup_hook()
+    state = client._connection
+    state.user = discord.ClientUser(state=state, data={"id": "1", "username": "soa", "discriminator": "0", "avatar": None})
+    # the GUILD_MEMBERS_CHUNK events of the stream answer the chunk requests the client would send
+    chunk, state._chunk_guilds = state._chunk_guilds, False
+    intents = client.intents
+    events = [(event, gateway_filter(event, data, intents)) for event, data in events]
+    events = [(event, data) for event, data in events if data is not None and (chunk or event != "GUILD_MEMBERS_CHUNK")]
+    for event, data in events:
+        if event == "GUILD_MEMBERS_CHUNK":
+            request = discord.state.ChunkRequest(int(data["guild_id"]), 0, asyncio.get_running_loop(), state._get_guild)
+            state._chunk_requests[request.nonce] = request
+            data["nonce"] = request.nonce
+
+    gc.collect()
+    before, start = rss(), time.process_time()
+    for n, (event, data) in enumerate(events):
+        state.parsers[event](data)
+        if n % 1000 == 0:
+            await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    cpu = time.process_time() - start
+    gc.collect()
+    return {"profile": profile, "sample": sample, "events": len(events), "cpu": cpu, "memory": rss() - before,
+            "members": sum(len(guild.members) for guild in client.guilds),
+            "messages": len(state._messages or ()), "logged": len(logged)}
+
+def bench_gateway(args):
+    """Replay a gateway event stream through discord.py's parsers with each intents profile, in a fresh process each."""
+    if args.profile:
+        import contextlib
+        events = load_events(args.events_file) if args.events_file else gateway_events(args.guilds, args.members, args.events)
+        # the message log prints, keep the json readable
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            result = asyncio.run(replay_gateway(args.profile, args.sample, events))
+        print(json.dumps(result))
+        return
+    from settings import INTENT_PROFILES
+    runs = [("all", 1.0)] + [(profile, args.sample) for profile in INTENT_PROFILES]
+    for profile, sample in runs:
+        command = [sys.executable, __file__, "gateway", "--profile", profile, "--sample", str(sample), "--guilds", str(args.guilds),
+                   "--members", str(args.members), "--events", str(args.events)] + (["--events-file", args.events_file] if args.events_file else [])
+        out = subprocess.run(command, cwd=APP_PATH, capture_output=True, text=True, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{profile:<8} log {sample:<4g} events={result['events']:<7} cpu={result['cpu']:.2f}s "
+              f"memory=+{result['memory'] / 2 ** 20:.1f}MB members={result['members']:<7} messages={result['messages']:<6} logged={result['logged']}")
+
+def load_events(path):
+    """Recorded gateway dispatches, one {"t": ..., "d": ...} json per line."""
+    with open(path, "r") as f:
+        return [(event["t"], event["d"]) for event in map(json.loads, f) if event]
+
+
+BENCHMARKS = {
+    "startup": bench_startup,
+    "alerts": bench_alerts,
+    "format": bench_format,
+    "market": bench_market,
+    "indicators": bench_indicators,
+    "faults": bench_faults,
+    "load": bench_load,
+    "parse": bench_parse,
+    "gateway": bench_gateway,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="SOA bot offline benchmarks")
+    parser.add_argument("benchmark", choices=BENCHMARKS.keys())
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--alerts", type=int, default=10000, help="alerts: number of alerts")
+    parser.add_argument("--ticks", help="alerts: recorded ticks (jsonl), random walk if omitted")
+    parser.add_argument("--symbols", type=int, default=2000, help="format, market: number of symbols")
+    parser.add_argument("--candles", type=int, default=1000, help="indicators: length of the kline series")
+    parser.add_argument("--requests", type=int, default=50, help="faults: requests per phase, load: requests per command")
+    parser.add_argument("--concurrency", type=int, default=10, help="load: requests running at once")
+    parser.add_argument("--latency", type=float, default=0.02, help="load: seconds each upstream stub waits before answering")
+    parser.add_argument("--commands", help="load: comma separated commands, all by default")
+    parser.add_argument("--verbose", action="store_true", help="load: keep the command logs")
+    parser.add_argument("--fixtures", help="load, parse: directory of recorded upstream payloads (fixtures.py)")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="load: multiplier of the recorded latencies")
+    parser.add_argument("--guilds", type=int, default=20, help="gateway: servers of the generated stream")
+    parser.add_argument("--members", type=int, default=2000, help="gateway: members per server")
+    parser.add_argument("--events", type=int, default=100000, help="gateway: events after the servers are loaded")
+    parser.add_argument("--events-file", help="gateway: recorded dispatches (jsonl of {t, d}), generated if omitted")
+    parser.add_argument("--sample", type=float, default=0.0, help="gateway: share of the messages logged")
+    parser.add_argument("--profile", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#Path: app/cache.py
+
+import asyncio
+import time
+from collections import OrderedDict
+from utils import debug
+
+
+class StaleCache:
+    """
+    Stale while revalidate cache of upstream answers, for coroutines.
+
+    A value younger than `ttl` is served as is. A value younger than `max_age`
+    is served immediately, marked stale, while a background task loads a new
+    one. Older or missing values are loaded before answering, and if that load
+    fails (the upstream is down, or its circuit is open and fails fast) the
+    last good value is served anyway, marked stale. Only a missing value raises.
+
+    Concurrent callers of the same key share one load, a caller that is
+    cancelled stops waiting for it without cancelling it for the others.
+
+    Args:
+        name (str): Name used in the logs.
+        ttl (float): Seconds a value is fresh.
+        max_age (float): Seconds a value is served while it is refreshed in the background.
+        size (int): Number of keys kept, the least recently used are dropped.
+    """
+    def __init__(self, name, ttl, max_age, size=256) -> None:
+        self.name = name
+        self.ttl = ttl
+        self.max_age = max_age
+        self.size = size
+        self.entries = OrderedDict()
+        self.loading = {}
+
+    async def get(self, key, load):
+        """The value of `key`, loaded with the coroutine function `load()` when needed.
+
+        Returns:
+            tuple: (value, age in seconds, stale), `stale` is True when the value is older than the ttl.
+
+        Raises:
+            Exception: What `load` raised, when there is no value to fall back to.
+        """
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            age = time.monotonic() - entry[1]
+            if age <= self.ttl:
+                return entry[0], age, False
+            if age <= self.max_age:
+                self.revalidate(key, load)
+                return entry[0], age, True
+        try:
+            value = await asyncio.shield(self.revalidate(key, load))
+            return value, 0.0, False
+        except Exception:
+            if entry is None:
+                raise
+            debug(f"{self.name} serving {key} cached {time.monotonic() - entry[1]:.0f}s ago", function="StaleCache.get", type="ERROR")
+            return entry[0], time.monotonic() - entry[1], True
+
+    def revalidate(self, key, load):
+        """Start loading `key` unless a load is already running, returns the load task."""
+        task = self.loading.get(key)
+        if task is None:
+            task = self.loading[key] = asyncio.ensure_future(self.__load(key, load))
+            # background loads are not awaited, retrieve their exception so asyncio doesn't warn about it
+            task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        return task
+
+    async def __load(self, key, load):
+        try:
+            value = await load()
+        except Exception as e:
+            debug(f"{self.name} failed to load {key} {e}", function="StaleCache.load", type="ERROR")
+            raise
+        finally:
+            del self.loading[key]
+        self.entries[key] = (value, time.monotonic())
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        return value
+
+
+def stale_note(age):
+    """Footer note of an answer served from a stale cache."""
+    return f"⚠️ cached {age:.0f}s ago"
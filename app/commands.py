@@ -1,8 +1,12 @@
+import re
+import asyncio
 import discord
 from discord import app_commands
 from settings import *
-from game import GameSettings
-from utils import debug, flagger
+from game import GameSettings, registry
+from utils import debug
+from permissions import permissions
+from purge import Purge, parse_bound
 
 async def help(interaction):
     """Displays a help message with a list of commands."""
@@ -17,24 +21,57 @@ async def help(interaction):
     debug(f"Help requested to {interaction.user}", function="client.help", type="CMD")
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
-@app_commands.describe(game="See the best settings for this game")
-async def cfg(interaction, game: str):
+async def game_autocomplete(interaction, current: str):
+    return [app_commands.Choice(name=game, value=game) for game in registry.search_games(current)]
+
+async def setting_autocomplete(interaction, current: str):
+    game = interaction.namespace.game or ""
+    return [app_commands.Choice(name=setting[:100], value=setting[:100]) for setting in registry.search_settings(game, current)]
+
+async def cfg_history(interaction, game):
+    """Send the last changes of a game config."""
+    records = await asyncio.to_thread(registry.history(game).recent, CFG_HISTORY_SIZE)
+    description = "\n".join(
+        f"**#{r['s']}** <t:{r['t']}:R> {r['m']}: {'.'.join(r['p'])} `{r['o']}` -> `{r['n']}`" for r in records
+    ) or "No changes recorded yet."
+    embed = discord.Embed(
+        title=f"{game.upper()} Cfg History - {TITLE} {VERSION}",
+        description=description[:4096],
+        color=discord.Color.green()
+    )
+    embed.set_footer(text=f"Revert a change with /cfg {game} revert <number>")
+    debug(f"Game settings history for {game} requested to {interaction.user}", function="client.config", type="CMD")
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+async def cfg_revert(interaction, game, change):
+    """Revert one change of a game config."""
+    if not permissions.allowed(interaction.user, "revert"):
+        debug(f"{interaction.user} tried to revert change {change} on {game} FAILED", function="client.config", type="CMD")
+        await interaction.response.send_message(ACCESS_DENIED, ephemeral=True)
+        return
+    record = await registry.revert(game, change, interaction.user)
+    if record is None:
+        debug(f"{interaction.user} tried to revert change {change} on {game} FAILED", function="client.config", type="CMD")
+        await interaction.response.send_message(f"Change #{change} not found on {game}", ephemeral=True)
+        return
+    debug(f"{interaction.user} reverted change {change} on {game} OK", function="client.config", type="CMD")
+    await interaction.response.send_message(f"Reverted {'.'.join(record['p'])} to {record['o']} on {game}", ephemeral=True)
+
+@app_commands.describe(game="See the best settings for this game", action="show (default), history or revert", change="The change number to revert")
+@app_commands.autocomplete(game=game_autocomplete)
+async def cfg(interaction, game: str, action: str = "show", change: int = 0):
     """Display the best perfomance settings for a game."""
 
     gameset = GameSettings(game)
-    if gameset.support:
-        description = ""
-        for setting, value in gameset.settings.items():
-            if isinstance(value, dict):
-                description += f"\n{setting.upper()} CONFIG:\n"
-                for subsetting, subvalue in value.items():
-                    description += f"{subsetting}: {subvalue}\n"
-            elif setting != "image":
-                description += f"{setting}: {value}\n"
-
+    action = action.lower()
+    if gameset.support and action == "history":
+        await cfg_history(interaction, game)
+    elif gameset.support and action == "revert":
+        await cfg_revert(interaction, game, change)
+    elif gameset.support:
         embed = discord.Embed(
             title=f"{game.upper()} Cfg - {TITLE} {VERSION}",
-            description=description,
+            description=gameset.description,
             color=discord.Color.green()
         )
         embed.set_footer(text=f"Requested by {interaction.user}")
@@ -43,21 +80,22 @@ async def cfg(interaction, game: str):
         await interaction.response.send_message(embed=embed, ephemeral=True)
     else:
         debug(f"Game help settings for {game} requested to {interaction.user}", function="client.config", type="CMD")
-        await interaction.response.send_message(CONFIG_HELP, ephemeral=True)
+        games = "\n".join(f"-{name.upper()}" for name in registry.games())
+        await interaction.response.send_message(CONFIG_HELP.format(games), ephemeral=True)
 
 @app_commands.describe(game="Target game to edit the config", setting="The setting you want to change", value="The value you want to set")
+@app_commands.autocomplete(game=game_autocomplete, setting=setting_autocomplete)
 async def edit(interaction, game: str, setting: str, value: str):
     """Edit the best perfomance settings for a game."""
 
-    flag = flagger(interaction.user.roles, UNHOLY_ONES_ID, PRESIDENT_ID, VICE_PRESIDENT_ID, MANOFMAYHEM_ID, DEV_ID)
-    if not flag:
+    if not permissions.allowed(interaction.user, "edit"):
         debug(f"{interaction.user} tried to change {setting} to {value} on {game} FAILED", function="client.edit", type="CMD")
         await interaction.response.send_message(ACCESS_DENIED, ephemeral=True)
         return
     
     gameset = GameSettings(game)
 
-    callback = gameset.update_settings(setting, value, interaction.user)
+    callback = await gameset.update_settings(setting, value, interaction.user)
 
     if callback:
         debug(f"{interaction.user} changed {setting} to {value} on {game} OK", function="client.edit", type="CMD")
@@ -66,31 +104,43 @@ async def edit(interaction, game: str, setting: str, value: str):
         debug(f"{interaction.user} tried to change {setting} to {value} on {game} FAILED", function="client.edit", type="CMD")
         await interaction.response.send_message(f"Failed to change {setting} to {value} on {game}{EDIT_HELP}", ephemeral=True)
 
-@app_commands.describe(quantity="The number of messages to clear")
-async def clear(interaction, quantity: int):
+@app_commands.describe(quantity="The number of messages to clear",
+                       user="Only clear messages from this member",
+                       pattern="Only clear messages matching this regex",
+                       before="Only clear messages before this date (YYYY-MM-DD) or message id",
+                       after="Only clear messages after this date (YYYY-MM-DD) or message id")
+async def clear(interaction, quantity: int, user: discord.Member = None, pattern: str = None, before: str = None, after: str = None):
     """Clears a number of messages in the current channel."""
-    if not flagger(interaction.user.roles, PRESIDENT_ID, MANOFMAYHEM_ID, VICE_PRESIDENT_ID):
+    if not permissions.allowed(interaction.user, "clear"):
         return await interaction.response.send_message(ACCESS_DENIED, ephemeral=True)
 
-    channel = interaction.channel
-    msgs = []
-    quantity_MAX = 200
-    if quantity <= quantity_MAX:
-        async for message in channel.history(limit=quantity):
-            msgs.append(message)
-    else:
+    if not 0 < quantity <= PURGE_MAX:
         debug(f"{interaction.user} tryed and failed to clear {quantity} messages", function="client.clear", type="CMD")
-        return await interaction.response.send_message(f"Failed to clear {quantity} messages, max is {quantity_MAX}", ephemeral=True)
+        return await interaction.response.send_message(f"Failed to clear {quantity} messages, max is {PURGE_MAX}", ephemeral=True)
+
+    try:
+        purge = Purge(interaction.channel, quantity, user=user, pattern=pattern,
+                      before=parse_bound(before), after=parse_bound(after), budget=PURGE_TIME_BUDGET)
+    except (ValueError, re.error) as e:
+        return await interaction.response.send_message(f"Invalid filter: {e}", ephemeral=True)
+
+    async def progress(purge):
+        await interaction.edit_original_response(content=f"Cleaning... {purge.deleted}/{quantity} deleted, {purge.scanned} scanned")
 
     debug(f"{interaction.user} is about to clear {quantity} messages", function="client.clear", type="CMD")
+    await interaction.response.send_message(f"Cleaning {quantity} messages", ephemeral=True)
     try:
-        await interaction.response.send_message(f"Cleaning {quantity} messages", ephemeral=True)
-        await channel.delete_messages(msgs)
-        debug(f"{interaction.user} cleared {quantity} messages", function="client.clear", type="CMD")
-    except:
-        debug(f"{interaction.user} failed to clear {quantity} messages", function="client.clear", type="CMD")
-    finally:
-        return
+        deleted = await purge.run(progress)
+        note = ", stopped at the time limit, run it again for the rest" if purge.truncated else ""
+        await interaction.edit_original_response(content=f"Cleared {deleted} messages ({purge.scanned} scanned){note}")
+        debug(f"{interaction.user} cleared {deleted} messages", function="client.clear", type="CMD")
+    except (discord.HTTPException, RuntimeError) as e:
+        debug(f"{interaction.user} failed to clear {quantity} messages: {e}", function="client.clear", type="ERROR")
+        try:
+            await interaction.edit_original_response(content=f"Stopped after {purge.deleted} messages: {e}")
+        except discord.HTTPException as e:
+            # the interaction token expired or the message is gone, the log above is all we can do
+            debug(f"Couldn't report the clear of {interaction.user}: {e}", function="client.clear", type="ERROR")
     
 async def invite(interaction):
     """Create a invite to the server."""
@@ -1,16 +1,32 @@
 import asyncio
 import os
-import json
-import inspect
+import time
+import threading
 import discord
 import enum
-from decimal import Decimal
+import numpy as np
 from discord import app_commands
-from binance.client import Client
 from dotenv import load_dotenv
 from settings import *
 from pathlib import Path
-from utils import debug, flagger, ddbug, random_hash_gen, ImageManager, time_now
+from utils import debug, ddbug, random_hash_gen, ImageManager, time_now
+from net import http
+from store import store
+from jobs import jobs, reply
+from ticker import TickerSnapshot, SymbolCatalog, KlineStore, format_price
+from indicators import engine as indicators, downsample
+
+catalog = SymbolCatalog()
+
+
+async def token_autocomplete(interaction, current: str):
+    catalog.refresh_soon()
+    return [app_commands.Choice(name=token, value=token) for token in catalog.search_tokens(current)]
+
+async def pair_autocomplete(interaction, current: str):
+    catalog.refresh_soon()
+    token = interaction.namespace.token or ""
+    return [app_commands.Choice(name=pair, value=pair) for pair in catalog.search_pairs(token, current)]
 
 
 class CriptoCurrency:
@@ -22,50 +38,112 @@ class CriptoCurrency:
             client (object): The Discord client object.
         """
         self.client = client
-        self.imgmng = ImageManager()
+        self.__imgmng = None
+        self.__users = None
+        self.__users_version = None
+        self.__users_lock = threading.Lock()
+        self.tickers = TickerSnapshot(self.__fetch_tickers)
+        self.klines = KlineStore(self.get_klines)
+        self.catalog = catalog
+        self.catalog.fetch = self.__fetch_exchange_info
         load_dotenv()
         self.plotpath_target = Path(__file__).parent / "plots"
-        self.path = Path(__file__).parent / "users" / "tokens.json"
-        self.__setup()
 
-    def __connect(self):
+    @property
+    def users(self):
+        """The users cripto data, loaded on first use and reloaded when another worker saved it."""
+        if self.__users is None or store.version("tokens") != self.__users_version:
+            self.__load_users()
+        return self.__users
+
+    @property
+    def imgmng(self):
+        if self.__imgmng is None:
+            self.__imgmng = ImageManager()
+        return self.__imgmng
+
+    async def binance(self, path, **params):
         """
-        Connects to the Binance API using the provided API key and secret.
+        Calls a public endpoint of the Binance REST API through the shared HTTP pool.
+
+        Args:
+            path (str): The endpoint, like /api/v3/exchangeInfo.
+            **params: The query parameters.
+
+        Returns:
+            The decoded json.
         """
-        try:
-            self.api = Client(os.getenv("BK"), os.getenv("BS"))
-            debug("Binance Connected", function="cripto.__connect", type="INFO")
-        except Exception as e:
-            debug("Can't connect to Binance API", function="cripto.__conect", type="ERROR")
+        return await http.get("binance", BINANCE_API + path, params={key: str(value) for key, value in params.items()})
+
+    async def __fetch_tickers(self):
+        """
+        Retrieves the 24h ticker of every symbol in one request.
+        """
+        return await self.binance("/api/v3/ticker/24hr")
+
+    async def __fetch_exchange_info(self):
+        """
+        Retrieves the exchange info, every symbol with its base and quote asset.
+        """
+        return await self.binance("/api/v3/exchangeInfo")
+
+    async def snapshot(self):
+        """
+        The 24h tickers with the symbol catalog refreshed, both loaded at once.
+        """
+        return (await asyncio.gather(self.catalog.refresh(), self.tickers.get()))[1]
+
+    async def __fetch_ticker_pair(self, symbol):
+        """
+        Retrieves the price and the 24h ticker of a symbol, both requests at once.
+        """
+        params = {"symbol": symbol}
+        return await asyncio.gather(http.get("binance", BINANCE_API + "/api/v3/ticker/price", params=params),
+                                    http.get("binance", BINANCE_API + "/api/v3/ticker/24hr", params=params))
 
     def __load_users(self):
         """
-        Loads the user data from the tokens.json file.
+        Loads the user data from the store.
         """
         try:
-            with open(self.path, "r") as file:
-                self.users = json.load(file)
+            self.__users_version = store.version("tokens")
+            self.__users = store.load("tokens") or {}
             debug("Loaded users cripto data", function="cripto.__load_users", type="INFO")
         except Exception as e:
             debug(f"Failed to load users cripto data {e}", function="cripto.__load_users", type="ERROR")
 
-    def __save_users(self):
-        """
-        Saves the user data to the tokens.json file.
+    def __edit_users(self, edit, retries=5):
         """
-        try:
-            with open(self.path, "w") as file:
-                json.dump(self.users, file, indent=4, sort_keys=True)
-            debug("Saved users", function="cripto.__save_users", type="INFO")
-        except Exception as e:
-            debug(f"Failed to save users {e}", function="cripto.__save_users", type="ERROR")
+        Applies `edit(users)` to a fresh copy of the user data and saves it.
 
-    def __setup(self):
-        """
-        Sets up the CriptoCurrency class by connecting to Binance and loading user data.
+        The edits of the job pool threads are serialized by a lock and saved
+        with a compare and set on the store version, retried on top of the
+        data another worker saved first. The cached data is replaced, never
+        changed in place, so readers always see a whole copy.
+
+        Args:
+            edit (callable): Changes the users dict, returns False when there is nothing to save.
+
+        Returns:
+            bool: The result of the edit, False if it failed or the save kept conflicting.
         """
-        self.__connect()
-        self.__load_users()
+        with self.__users_lock:
+            for _ in range(retries):
+                try:
+                    expected = store.version("tokens")
+                    users = store.load("tokens") or {}
+                    if not edit(users):
+                        return False
+                    version = store.save_if("tokens", users, expected, sort_keys=True)
+                    if version is not None:
+                        self.__users, self.__users_version = users, version
+                        debug("Saved users", function="cripto.__edit_users", type="INFO")
+                        return True
+                except Exception as e:
+                    debug(f"Failed to save users {e}", function="cripto.__edit_users", type="ERROR")
+                    return False
+                debug("Conflict saving users, retrying", function="cripto.__edit_users", type="ALERT")
+            return False
 
     def get_user_data(self, user):
         """
@@ -83,6 +161,23 @@ class CriptoCurrency:
         else:
             return False
         
+    def user_data(self, user):
+        """
+        Retrieves the data of a user, creating it first if needed. Blocking (store IO), call it from the job pool.
+
+        Args:
+            user (object): The Discord user object.
+
+        Returns:
+            dict: The user data.
+        """
+        data = self.get_user_data(user)
+        if not data:
+            self.create_user(user)
+            data = self.get_user_data(user)
+            debug(f"Created new user {user}", function="cripto.user_data", type="INFO")
+        return data
+
     def create_user(self, user):
         """
         Creates a new user entry in the user data.
@@ -93,17 +188,16 @@ class CriptoCurrency:
         Returns:
             bool: True if the user was created successfully, False otherwise.
         """
-        name = user.name
-        if name not in self.users:
-            self.users[name] = {
+        def edit(users):
+            if user.name in users:
+                return False
+            users[user.name] = {
                 "date" : time_now(),
                 "id" : user.id,
                 "tokens" : []
             }
-            self.__save_users()
             return True
-        else:
-            return False
+        return self.__edit_users(edit)
     
     def remove_user(self, user):
         """
@@ -115,13 +209,9 @@ class CriptoCurrency:
         Returns:
             bool: True if the user was removed successfully, False otherwise.
         """
-        name = user.name
-        if name in self.users:
-            del self.users[name]
-            self.__save_users()
-            return True
-        else:
-            return False
+        def edit(users):
+            return users.pop(user.name, None) is not None
+        return self.__edit_users(edit)
 
     def clear_tokens(self, user):
         """
@@ -133,16 +223,32 @@ class CriptoCurrency:
         Returns:
             bool: True if the tokens were cleared successfully, False otherwise.
         """
-        name = user.name
-        if name in self.users:
-            self.users[name]["tokens"] = []
-            self.users[name]["date"] = time_now()
-            self.__save_users()
+        def edit(users):
+            if user.name not in users:
+                return False
+            users[user.name]["tokens"] = []
+            users[user.name]["date"] = time_now()
             return True
-        else:
-            return False
+        return self.__edit_users(edit)
         
-    def add_token(self, user, token, pair):
+    async def listed_price(self, token, pair):
+        """
+        The last price of a pair from the ticker snapshot.
+
+        Args:
+            token (str): The token symbol.
+            pair (str): The pair symbol.
+
+        Returns:
+            str or None: The last price, None if the pair is not listed.
+        """
+        tickers = await self.snapshot()
+        if not self.catalog.exists(token, pair):
+            return None
+        ticker = tickers.get(f"{token}{pair}".upper())
+        return ticker["lastPrice"] if ticker else None
+
+    def add_token(self, user, token, pair, price, quantity=0):
         """
         Adds a token to the user's token list.
 
@@ -150,30 +256,30 @@ class CriptoCurrency:
             user (object): The Discord user object.
             token (str): The token symbol.
             pair (str): The pair symbol.
+            price (str): The price it was added at, from listed_price (None if the pair is not listed).
+            quantity (float, optional): How much of the token the user holds. Defaults to 0.
 
         Returns:
             bool: True if the token was added successfully, False otherwise.
         """
-        request = self.get_tkpair(token, pair)
-        if not request:
+        if price is None:
             return False
-        name = user.name
-        
-        if name in self.users:
-            for tk in self.users[name]["tokens"]:
+
+        def edit(users):
+            if user.name not in users:
+                return False
+            for tk in users[user.name]["tokens"]:
                 if tk["token"] == token and tk["pair"] == pair:
                     return False
-                
-            self.users[name]["tokens"].append({
+            users[user.name]["tokens"].append({
                 "token" : token,
                 "pair" : pair,
-                "price" : str(request['price'])
+                "price" : price,
+                "quantity" : quantity
             })
-            self.users[name]["date"] = time_now()
-            self.__save_users()
+            users[user.name]["date"] = time_now()
             return True
-        else:
-            return False
+        return self.__edit_users(edit)
         
     def remove_token(self, user, token, pair):
         """
@@ -187,42 +293,50 @@ class CriptoCurrency:
         Returns:
             bool: True if the token was removed successfully, False otherwise.
         """
-        name = user.name
-        if name in self.users:
-            for tk in self.users[name]["tokens"]:
+        def edit(users):
+            if user.name not in users:
+                return False
+            for tk in users[user.name]["tokens"]:
                 if tk["token"] == token and tk["pair"] == pair:
-                    self.users[name]["tokens"].remove(tk)
-                    self.users[name]["date"] = time_now()
-                    self.__save_users()
+                    users[user.name]["tokens"].remove(tk)
+                    users[user.name]["date"] = time_now()
                     return True
             return False
-        else:
-            return False
+        return self.__edit_users(edit)
         
-    def update_prices(self, user):
+    async def portfolio(self, user_data):
         """
-        Updates the prices of the tokens in the user's token list.
+        Values the holdings of a user with the current prices, all from one ticker snapshot.
 
         Args:
-            user (object): The Discord user object.
+            user_data (dict): The user data, as returned by get_user_data.
 
         Returns:
-            bool: True if the prices were updated successfully, False otherwise.
+            tuple: (rows, totals), one dict per holding (symbol, added, last, change_24h,
+                   pnl_percent, quantity, value, pnl, decimals) and quote asset -> (value, pnl).
         """
-        name = user.name
-        if name in self.users:
-            if not self.users[name]["tokens"]:
-                return False
-            for tk in self.users[name]["tokens"]:
-                request = self.get_tkpair(tk["token"], tk["pair"])
-                if request:
-                    tk["price"] = request['price']
-            self.__save_users()
-            return True
-        else:
-            return False
-
-    def get_tkpair(self, token, pair="USDT"):
+        tickers = await self.tickers.get()
+        rows, totals = [], {}
+        for tk in user_data["tokens"]:
+            token, pair = tk["token"].upper(), tk["pair"].upper()
+            ticker = tickers.get(token + pair)
+            added = float(tk["price"])
+            quantity = float(tk.get("quantity", 0) or 0)
+            row = {"symbol": f"{token}-{pair}", "pair": pair, "added": added, "quantity": quantity, "last": None,
+                   "decimals": self.catalog.decimals(token + pair)[0]}
+            if ticker:
+                last = float(ticker["lastPrice"])
+                row.update(last=last,
+                           change_24h=float(ticker["priceChangePercent"]),
+                           pnl_percent=(last - added) / added * 100 if added else 0.0,
+                           value=quantity * last,
+                           pnl=quantity * (last - added))
+                value, pnl = totals.get(pair, (0.0, 0.0))
+                totals[pair] = (value + row["value"], pnl + row["pnl"])
+            rows.append(row)
+        return rows, totals
+
+    async def get_tkpair(self, token, pair="USDT"):
         """
         Retrieves the ticker information for a specific token pair.
 
@@ -236,59 +350,167 @@ class CriptoCurrency:
         token = token.upper()
         pair = pair.upper()
         symbol = f"{token}{pair}"
-        
         try:
-            info = self.api.get_symbol_ticker(symbol=symbol) #[symbol], [price]
-            ticker = self.api.get_ticker(symbol=symbol)
+            await self.catalog.refresh()
+            if not self.catalog.exists(token, pair):
+                debug(f"{symbol} is not listed", function="cripto.get_tkpair", type="ERROR")
+                return False
+            info, ticker = await self.__fetch_ticker_pair(symbol) #[symbol], [price]
         except Exception as e:
             debug(f"Failed to get {token}{pair} {e}", function="cripto.get_tkpair", type="ERROR")
             return False
         info.update(ticker)
 
-        important_keys = ["price", "priceChange", "lastPrice",
-                          "weightedAvgPrice", "openPrice", "prevClosePrice",
-                          "highPrice", "lowPrice", "volume"]
-        
-        for key in important_keys:
-            info[key] = Decimal(info[key])
+        price_decimals, volume_decimals = self.catalog.decimals(symbol)
+        for key in PRICE_KEYS:
+            info[key] = format_price(info[key], price_decimals)
+        info["volume"] = format_price(info["volume"], volume_decimals)
 
-            if info[key] > 1:
-                info[key] = info[key].quantize(Decimal("0.00"))
-            else:
-                info[key] = info[key].quantize(Decimal("0.0000001"))
-            
-            
-        
         debug(f"Got {token}{pair}", function="cripto.get_tkpair", type="INFO")
         return info
     
-    def get_all_tkpair(self, token, is_pair=False):
+    async def get_all_tkpair(self, token, is_pair=False):
         """
-        Retrieves the ticker information for all token pairs containing a specific token.
+        Retrieves the prices of all the pairs of a token, from the symbol catalog and the ticker snapshot.
 
         Args:
             token (str): The token symbol.
-            is_pair (bool, optional): Whether to search for pairs starting or ending with the token symbol. Defaults to False.
+            is_pair (bool, optional): Whether the token is the quote asset of the pairs instead of the base. Defaults to False.
 
         Returns:
             dict: A dictionary of token pairs and their prices.
         """
-        data = {}
-        token = token.upper()
-        call = self.api.get_all_tickers()
+        tickers = await self.snapshot()
+        symbols = self.catalog.tokens(token) if is_pair else self.catalog.pairs(token)
+        return {symbol: tickers[symbol]["lastPrice"] for symbol in symbols if symbol in tickers}
+    
+    def market_overview(self, tickers, quote="USDT", top=MARKET_TOP, heatmap=MARKET_HEATMAP_SIZE):
+        """
+        Aggregates the 24h tickers of every symbol quoted in `quote`, CPU only, run it on the job pool.
+
+        The tickers are loaded once into numpy arrays, the rankings are
+        argpartition + a sort of the `top` elements, and the heatmap bins are
+        one digitize call.
 
-        prefix_condition = lambda pair: pair['symbol'].startswith(token)
-        suffix_condition = lambda pair: pair['symbol'].endswith(token)
+        Args:
+            tickers (dict): The ticker snapshot, from `snapshot`.
+            quote (str): The quote asset.
+            top (int): Size of the gainers, losers and volume lists.
+            heatmap (int): Number of symbols (by volume) in the heatmap.
 
-        condition = suffix_condition if is_pair else prefix_condition
+        Returns:
+            dict or None: symbols, up, down, gainers, losers, volume and heatmap (lists of
+                          (token, change %, last price, quote volume)), None if the quote has no symbols.
+        """
+        quote = quote.upper()
+        symbols = [symbol for symbol in self.catalog.tokens(quote) if symbol in tickers]
+        rows = [tickers[symbol] for symbol in symbols]
+        volume = np.array([row["quoteVolume"] for row in rows], dtype=np.float64)
+        # symbols without trades in 24h (halted, just listed) would rank on a meaningless 0%
+        traded = np.flatnonzero(volume > 0)
+        if not len(traded):
+            return None
+        volume = volume[traded]
+        change = np.array([rows[i]["priceChangePercent"] for i in traded], dtype=np.float64)
+        last = np.array([rows[i]["lastPrice"] for i in traded], dtype=np.float64)
+        tokens = [symbols[i][:-len(quote)] for i in traded]
+        changes, volumes, lasts = change.tolist(), volume.tolist(), last.tolist()
+
+        def entries(indexes):
+            return [(tokens[i], changes[i], format_price(lasts[i], self.catalog.decimals(tokens[i] + quote)[0]), volumes[i])
+                    for i in indexes.tolist()]
+
+        leaders = top_indexes(volume, heatmap)
+        bins = np.digitize(change[leaders], MARKET_HEATMAP_BINS)
+        return {
+            "symbols": len(traded),
+            "up": int(np.count_nonzero(change > 0)),
+            "down": int(np.count_nonzero(change < 0)),
+            "gainers": entries(top_indexes(change, top)),
+            "losers": entries(top_indexes(-change, top)),
+            "volume": entries(leaders[:top]),
+            "heatmap": [(tokens[i], changes[i], MARKET_HEATMAP_COLORS[b]) for i, b in zip(leaders.tolist(), bins.tolist())],
+        }
+
+    async def get_klines(self, symbol, interval, start=None, end=None):
+        """
+        Retrieves the kline history of a symbol.
 
-        for pair in filter(condition, call):
-            data[pair['symbol']] = pair['price']
+        Args:
+            symbol (str): The symbol, token and pair.
+            interval (str): The kline interval.
+            start (int, optional): Open time (ms) of the first kline, the latest klines by default.
+            end (int, optional): Open time (ms) of the last kline, up to now by default.
 
-        return data
-    
-    @app_commands.describe(token=TOKEN_TXT, pair=PAIR_TXT)
-    async def price(self, interaction: discord.Interaction, token: str, pair: str="USDT"):
+        Returns:
+            list: The klines.
+        """
+        params = {"symbol": symbol, "interval": interval, "limit": KLINE_LIMIT}
+        if end is not None:
+            params["endTime"] = end
+        if start is None:
+            return await self.binance("/api/v3/klines", **params)
+        klines = []
+        while True:
+            page = await self.binance("/api/v3/klines", startTime=start, **params)
+            klines += page
+            # a page that doesn't move forward would loop forever
+            if len(page) < KLINE_LIMIT or page[-1][0] < start:
+                return klines
+            start = page[-1][0] + 1
+
+    async def chart(self, symbol, interval, span="all", overlays=()):
+        """
+        Retrieves the klines of a symbol from the kline store, with their indicators,
+        downsampled to CHART_POINTS points.
+
+        The indicators are computed over the whole stored series, which goes back
+        CHART_WARMUP candles before the range, so they are warmed up at its beginning.
+        A range needing more than KLINE_CANDLES candles at `interval` is drawn with
+        the finest coarser interval that fits, so a chart never downloads more.
+        The klines are awaited on the loop, the indicators and the downsampling
+        run on the job pool.
+
+        Args:
+            symbol (str): The symbol, token and pair.
+            interval (str): The kline interval.
+            span (str): A CHART_RANGES key.
+            overlays (iterable): INDICATOR_OVERLAYS names to draw.
+
+        Returns:
+            tuple: (interval, times, closes, overlays, latest indicators) the interval drawn,
+                   the open times and closes and the overlay values (label -> values or
+                   (upper, lower)) to plot, and Indicators.last() or None.
+        """
+        seconds = CHART_RANGES[span]
+        now = int(time.time() * 1000)
+        start = CHART_HISTORY_START if seconds is None else now - seconds * 1000
+        interval = chart_interval(interval, start, now)
+        times, closes = await self.klines.get(symbol, interval, start - CHART_WARMUP * CHART_INTERVALS[interval])
+        loop = asyncio.get_running_loop()
+        return (interval, *await loop.run_in_executor(jobs.executor, self.__chart_lines, symbol, interval, times, closes, start, overlays))
+
+    def __chart_lines(self, symbol, interval, times, closes, start, overlays):
+        """The CPU part of `chart`, the indicators and the downsampled points of the klines from `start` on."""
+        values = indicators.get(symbol, interval, times, closes)
+        first = int(np.searchsorted(times, start))
+        if not values or first == len(times):
+            return times[:0], closes[:0], {}, values.last() if values else None
+
+        kept = first + downsample(closes[first:])
+        lines = {}
+        for name in overlays:
+            if name == "bollinger":
+                lines["Bollinger"] = (values.values["upper"][kept], values.values["lower"][kept])
+            else:
+                lines[f"{name.upper()} {SMA_PERIOD if name == 'sma' else EMA_PERIOD}"] = values.values[name][kept]
+        return times[kept], closes[kept], lines, values.last()
+
+    @app_commands.describe(token=TOKEN_TXT, pair=PAIR_TXT, overlays=OVERLAYS_TXT, interval=INTERVAL_TXT, span=RANGE_TXT)
+    @app_commands.rename(span="range")
+    @app_commands.autocomplete(token=token_autocomplete, pair=pair_autocomplete)
+    async def price(self, interaction: discord.Interaction, token: str, pair: str="USDT", overlays: str="",
+                    interval: str="1d", span: str="all"):
         """
         Checks the current prices for a token.
 
@@ -296,6 +518,9 @@ class CriptoCurrency:
             interaction (object): The Discord interaction object.
             token (str): The token symbol.
             pair (str, optional): The pair symbol. Defaults to "USDT".
+            overlays (str, optional): Comma separated indicators drawn on the chart.
+            interval (str, optional): The candle interval. Defaults to "1d".
+            span (str, optional): The history shown, "range" on Discord. Defaults to "all".
             
         Returns:
             bool: True if the token was removed successfully, False otherwise.
@@ -305,26 +530,37 @@ class CriptoCurrency:
         symbol = f"{token}{pair}"
         user = interaction.user
         debug(f"{user} requested price for {symbol}", function="cripto.price", type="CMD")
+        overlays = [name for name in overlays.lower().replace(" ", "").split(",") if name]
+        if any(name not in INDICATOR_OVERLAYS for name in overlays):
+            await reply(interaction, f"Unknown overlay, choose from: {', '.join(INDICATOR_OVERLAYS)}")
+            return False
+        interval, span = interval.lower(), span.lower()
+        if interval not in CHART_INTERVALS or span not in CHART_RANGES:
+            await reply(interaction, f"Intervals: {', '.join(CHART_INTERVALS)}, ranges: {', '.join(CHART_RANGES)}")
+            return False
+        if CHART_RANGES[span] is not None and CHART_RANGES[span] * 1000 <= CHART_INTERVALS[interval]:
+            await reply(interaction, f"A {span} range is not longer than one {interval} candle, choose a shorter interval")
+            return False
         
-        info = self.get_tkpair(token, pair)
+        info = await jobs.wait(interaction, self.get_tkpair(token, pair), progress=f"Getting price to {symbol}")
 
         if not info:
-            await interaction.response.send_message("Token not found!", ephemeral=True)
+            await reply(interaction, "Token not found!")
             return False
         
-        await interaction.response.send_message(f"Getting price to {symbol}", ephemeral=True)
-        
-        interval = Client.KLINE_INTERVAL_1DAY
-        #get klines from 1 year from now
-        klines = self.api.get_historical_klines(symbol, interval=interval)
-        path = self.plotpath_target / f"{symbol}_{random_hash_gen()}.png"
-
-        plot_url = await self.imgmng.plot(klines=klines,
-                                    title=(f"{token}-{pair} Price History"),
-                                    x="Period (Days)",
-                                    y=f"Price ({pair})",
-                                    path=path)
-        os.remove(path)
+        drawn, times, closes, lines, last = await jobs.wait(interaction, self.chart(symbol, interval, span, overlays),
+                                                            progress=f"Plotting {symbol} history")
+        plot_url = None
+        if len(times):
+            path = self.plotpath_target / f"{symbol}_{random_hash_gen()}.png"
+            plot_url = await self.imgmng.plot(times=times,
+                                        closes=closes,
+                                        title=(f"{token}-{pair} {drawn} Price History ({span})"),
+                                        x="Date",
+                                        y=f"Price ({pair})",
+                                        path=path,
+                                        overlays=lines)
+            os.remove(path)
         
         embed = discord.Embed(
             title=f"{token}-{pair} Market Value Now",
@@ -333,8 +569,11 @@ class CriptoCurrency:
         )
         
         embed.set_thumbnail(url=BINANCE_PNG)
-        embed.set_image(url=plot_url)
-        embed.set_footer(text=f"Requested by {user} | Command: /price {token} {pair}")
+        if plot_url:
+            embed.set_image(url=plot_url)
+        else:
+            embed.description += f" No {span} history to chart."
+        embed.set_footer(text=f"Requested by {user} | Command: /price {token} {pair} {interval} {span}")
         embed.add_field(name="🕒Time", value=time_now(), inline=False)
         embed.add_field(name="💸Price", value=f"**{info['price']} {pair}**", inline=False)
         embed.add_field(name="🔄Price Change", value=info['priceChange'], inline=True)
@@ -346,31 +585,59 @@ class CriptoCurrency:
         embed.add_field(name="🔼High", value=info['highPrice'], inline=True)
         embed.add_field(name="🔽Low", value=info['lowPrice'], inline=True)
         embed.add_field(name="📊Volume", value=info['volume'], inline=True)
-        await interaction.edit_original_response(embed=embed)
+        if last:
+            embed.add_field(name="📐Indicators", value=render_indicators(last, self.catalog.decimals(symbol)[0]), inline=False)
+        await reply(interaction, embed=embed)
         debug(f"Sent {token}-{pair} price to {user}", function="cripto.price", type="CMD")
         return True
 
-    @app_commands.describe(action=ACTION_TXT, token=TOKEN_TXT, pair=PAIR_TXT)
-    async def mycripto(self, interaction, action: str="", token: str="", pair: str=""):
+    @app_commands.describe(quote="The quote asset of the market, USDT by default")
+    async def market(self, interaction, quote: str="USDT"):
+        """Top gainers, losers and volume leaders of a market in the last 24h."""
+        quote = quote.upper()
+        debug(f"{interaction.user} requested the {quote} market", function="cripto.market", type="CMD")
+        tickers = await jobs.wait(interaction, self.snapshot(), progress=f"Reading the {quote} market...")
+        overview = await jobs.run(interaction, self.market_overview, tickers, quote)
+        if not overview:
+            await reply(interaction, f"No market found for {quote}!")
+            return False
+
+        def lines(entries):
+            return "\n".join(f"**{token}** {price} ({change:+.2f}%) vol {volume:,.0f}"
+                             for token, change, price, volume in entries) or "-"
+
+        embed = discord.Embed(
+            title=f"{quote} Market 24h",
+            description=f"**{overview['symbols']}** pairs, 🔼 {overview['up']} 🔽 {overview['down']}",
+            color=discord.Color.green() if overview["up"] >= overview["down"] else discord.Color.red()
+        )
+        embed.set_thumbnail(url=BINANCE_PNG)
+        embed.add_field(name="📈Top Gainers", value=lines(overview["gainers"]), inline=False)
+        embed.add_field(name="📉Top Losers", value=lines(overview["losers"]), inline=False)
+        embed.add_field(name="📊Volume Leaders", value=lines(overview["volume"]), inline=False)
+        cells = [f"{color}`{token} {change:+.1f}%`" for token, change, color in overview["heatmap"]]
+        embed.add_field(name="🗺️Heatmap (by volume)",
+                        value="\n".join(" ".join(cells[i:i + 4]) for i in range(0, len(cells), 4)), inline=False)
+        embed.set_footer(text=f"Requested by {interaction.user} | Command: /market {quote}")
+        await reply(interaction, embed=embed)
+        return True
+
+    @app_commands.describe(action=ACTION_TXT, token=TOKEN_TXT, pair=PAIR_TXT, quantity=QUANTITY_TXT)
+    async def mycripto(self, interaction, action: str="", token: str="", pair: str="", quantity: float=0.0):
         """Menu to manage your saved cripto tokens."""
-        user = self.get_user_data(interaction.user)
-        if not user:
-            self.create_user(interaction.user)
-            user = self.get_user_data(interaction.user)
-            debug(f"Created new user {interaction.user}", function="cripto.mycripto", type="INFO")
-
-        actions = {"add" : self.add_token,
-                   "remove" : self.remove_token,
-                   "clear" : self.clear_tokens}
+        user = await jobs.run(interaction, self.user_data, interaction.user)
+
+        price = await jobs.wait(interaction, self.listed_price(token, pair)) if action == "add" else None
+        actions = {"add" : (self.add_token, (interaction.user, token, pair, price, quantity)),
+                   "remove" : (self.remove_token, (interaction.user, token, pair)),
+                   "clear" : (self.clear_tokens, (interaction.user,))}
         
         #check if the action is valid
         if action in actions:
-            #check if the action needs arguments
-            signature = inspect.signature(actions[action])
-            if len(signature.parameters) > 2:
-                response = actions[action](interaction.user, token, pair)
-            else:
-                response = actions[action](interaction.user)
+            function, arguments = actions[action]
+            response = await jobs.run(interaction, function, *arguments)
+            # the edit replaced the cached data, show the saved one
+            user = await jobs.run(interaction, self.get_user_data, interaction.user) or user
             
             if response:
                 response = f"**{action.upper()}ED** with **success!**"
@@ -383,7 +650,7 @@ class CriptoCurrency:
             debug(f"{interaction.user} requested mycripto menu", function="cripto.mycripto", type="CMD")
             pass
         else:
-            await interaction.response.send_message("Invalid action!", ephemeral=True)
+            await reply(interaction, "Invalid action!")
             debug(f"{interaction.user} tried to {action} {token}{pair}", function="cripto.mycripto", type="CMD")
             return
 
@@ -401,11 +668,84 @@ class CriptoCurrency:
         if action in actions:
             embed.add_field(name="Response", value=response, inline=False)
         if user["tokens"]:
-            for tk in user["tokens"]:
-                embed.add_field(name=f"{tk['token'].upper()}-{tk['pair'].upper()}", value=f"{tk['price']}", inline=True)
+            rows, totals = await jobs.wait(interaction, self.portfolio(user), progress="Getting your prices...")
+            embed.description = f"Last edition {user['date']}\n\n" + render_portfolio(rows)
+            for quote, (value, pnl) in totals.items():
+                if value:
+                    embed.add_field(name=f"💰Total {quote}", value=f"**{value:,.2f}** ({pnl:+,.2f})", inline=True)
         else:
             embed.add_field(name="Help", value=NO_TOKENS_SAVED, inline=False)
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+        await reply(interaction, embed=embed)
+
+
+def chart_interval(interval, start, end):
+    """The finest interval from `interval` on drawing `start` to `end` (ms) in KLINE_CANDLES candles, warmup included."""
+    intervals = list(CHART_INTERVALS)
+    for name in intervals[intervals.index(interval):]:
+        if (end - start) // CHART_INTERVALS[name] + CHART_WARMUP + 1 <= KLINE_CANDLES:
+            return name
+    return intervals[-1]
+
+
+def top_indexes(values, k):
+    """Indexes of the `k` largest values, largest first, without sorting the whole array."""
+    if k >= len(values):
+        return np.argsort(-values, kind="stable")
+    indexes = np.argpartition(-values, k)[:k]
+    return indexes[np.argsort(-values[indexes], kind="stable")]
+
+
+def render_indicators(last, decimals=None):
+    """
+    Renders the latest indicator values as the readout of the /price embed.
+
+    Args:
+        last (dict): Indicators.last() of the symbol.
+        decimals (int, optional): Price decimals of the symbol.
+
+    Returns:
+        str: The readout, indicators still warming up (nan) are left out.
+    """
+    fast, slow, signal = MACD_PERIODS
+    prices = {key: format_price(last[key], decimals) for key in ("sma", "ema", "upper", "lower")}
+    lines = []
+    if last["rsi"] == last["rsi"]:
+        state = " overbought" if last["rsi"] >= 70 else " oversold" if last["rsi"] <= 30 else ""
+        lines.append(f"**RSI {RSI_PERIOD}** {last['rsi']:.1f}{state}")
+    if last["signal"] == last["signal"]:
+        lines.append(f"**MACD {fast},{slow},{signal}** {last['macd']:.4g} signal {last['signal']:.4g} hist {last['histogram']:+.4g}")
+    if last["sma"] == last["sma"]:
+        lines.append(f"**SMA {SMA_PERIOD}** {prices['sma']}")
+    if last["ema"] == last["ema"]:
+        lines.append(f"**EMA {EMA_PERIOD}** {prices['ema']}")
+    if last["upper"] == last["upper"]:
+        lines.append(f"**Bollinger {BOLLINGER_PERIOD},{BOLLINGER_WIDTH}** {prices['lower']} - {prices['upper']}")
+    return "\n".join(lines) or "Not enough history yet"
+
+
+def render_portfolio(rows):
+    """
+    Renders the rows of CriptoCurrency.portfolio as the lines of the /mycripto embed.
+
+    Args:
+        rows (list): The holdings.
+
+    Returns:
+        str: One line per holding, cut to fit the embed description.
+    """
+    lines = []
+    for row in rows:
+        added = format_price(row["added"], row.get("decimals"))
+        if row["last"] is None:
+            lines.append(f"**{row['symbol']}** added at {added}, no market data")
+            continue
+        line = (f"**{row['symbol']}** {added} → **{format_price(row['last'], row.get('decimals'))}** "
+                f"({row['pnl_percent']:+.2f}%) 24h {row['change_24h']:+.2f}%")
+        if row["quantity"]:
+            line += f" | {row['quantity']:g} = {row['value']:,.2f} {row['pair']} ({row['pnl']:+,.2f})"
+        lines.append(line)
+    text = "\n".join(lines)
+    return text if len(text) <= 3900 else text[:3900].rsplit("\n", 1)[0] + "\n..."
 
 
 #debug
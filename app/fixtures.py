@@ -0,0 +1,310 @@
+#Path: app/fixtures.py
+
+"""
+Record and replay of upstream API payloads.
+
+Recording runs a local proxy per upstream that forwards every request to the
+real API and appends the answer (status, content type, body and the time the
+upstream took) to fixtures/<upstream>.jsonl.gz. Request headers are not
+recorded and the tokens of the answers (SECRET_KEYS) are replaced by a
+placeholder, tokens never end up in the fixtures. Replaying serves the recorded
+answers from a local server after the recorded latency times `scale`.
+
+Usage:
+    >>> python app/fixtures.py record --upstreams binance,tibiadata,axsddlr
+    >>> python app/fixtures.py proxy binance --port 8081
+    >>> python app/fixtures.py replay --scale 0.5
+    >>> python app/benchmark.py load --fixtures app/fixtures
+    >>> python app/benchmark.py parse --fixtures app/fixtures
+"""
+import argparse
+import asyncio
+import base64
+import gzip
+import json
+import os
+import time
+from collections import defaultdict
+from pathlib import Path
+import aiohttp
+from aiohttp import web
+from settings import BINANCE_API, TIBIADATA_API, AXSDDLR_API, PATCH_NOTES_DATA, KLINE_LIMIT
+
+FIXTURES_PATH = Path(__file__).parent / "fixtures"
+UPSTREAMS = {
+    "binance": BINANCE_API,
+    "spotify": "https://api.spotify.com",
+    "spotify-accounts": "https://accounts.spotify.com",
+    "tibiadata": TIBIADATA_API,
+    "axsddlr": AXSDDLR_API,
+}
+# the Spotify token is on another host, both are replayed by the same server
+REPLAY_AS = {"spotify-accounts": "spotify"}
+# headers that belong to one connection, they are not forwarded
+HOP_HEADERS = frozenset(("host", "connection", "keep-alive", "transfer-encoding", "content-length", "content-encoding"))
+# keys of the json answers holding credentials, the Spotify token answer
+SECRET_KEYS = frozenset(("access_token", "refresh_token", "id_token"))
+
+
+def redact(text):
+    """The json body `text` with its SECRET_KEYS values replaced, unchanged if it isn't a json object."""
+    if "_token" not in text:
+        return text
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return text
+    if not isinstance(data, dict) or not SECRET_KEYS & data.keys():
+        return text
+    return json.dumps({key: "redacted" if key in SECRET_KEYS else value for key, value in data.items()})
+
+
+def load_fixtures(path):
+    """The recorded exchanges of a fixture file, in recording order."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def fixture_body(entry):
+    """The recorded body as bytes."""
+    if entry.get("encoding") == "base64":
+        return base64.b64decode(entry["body"])
+    return entry["body"].encode("utf-8")
+
+
+class RecordingProxy:
+    """
+    Forwards the requests it receives to `upstream` and records the answers.
+
+    Args:
+        name (str): The upstream, names the fixture file.
+        upstream (str): Base URL of the real API.
+        path (Path): Directory of the fixture files.
+    """
+    def __init__(self, name, upstream, path=FIXTURES_PATH) -> None:
+        self.name = name
+        self.upstream = upstream.rstrip("/")
+        self.file = Path(path) / f"{name}.jsonl.gz"
+        self.recorded = 0
+        self.session = None
+        self.runner = None
+        self.output = None
+        self.url = None
+
+    async def handle(self, request):
+        headers = {key: value for key, value in request.headers.items() if key.lower() not in HOP_HEADERS}
+        body = await request.read()
+        start = time.perf_counter()
+        async with self.session.request(request.method, self.upstream + request.rel_url.path_qs,
+                                        headers=headers, data=body or None) as response:
+            payload = await response.read()
+            latency = time.perf_counter() - start
+            content_type = response.headers.get("Content-Type", "application/octet-stream")
+        try:
+            text, encoding = redact(payload.decode("utf-8")), "utf-8"
+        except UnicodeDecodeError:
+            text, encoding = base64.b64encode(payload).decode("ascii"), "base64"
+        entry = {"method": request.method, "path": request.rel_url.path, "query": sorted(request.rel_url.query.items()),
+                 "status": response.status, "content_type": content_type, "latency": round(latency, 6),
+                 "encoding": encoding, "body": text}
+        self.output.write(json.dumps(entry) + "\n")
+        self.recorded += 1
+        return web.Response(body=payload, status=response.status, headers={"Content-Type": content_type})
+
+    async def start(self, port=0):
+        self.file.parent.mkdir(parents=True, exist_ok=True)
+        # appending gzip members keeps the previous recordings readable
+        self.output = gzip.open(self.file, "at", encoding="utf-8")
+        self.session = aiohttp.ClientSession()
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_route("*", "/{path:.*}", self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", port)
+        await site.start()
+        self.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+        return self
+
+    async def stop(self):
+        await self.runner.cleanup()
+        await self.session.close()
+        self.output.close()
+
+
+class ReplayServer:
+    """
+    Serves recorded answers after their recorded latency times `scale`.
+
+    A request gets the recording with the same method and path sharing the
+    most query parameters (klines of the same symbol and interval whatever the
+    start time, the ticker of another symbol rather than the list of all the
+    tickers), or, for an unrecorded path, the one with the longest common
+    path prefix (/v3/character/<any name>). Several recordings of the same
+    request are served in turn.
+
+    Args:
+        name (str): The upstream.
+        entries (list): The recorded exchanges.
+        scale (float): Latency multiplier, 0 answers immediately.
+    """
+    def __init__(self, name, entries, scale=1.0) -> None:
+        self.name = name
+        self.scale = scale
+        self.requests = 0
+        self.misses = 0
+        self.paths = defaultdict(list)
+        for entry in entries:
+            self.paths[(entry["method"], entry["path"])].append(entry)
+        self.turns = defaultdict(int)
+        self.runner = None
+        self.url = None
+
+    def match(self, method, path, query):
+        candidates = self.paths.get((method, path))
+        if not candidates:
+            self.misses += 1
+            shared = lambda key: len(os.path.commonprefix((key[1], path))) if key[0] == method else -1
+            best = max(self.paths, key=shared, default=None)
+            if best is None or shared(best) <= 1:
+                return None
+            candidates = self.paths[best]
+        query = set(query)
+        keys = {key for key, _ in query}
+
+        def score(entry):
+            # same values first, then same parameters (a ticker of another symbol, not the list of all)
+            items = {tuple(item) for item in entry["query"]}
+            return len(query & items), len(keys & {key for key, _ in items}), -len(keys ^ {key for key, _ in items})
+
+        best = max(map(score, candidates))
+        matches = [entry for entry in candidates if score(entry) == best]
+        key = (method, path, best)
+        self.turns[key] += 1
+        return matches[(self.turns[key] - 1) % len(matches)]
+
+    async def handle(self, request):
+        self.requests += 1
+        entry = self.match(request.method, request.rel_url.path, request.rel_url.query.items())
+        if entry is None:
+            return web.Response(status=404, text=f"{request.method} {request.rel_url.path} was not recorded")
+        await request.read()
+        await asyncio.sleep(entry["latency"] * self.scale)
+        return web.Response(body=fixture_body(entry), status=entry["status"], headers={"Content-Type": entry["content_type"]})
+
+    async def start(self, port=0):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_route("*", "/{path:.*}", self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", port)
+        await site.start()
+        self.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+        return self
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+def replay_servers(path=FIXTURES_PATH, scale=1.0):
+    """Upstream name -> ReplayServer (not started) of the fixture files in `path`."""
+    entries = defaultdict(list)
+    for file in sorted(Path(path).glob("*.jsonl.gz")):
+        name = file.name.split(".")[0]
+        entries[REPLAY_AS.get(name, name)] += load_fixtures(file)
+    return {name: ReplayServer(name, recorded, scale) for name, recorded in entries.items()}
+
+
+def capture_plan(upstreams, characters=(), songs=()):
+    """The requests sent through the proxies by `record`: (upstream, method, path, params, extra aiohttp arguments)."""
+    plan = []
+    if "binance" in upstreams:
+        plan += [("binance", "GET", "/api/v3/exchangeInfo", {}, {}), ("binance", "GET", "/api/v3/ticker/24hr", {}, {})]
+        for symbol in ("BTCUSDT", "ETHUSDT"):
+            plan += [("binance", "GET", "/api/v3/ticker/price", {"symbol": symbol}, {}),
+                     ("binance", "GET", "/api/v3/ticker/24hr", {"symbol": symbol}, {})]
+            plan += [("binance", "GET", "/api/v3/klines", {"symbol": symbol, "interval": interval, "limit": str(KLINE_LIMIT)}, {})
+                     for interval in ("1h", "1d")]
+    if "tibiadata" in upstreams:
+        plan.append(("tibiadata", "GET", "/v3/news/archive", {}, {}))
+        plan += [("tibiadata", "GET", f"/v3/character/{name}", {}, {}) for name in characters]
+    if "axsddlr" in upstreams:
+        plan += [("axsddlr", "GET", game["path"], {}, {}) for game in PATCH_NOTES_DATA if game.get("api") != "tibiadata"]
+    if "spotify" in upstreams and os.getenv("SI") and os.getenv("SS"):
+        plan.append(("spotify-accounts", "POST", "/api/token", {}, {"data": {"grant_type": "client_credentials"},
+                                                                    "auth": aiohttp.BasicAuth(os.getenv("SI"), os.getenv("SS"))}))
+        plan += [("spotify", "GET", "/v1/search", {"q": song, "limit": "1", "type": "track"}, {"token": True}) for song in songs]
+    return plan
+
+
+async def record(upstreams, path=FIXTURES_PATH, characters=(), songs=(), targets=UPSTREAMS):
+    """Send the capture plan through recording proxies, returns upstream -> recorded exchanges."""
+    from dotenv import load_dotenv
+    load_dotenv()
+    plan = capture_plan(upstreams, characters, songs)
+    proxies = {name: await RecordingProxy(name, targets[name], path).start() for name in {step[0] for step in plan}}
+    token = None
+    try:
+        async with aiohttp.ClientSession() as session:
+            for name, method, url, params, kwargs in plan:
+                kwargs = dict(kwargs)
+                if kwargs.pop("token", False) and token:
+                    kwargs["headers"] = {"Authorization": f"Bearer {token}"}
+                try:
+                    async with session.request(method, proxies[name].url + url, params=params, **kwargs) as response:
+                        body = await response.read()
+                    if name == "spotify-accounts" and response.status == 200:
+                        token = json.loads(body)["access_token"]
+                    print(f"{response.status} {name} {method} {url} {params or ''} {len(body)} bytes")
+                except aiohttp.ClientError as e:
+                    print(f"ERR {name} {method} {url} {e}")
+    finally:
+        for proxy in proxies.values():
+            await proxy.stop()
+    return {name: proxy.recorded for name, proxy in proxies.items()}
+
+
+async def serve(servers, ports):
+    for (name, server), port in zip(servers.items(), ports):
+        await server.start(port)
+        print(f"{name} on {server.url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for server in servers.values():
+            await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and replay upstream API payloads")
+    commands = parser.add_subparsers(dest="command", required=True)
+    recorder = commands.add_parser("record", help="record the capture plan through proxies")
+    recorder.add_argument("--upstreams", default="binance,tibiadata,axsddlr,spotify")
+    recorder.add_argument("--characters", default="Bubble,Eternal Oblivion", help="tibia characters to record")
+    recorder.add_argument("--songs", default="Bohemian Rhapsody,Blinding Lights", help="spotify searches to record (needs SI and SS)")
+    recorder.add_argument("--out", default=FIXTURES_PATH, type=Path)
+    proxy = commands.add_parser("proxy", help="record everything sent to a local proxy until interrupted")
+    proxy.add_argument("upstream", choices=UPSTREAMS.keys())
+    proxy.add_argument("--port", type=int, default=8081)
+    proxy.add_argument("--out", default=FIXTURES_PATH, type=Path)
+    replay = commands.add_parser("replay", help="serve the fixtures until interrupted, one port per upstream")
+    replay.add_argument("--fixtures", default=FIXTURES_PATH, type=Path)
+    replay.add_argument("--scale", type=float, default=1.0, help="latency multiplier")
+    replay.add_argument("--port", type=int, default=8081, help="port of the first upstream, the next ones follow")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "record":
+            split = lambda text: [item.strip() for item in text.split(",") if item.strip()]
+            recorded = asyncio.run(record(split(args.upstreams), args.out, split(args.characters), split(args.songs)))
+            print("recorded: " + ", ".join(f"{name} {count}" for name, count in recorded.items()))
+        elif args.command == "proxy":
+            asyncio.run(serve({args.upstream: RecordingProxy(args.upstream, UPSTREAMS[args.upstream], args.out)}, [args.port]))
+        else:
+            servers = replay_servers(args.fixtures, args.scale)
+            asyncio.run(serve(servers, range(args.port, args.port + len(servers))))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,210 @@
 import json
+import time
+import copy
+import asyncio
 import discord
+from collections import defaultdict
 from discord import app_commands
-from pathlib import Path
 from settings import *
-from utils import debug, time_now, load_json, save_json, flagger
+from utils import debug, time_now, PrefixIndex
+from store import store
+from history import ChangeLog
+
+
+def render_settings(settings):
+    """Render the settings of a game as the /cfg embed description."""
+    description = ""
+    for setting, value in settings.items():
+        if isinstance(value, dict):
+            description += f"\n{setting.upper()} CONFIG:\n"
+            for subsetting, subvalue in value.items():
+                description += f"{subsetting}: {subvalue}\n"
+        elif setting != "image":
+            description += f"{setting}: {value}\n"
+    return description
+
+
+class GameRegistry:
+    """
+    Process wide, in memory copy of the game configs.
+
+    The configs are loaded once and served from memory, the store version (the
+    file mtime for the JSON store) is checked at most every `check_interval`
+    seconds to pick up external edits. The /cfg description of each game is
+    rendered once and only invalidated when that game is edited.
+
+    Each game has a flattened, case insensitive index of its settings
+    ("shader detail" and "video.shader detail" -> the dict holding it) and
+    its own lock, edits are saved with a compare and set on the store version
+    and retried on top of the fresh data when another writer got there first.
+    """
+    def __init__(self, name="gamecfg", check_interval=GAMECFG_CHECK_INTERVAL) -> None:
+        self.name = name
+        self.check_interval = check_interval
+        self.data = {}
+        self.version = None
+        self.checked = 0
+        self.descriptions = {}
+        self.indexes = {}
+        self.searches = {}
+        self.logs = {}
+        self.locks = defaultdict(asyncio.Lock)
+
+    def refresh(self, force=False):
+        """Reload the configs if the store changed since the last load."""
+        now = time.monotonic()
+        if not force and self.version is not None and now - self.checked < self.check_interval:
+            return
+        self.checked = now
+        version = store.version(self.name)
+        if version != self.version:
+            self.data = store.load(self.name) or {}
+            self.version = version
+            self.descriptions.clear()
+            self.indexes.clear()
+            self.searches.clear()
+            debug(f"Loaded {len(self.data)} games", function="GameRegistry.refresh", type="INFO")
+
+    def games(self):
+        self.refresh()
+        return list(self.data.keys())
+
+    def get(self, game):
+        """Settings of a game, None if the game isn't supported."""
+        self.refresh()
+        return self.data.get(game.lower())
+
+    def description(self, game):
+        """The pre rendered /cfg description of a game."""
+        game = game.lower()
+        self.refresh()
+        if game not in self.descriptions:
+            self.descriptions[game] = render_settings(self.data[game])
+        return self.descriptions[game]
+
+    def index(self, game):
+        """Flattened setting index of a game, lower cased path -> (dict holding the setting, key, path)."""
+        game = game.lower()
+        if game not in self.indexes:
+            settings = self.data[game]
+            index = {}
+            for key, value in settings.items():
+                if not isinstance(value, dict):
+                    index[key.lower()] = (settings, key, [key])
+            for key, value in settings.items():
+                if isinstance(value, dict):
+                    for subkey in value:
+                        node = (value, subkey, [key, subkey])
+                        index[f"{key.lower()}.{subkey.lower()}"] = node
+                        index.setdefault(subkey.lower(), node)
+            self.indexes[game] = index
+        return self.indexes[game]
+
+    def search_games(self, text, limit=25):
+        """Autocomplete the game names."""
+        self.refresh()
+        if None not in self.searches:
+            self.searches[None] = PrefixIndex(self.data.keys())
+        return self.searches[None].search(text, limit)
+
+    def search_settings(self, game, text, limit=25):
+        """Autocomplete the settings of a game, nested ones are returned as "group.setting"."""
+        self.refresh()
+        game = game.lower()
+        if game not in self.data:
+            return []
+        if game not in self.searches:
+            paths, aliases = [], []
+            for key, value in self.data[game].items():
+                if isinstance(value, dict):
+                    for subkey in value:
+                        paths.append(f"{key}.{subkey}")
+                        aliases.append((subkey, f"{key}.{subkey}"))
+                else:
+                    paths.append(key)
+            self.searches[game] = PrefixIndex(paths, aliases)
+        return self.searches[game].search(text, limit)
+
+    def lookup(self, game, setting):
+        """Find a setting of a game, None if the game or the setting doesn't exist."""
+        if game.lower() not in self.data:
+            return None
+        return self.index(game).get(setting.strip().lower())
+
+    def history(self, game):
+        """The change log of a game."""
+        game = game.lower()
+        if game not in self.logs:
+            self.logs[game] = ChangeLog(game)
+        return self.logs[game]
+
+    async def revert(self, game, seq, user):
+        """Put back the value a change replaced, the revert is logged as a new change.
+
+        Returns:
+            dict or None: The reverted change, None if it doesn't exist or couldn't be reverted.
+        """
+        record = await asyncio.to_thread(self.history(game).get, seq)
+        if record is None:
+            return None
+        if not await self.update(game, ".".join(record["p"]), record["o"], user):
+            return None
+        return record
+
+    async def update(self, game, setting, value, user, retries=3):
+        """Change a setting of a game and save it.
+
+        Args:
+            game (str): The game name.
+            setting (str): The setting name or its "group.setting" path, any case.
+            value (str): The new value.
+            user (object): The Discord user editing the setting.
+
+        Returns:
+            bool: True if the setting was changed, False if it doesn't exist or the save kept conflicting.
+        """
+        game = game.lower()
+        async with self.locks[game]:
+            for _ in range(retries):
+                self.refresh(force=True)
+                node = self.lookup(game, setting)
+                if node is None:
+                    return False
+                # the edit goes to a copy, the shared data only changes once it is saved
+                _, key, path = node
+                expected = self.version
+                snapshot = copy.deepcopy(self.data)
+                parent = snapshot[game]
+                for group in path[:-1]:
+                    parent = parent[group]
+                old = parent.get(key)
+                parent[key] = value
+                snapshot[game]['editor'] = user.name
+                snapshot[game]['date'] = time_now()
+                version = await asyncio.to_thread(store.save_if, self.name, snapshot, expected)
+                if version is not None:
+                    self.data, self.version = snapshot, version
+                    self.descriptions.clear()
+                    self.indexes.clear()
+                    self.searches.clear()
+                    await asyncio.to_thread(self.history(game).append, path, old, value, user)
+                    return True
+                debug(f"Conflict saving {game}, retrying", function="GameRegistry.update", type="ALERT")
+            return False
+
+
+registry = GameRegistry()
+
 
 class GameSettings:
     def __init__(self, name) -> None:
-        self.gamecfg_path = Path(__file__).parent / "users" / "gamecfg.json"
         self.load_games()
         self.name = name
         self.setup(name)
 
     def load_games(self):
-        self.data = load_json(self.gamecfg_path)
+        registry.refresh()
+        self.data = registry.data
 
     def setup(self, name):
         if name.lower() not in self.data:
@@ -24,6 +215,10 @@ class GameSettings:
             self.settings = self.data[name.lower()]
             self.image = self.settings['image']
 
+    @property
+    def description(self):
+        return registry.description(self.name)
+
     def get_settings(self):
         feedback = ""
         for key, value in self.settings.items():
@@ -35,33 +230,8 @@ class GameSettings:
                     feedback += f"\t{k} : {v}\n"
         return feedback
     
-    def update_settings(self,setting, new_setting, user):
-        pointer = self.settings
-        check_inside_dicts = False
-
-        if pointer is None:
+    async def update_settings(self, setting, new_setting, user):
+        if self.settings is None:
             return False
-        elif setting not in pointer:
-            for key, value in pointer.items():
-                if isinstance(value, dict):
-                    if setting in value.keys():
-                        pointer[key][setting] = new_setting
-                        pointer['editor'] = user.name
-                        pointer['date'] = time_now()
-                        check_inside_dicts = True
-                        break
-            if not check_inside_dicts:
-                return False
-        else:
-            pointer[setting] = value
-            pointer['editor'] = user.name
-            pointer['date'] = time_now()
-
-        new_settings = self.data
-        new_settings[self.name.lower()] = pointer
-
-        
-        save_json(self.gamecfg_path, new_settings)
-
-        return True
+        return await registry.update(self.name, setting, new_setting, user)
     
@@ -0,0 +1,58 @@
+#Path: app/gateway.py
+
+import os
+import random
+import discord
+from settings import INTENT_PROFILES, DEFAULT_INTENT_PROFILE, MESSAGE_LOG_SAMPLE, MESSAGE_LOG_CHANNELS
+from utils import debug
+
+
+def client_options(profile=None, log_messages=False):
+    """Keyword arguments of the Discord client for an intents profile.
+
+    Args:
+        profile (str, optional): A key of INTENT_PROFILES, SOA_INTENTS or DEFAULT_INTENT_PROFILE by default.
+        log_messages (bool): Add the guild_messages intent, on_message only gets guild messages with it.
+
+    Returns:
+        dict: intents, member_cache_flags, max_messages and chunk_guilds_at_startup.
+    """
+    profile = INTENT_PROFILES[profile or os.getenv("SOA_INTENTS", DEFAULT_INTENT_PROFILE)]
+    if profile["intents"] == "all":
+        intents = discord.Intents.all()
+    else:
+        intents = discord.Intents.none()
+        for flag in profile["intents"]:
+            setattr(intents, flag, True)
+    if log_messages:
+        intents.guild_messages = True
+    if profile["member_cache"] == "intents":
+        member_cache = discord.MemberCacheFlags.from_intents(intents)
+    else:
+        member_cache = discord.MemberCacheFlags.none()
+        for flag in profile["member_cache"]:
+            setattr(member_cache, flag, True)
+    return {"intents": intents, "member_cache_flags": member_cache, "max_messages": profile["max_messages"],
+            "chunk_guilds_at_startup": profile["chunk"]}
+
+
+class MessageLog:
+    """
+    The on_message log, opt in: every message of the `channels` and a `sample`
+    share of the others. Logging is a file write and a print, doing it for
+    every message of busy servers is pure overhead.
+    """
+    def __init__(self, sample=None, channels=MESSAGE_LOG_CHANNELS, seed=None) -> None:
+        self.sample = float(os.getenv("SOA_MESSAGE_LOG_SAMPLE", MESSAGE_LOG_SAMPLE) if sample is None else sample)
+        self.channels = frozenset(channels)
+        self.random = random.Random(seed).random
+
+    @property
+    def enabled(self):
+        return self.sample > 0 or bool(self.channels)
+
+    def wants(self, message):
+        return message.channel.id in self.channels or (self.sample > 0 and self.random() < self.sample)
+
+    def log(self, message):
+        debug(f"{message.channel} {message.author} {message.content}", function="client.on_message")
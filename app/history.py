@@ -0,0 +1,97 @@
+#Path: app/history.py
+
+import time
+from settings import HISTORY_COMPACTION, HISTORY_ARCHIVE
+from utils import debug
+from store import store
+
+
+class ChangeLog:
+    """
+    Append only log of the edits of one game, kept in the shared store so
+    every worker process sees the same changes and numbers.
+
+    Records are compact dicts: s (sequence), p (setting path as a list of
+    keys, ["video", "Shader Detail"] or ["name"]), o (old value),
+    n (new value), u (user id), m (user name), t (unix time). The
+    "history.<game>" document holds the last sequence and the records since
+    the last compaction, it is saved with a compare and set on its version so
+    two workers never hand out the same sequence. Once the log holds
+    `compaction` records they are copied to the "history.<game>.archive"
+    document (which keeps the last `archive` of them) and only then removed
+    from the log, so a failed archive leaves them in the log for the next
+    append. A read or an append never touches more than that.
+
+    The store is blocking, call the methods from a worker thread.
+
+    Attributes:
+        game (str): The game name.
+        compaction (int): Records kept in the log before they move to the archive.
+        archive (int): Records kept in the archive.
+    """
+    def __init__(self, game, compaction=HISTORY_COMPACTION, archive=HISTORY_ARCHIVE) -> None:
+        self.game = game.lower()
+        self.compaction = compaction
+        self.archive = archive
+        self.name = f"history.{self.game}"
+        self.archive_name = f"{self.name}.archive"
+
+    def __load(self):
+        return store.load(self.name) or {"s": 0, "records": []}
+
+    def append(self, path, old, new, user, retries=5):
+        """Record a change of `path` (list of keys).
+
+        Returns:
+            dict or None: The record, None if the log kept conflicting with other writers.
+        """
+        for _ in range(retries):
+            expected = store.version(self.name)
+            log = self.__load()
+            record = {"s": log["s"] + 1, "p": path, "o": old, "n": new,
+                      "u": user.id, "m": user.name, "t": int(time.time())}
+            records = log["records"]
+            # only saved records are archived, the new one could still lose the compare and set
+            if len(records) >= self.compaction and self.__archive(records):
+                records = []
+            if store.save_if(self.name, {"s": record["s"], "records": records + [record]}, expected) is not None:
+                return record
+        debug(f"Conflict logging a {self.game} change, dropped", function="ChangeLog.append", type="ERROR")
+        return None
+
+    def __archive(self, records, retries=5):
+        """Append records to the archive, keeping the last `archive`, the ones already archived are skipped.
+
+        Returns:
+            bool: True if the records are in the archive, False if it kept conflicting.
+        """
+        for _ in range(retries):
+            expected = store.version(self.archive_name)
+            archived = self.__archived()
+            last = archived[-1]["s"] if archived else 0
+            new = [record for record in records if record["s"] > last]
+            if not new or store.save_if(self.archive_name, {"records": (archived + new)[-self.archive:]}, expected) is not None:
+                debug(f"Compacted {self.game} history at {records[-1]['s']}", function="ChangeLog.compact", type="INFO")
+                return True
+        debug(f"Conflict archiving {self.game} changes, kept in the log", function="ChangeLog.archive", type="ALERT")
+        return False
+
+    def __archived(self):
+        return (store.load(self.archive_name) or {"records": []})["records"]
+
+    def recent(self, limit=10):
+        """The last `limit` changes, newest first."""
+        records = self.__load()["records"][-limit:]
+        if len(records) < limit:
+            records = (self.__archived() + records)[-limit:]
+        return list(reversed(records))
+
+    def get(self, seq):
+        """A change by its sequence number, None if it doesn't exist or left the archive."""
+        records = self.__load()["records"]
+        if not records or seq < records[0]["s"]:
+            records = self.__archived()
+        for record in reversed(records):
+            if record["s"] == seq:
+                return record
+        return None
@@ -0,0 +1,305 @@
+#Path: app/indicators.py
+
+import threading
+from collections import OrderedDict
+import numpy as np
+from settings import SMA_PERIOD, EMA_PERIOD, RSI_PERIOD, MACD_PERIODS, BOLLINGER_PERIOD, BOLLINGER_WIDTH, KLINE_SERIES
+from settings import CHART_POINTS, CHART_DOWNSAMPLE
+
+
+def sma(values, period):
+    """Simple moving average, nan until `period` values are available."""
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(len(values), np.nan)
+    if len(values) >= period:
+        total = np.cumsum(np.insert(values, 0, 0.0))
+        out[period - 1:] = (total[period:] - total[:-period]) / period
+    return out
+
+
+def smooth(values, alpha, previous):
+    """
+    The recursion y[i] = y[i - 1] + alpha * (x[i] - y[i - 1]) from y[-1] = `previous`.
+
+    Solved in closed form, y[k] = b^(k+1) * (previous + alpha * sum(x[i] / b^(i+1))),
+    one block at a time so b^-k never overflows.
+    """
+    out = np.empty(len(values))
+    beta = 1 - alpha
+    block = max(1, int(300 / -np.log(beta))) if beta > 0 else 1
+    powers = beta ** np.arange(1, min(block, len(values)) + 1)
+    for start in range(0, len(values), block):
+        x = values[start:start + block]
+        p = powers[:len(x)]
+        out[start:start + len(x)] = p * (previous + alpha * np.cumsum(x / p))
+        previous = out[start + len(x) - 1]
+    return out
+
+
+def ema(values, period, alpha=None):
+    """Exponential moving average seeded with the SMA of the first `period` values.
+
+    Args:
+        values (array): The values.
+        period (int): The period.
+        alpha (float, optional): The smoothing factor, 2 / (period + 1) by default (1 / period is Wilder's).
+
+    Returns:
+        array: The average, nan for the first period - 1 values.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(len(values), np.nan)
+    if len(values) >= period:
+        out[period - 1] = values[:period].mean()
+        out[period:] = smooth(values[period:], alpha or 2 / (period + 1), out[period - 1])
+    return out
+
+
+def rsi(closes, period=RSI_PERIOD):
+    """Relative strength index with Wilder's smoothing.
+
+    Returns:
+        tuple: (rsi, average gain, average loss), the averages are aligned with the closes too.
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    gain, loss = np.full(len(closes), np.nan), np.full(len(closes), np.nan)
+    if len(closes) > 1:
+        delta = np.diff(closes)
+        gain[1:] = ema(np.clip(delta, 0, None), period, 1 / period)
+        loss[1:] = ema(np.clip(-delta, 0, None), period, 1 / period)
+    return relative_strength(gain, loss), gain, loss
+
+
+def relative_strength(gain, loss):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(loss == 0, np.where(gain == 0, 50.0, 100.0), 100 - 100 / (1 + gain / loss))
+
+
+def macd(closes, periods=MACD_PERIODS):
+    """Moving average convergence divergence.
+
+    Returns:
+        tuple: (fast ema, slow ema, macd, signal, histogram).
+    """
+    fast_period, slow_period, signal_period = periods
+    closes = np.asarray(closes, dtype=np.float64)
+    fast, slow = ema(closes, fast_period), ema(closes, slow_period)
+    line = fast - slow
+    signal = np.full(len(closes), np.nan)
+    if len(closes) >= slow_period:
+        signal[slow_period - 1:] = ema(line[slow_period - 1:], signal_period)
+    return fast, slow, line, signal, line - signal
+
+
+def bollinger(closes, period=BOLLINGER_PERIOD, width=BOLLINGER_WIDTH):
+    """Bollinger bands, the SMA and `width` standard deviations around it.
+
+    Returns:
+        tuple: (middle, upper, lower).
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    middle = sma(closes, period)
+    deviation = np.full(len(closes), np.nan)
+    if len(closes) >= period:
+        deviation[period - 1:] = np.lib.stride_tricks.sliding_window_view(closes, period).std(axis=1)
+    return middle, middle + width * deviation, middle - width * deviation
+
+
+def lttb(values, points):
+    """
+    Largest triangle three buckets downsampling.
+
+    The series is cut in `points` - 2 buckets between the first and the last
+    value, each bucket keeps the value forming the largest triangle with the
+    value kept before it and the average of the next bucket, so the shape
+    (peaks included) survives.
+
+    Returns:
+        array: The sorted indexes of the kept values.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if points >= n or points < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    kept = np.empty(points, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(points - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x, next_y = (edges[i + 1] + edges[i + 2] - 1) / 2, values[edges[i + 1]:edges[i + 2]].mean()
+        else:
+            next_x, next_y = n - 1, values[n - 1]
+        x = np.arange(start, end)
+        area = np.abs((a - next_x) * (values[start:end] - values[a]) - (a - x) * (next_y - values[a]))
+        a = start + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
+
+
+def minmax(values, points):
+    """
+    Min/max bucketing, the lowest and the highest value of `points` / 2 buckets.
+
+    Returns:
+        array: The sorted indexes of the kept values.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if points >= n or points < 4:
+        return np.arange(n)
+    edges = np.linspace(0, n, points // 2 + 1).astype(np.int64)
+    buckets = np.repeat(np.arange(len(edges) - 1), np.diff(edges))
+    # sorted by bucket then value, the first of each bucket is its min and the last its max
+    order = np.lexsort((values, buckets))
+    return np.unique(np.concatenate((order[edges[:-1]], order[edges[1:] - 1], [0, n - 1])))
+
+
+def downsample(values, points=CHART_POINTS, method=CHART_DOWNSAMPLE):
+    """Indexes of at most about `points` values representing the series, with "lttb" or "minmax"."""
+    return (lttb if method == "lttb" else minmax)(values, points)
+
+
+class Indicators:
+    """
+    SMA, EMA, RSI, MACD and Bollinger bands of a close price series.
+
+    The first computation is vectorized over the whole series, `extend` then
+    appends candles with the recursive form of each indicator, O(new candles)
+    instead of a recomputation of the history.
+
+    Attributes:
+        closes (array): The close prices.
+        values (dict): Indicator name -> array aligned with the closes: sma, ema,
+                       rsi, macd, signal, histogram, middle, upper and lower.
+    """
+    def __init__(self, closes) -> None:
+        self.closes = np.asarray(closes, dtype=np.float64)
+        self.values = {}
+        self.state = {}
+        self.compute()
+
+    def __len__(self):
+        return len(self.closes)
+
+    def compute(self):
+        closes = self.closes
+        _, gain, loss = rsi(closes)
+        fast, slow, line, signal, _ = macd(closes)
+        middle, upper, lower = bollinger(closes)
+        self.values = {
+            "sma": sma(closes, SMA_PERIOD),
+            "ema": ema(closes, EMA_PERIOD),
+            "rsi": relative_strength(gain, loss),
+            "macd": line,
+            "signal": signal,
+            "histogram": line - signal,
+            "middle": middle,
+            "upper": upper,
+            "lower": lower,
+        }
+        self.state = {"gain": gain[-1:], "loss": loss[-1:], "fast": fast[-1:], "slow": slow[-1:]}
+        self.state = {name: value[0] if len(value) else np.nan for name, value in self.state.items()}
+
+    def last(self):
+        """Indicator name -> latest value."""
+        return {name: float(values[-1]) for name, values in self.values.items()}
+
+    def copy(self):
+        other = Indicators.__new__(Indicators)
+        other.closes = self.closes
+        other.values = dict(self.values)
+        other.state = dict(self.state)
+        return other
+
+    def extend(self, closes):
+        """Append new close prices, updating every indicator in place."""
+        if not len(closes):
+            return self
+        previous = len(self.closes)
+        self.closes = np.concatenate((self.closes, np.asarray(closes, dtype=np.float64)))
+        # the recursions start from seeded values, series shorter than that are recomputed (they are cheap)
+        fast_period, slow_period, signal_period = MACD_PERIODS
+        if previous < max(slow_period + signal_period - 1, EMA_PERIOD, SMA_PERIOD, BOLLINGER_PERIOD, RSI_PERIOD + 1):
+            self.compute()
+            return self
+
+        state, values = self.state, {name: [] for name in self.values}
+        last = {name: self.values[name][-1] for name in ("ema", "signal")}
+        for i in range(previous, len(self.closes)):
+            close = self.closes[i]
+            delta = close - self.closes[i - 1]
+            state["gain"] += (max(delta, 0.0) - state["gain"]) / RSI_PERIOD
+            state["loss"] += (max(-delta, 0.0) - state["loss"]) / RSI_PERIOD
+            state["fast"] += 2 / (fast_period + 1) * (close - state["fast"])
+            state["slow"] += 2 / (slow_period + 1) * (close - state["slow"])
+            last["ema"] += 2 / (EMA_PERIOD + 1) * (close - last["ema"])
+            line = state["fast"] - state["slow"]
+            last["signal"] += 2 / (signal_period + 1) * (line - last["signal"])
+            window = self.closes[i + 1 - BOLLINGER_PERIOD:i + 1]
+            middle, deviation = window.mean(), window.std()
+
+            values["sma"].append(self.closes[i + 1 - SMA_PERIOD:i + 1].mean())
+            values["ema"].append(last["ema"])
+            values["rsi"].append(float(relative_strength(state["gain"], state["loss"])))
+            values["macd"].append(line)
+            values["signal"].append(last["signal"])
+            values["histogram"].append(line - last["signal"])
+            values["middle"].append(middle)
+            values["upper"].append(middle + BOLLINGER_WIDTH * deviation)
+            values["lower"].append(middle - BOLLINGER_WIDTH * deviation)
+        self.values = {name: np.concatenate((self.values[name], new)) for name, new in values.items()}
+        return self
+
+
+class IndicatorEngine:
+    """
+    Memoized indicators of the kline series.
+
+    The indicators of the closed candles of each (symbol, interval) are kept
+    and extended when new candles close. The last candle is still open, its
+    close changes on every refresh, so the results are the closed indicators
+    extended by that one candle, memoized per (symbol, interval, last candle).
+    """
+    def __init__(self, size=KLINE_SERIES) -> None:
+        self.size = size
+        self.closed = OrderedDict()
+        self.results = {}
+        self.lock = threading.Lock()
+
+    def get(self, symbol, interval, times, closes):
+        """The Indicators of a kline series (open times and closes arrays, from the KlineStore), None if it is empty."""
+        if not len(times):
+            return None
+        series = (symbol, interval)
+        # the first candle and the length change when older history was loaded
+        key = (int(times[0]), len(times), int(times[-1]), float(closes[-1]))
+        with self.lock:
+            cached = self.results.get(series)
+            if cached and cached[0] == key:
+                return cached[1]
+
+            closed = self.closed.get(series)
+            count = len(closed[1]) if closed else 0
+            if closed and closed[0] == key[0] and count < len(times) and self.closed_open(closed, times):
+                indicators = closed[1].extend(closes[count:-1])
+            else:
+                indicators = Indicators(closes[:-1])
+            self.closed[series] = (key[0], indicators, int(times[-2]) if len(times) > 1 else None)
+            self.closed.move_to_end(series)
+            result = indicators.copy().extend(closes[-1:])
+            self.results[series] = (key, result)
+            while len(self.closed) > self.size:
+                evicted, _ = self.closed.popitem(last=False)
+                self.results.pop(evicted, None)
+            return result
+
+    @staticmethod
+    def closed_open(closed, times):
+        """Check the last closed candle of the memo is still at the same position of the series."""
+        _, indicators, last_open = closed
+        return last_open is None or times[len(indicators) - 1] == last_open
+
+
+engine = IndicatorEngine()
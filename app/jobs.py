@@ -0,0 +1,128 @@
+#Path: app/jobs.py
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from discord import app_commands
+from settings import JOB_WORKERS, JOB_TIMEOUT
+from utils import debug
+import metrics
+
+
+class JobFailed(app_commands.AppCommandError):
+    """A background job timed out, failed or was cancelled, the user was already told."""
+
+
+async def reply(interaction, content=None, embed=None):
+    """Answer an interaction, editing the deferred response if it was already acknowledged."""
+    if interaction.response.is_done():
+        await interaction.edit_original_response(content=content, embed=embed)
+    else:
+        await interaction.response.send_message(content=content, embed=embed, ephemeral=True)
+
+
+class JobRunner:
+    """
+    Runs the slow part of the slash commands, blocking functions on a bounded
+    thread pool (`run`) and upstream requests on the loop (`wait`).
+
+    The interaction is deferred first, so Discord's 3 seconds deadline is met
+    whatever the upstream does, and the original response is edited with the
+    progress and the result. Jobs above `timeout` are cancelled (the worker
+    thread can't be killed, its result is dropped) and the user is told, as
+    they are when the job raises.
+
+    Attributes:
+        executor (ThreadPoolExecutor): The worker pool, `workers` threads.
+        tasks (dict): Interaction id -> running job, used to cancel them.
+    """
+    def __init__(self, workers=JOB_WORKERS, timeout=JOB_TIMEOUT) -> None:
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self.timeout = timeout
+        self.tasks = {}
+        self.cancelled = set()
+        metrics.QUEUE_DEPTH.set_function(lambda: self.executor._work_queue.qsize(), "jobs")
+
+    async def defer(self, interaction, message=None):
+        """Acknowledge the interaction (shows "thinking...") and optionally show a progress message."""
+        if not interaction.response.is_done():
+            await interaction.response.defer(ephemeral=True, thinking=True)
+        if message:
+            await interaction.edit_original_response(content=message)
+
+    async def run(self, interaction, function, *args, progress=None, timeout=None, **kwargs):
+        """Run `function(*args, **kwargs)` on the pool after deferring the interaction.
+
+        Args:
+            interaction (discord.Interaction): The interaction the job answers.
+            function (callable): The blocking function.
+            progress (str, optional): Message shown while the job runs.
+            timeout (float, optional): Seconds before the job is cancelled, defaults to JOB_TIMEOUT.
+
+        Returns:
+            The result of the function.
+
+        Raises:
+            JobFailed: If the job timed out, raised or was cancelled.
+        """
+        async def job():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(function, *args, **kwargs))
+        return await self.__supervise(interaction, job(), getattr(function, "__name__", function), progress, timeout)
+
+    async def wait(self, interaction, coroutine, progress=None, timeout=None):
+        """Await `coroutine` on the loop after deferring the interaction, for the IO bound jobs.
+
+        The deferral, progress, timeout, cancel and errors are handled as in `run`.
+
+        Returns:
+            The result of the coroutine.
+
+        Raises:
+            JobFailed: If the job timed out, raised or was cancelled.
+        """
+        return await self.__supervise(interaction, coroutine, coroutine.__qualname__, progress, timeout)
+
+    async def __supervise(self, interaction, coroutine, name, progress, timeout):
+        try:
+            await self.defer(interaction, progress)
+        except BaseException:
+            coroutine.close()
+            raise
+        task = asyncio.ensure_future(asyncio.wait_for(coroutine, timeout or self.timeout))
+        self.tasks[interaction.id] = task
+        try:
+            return await task
+        except asyncio.TimeoutError:
+            debug(f"{name} timed out for {interaction.user}", function="JobRunner.run", type="ERROR")
+            await reply(interaction, "This is taking too long, try again later.")
+            raise JobFailed("timeout")
+        except asyncio.CancelledError:
+            if interaction.id not in self.cancelled:
+                raise
+            await reply(interaction, "Cancelled.")
+            raise JobFailed("cancelled")
+        except Exception as e:
+            debug(f"{name} failed for {interaction.user}: {type(e).__name__} {e}", function="JobRunner.run", type="ERROR")
+            await reply(interaction, "Something went wrong, try again later.")
+            raise JobFailed(f"failed: {type(e).__name__} {e}") from e
+        finally:
+            self.tasks.pop(interaction.id, None)
+            self.cancelled.discard(interaction.id)
+
+    def cancel(self, interaction_id):
+        """Cancel the job of an interaction, True if there was one."""
+        task = self.tasks.get(interaction_id)
+        if task is None:
+            return False
+        self.cancelled.add(interaction_id)
+        task.cancel()
+        return True
+
+    def shutdown(self):
+        for task in self.tasks.values():
+            task.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+jobs = JobRunner()
@@ -0,0 +1,83 @@
+#Path: app/launcher.py
+
+"""
+Runs the bot as several worker processes, each one owning a range of shards.
+
+Usage:
+    >>> python app/launcher.py --workers 2 --shards 4
+
+Workers share the user data through the store selected by SOA_STORE
+(sqlite by default here, or a redis:// url), worker 0 owns shard 0 and
+is the only one that syncs commands and posts patch notes.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from settings import METRICS_PORT
+
+MAIN_PATH = Path(__file__).parent / "main.py"
+
+
+def shard_config():
+    """Read the shards of this process from SOA_SHARD_IDS ('0-3' or '0,2') and SOA_SHARD_COUNT.
+
+    Returns:
+        tuple: (shard_ids, shard_count), (None, None) lets discord.py pick the shard count.
+    """
+    ids = os.getenv("SOA_SHARD_IDS")
+    count = os.getenv("SOA_SHARD_COUNT")
+    count = int(count) if count else None
+    if not ids:
+        return None, count
+    shard_ids = []
+    for part in ids.split(","):
+        start, _, end = part.partition("-")
+        shard_ids.extend(range(int(start), int(end or start) + 1))
+    return shard_ids, count
+
+def split_shards(shards, workers):
+    """Split range(shards) in `workers` contiguous ranges as even as possible."""
+    size, extra = divmod(shards, workers)
+    ranges, start = [], 0
+    for worker in range(workers):
+        end = start + size + (1 if worker < extra else 0)
+        ranges.append(range(start, end))
+        start = end
+    return [r for r in ranges if r]
+
+def spawn(worker, shard_ids, shards):
+    env = os.environ.copy()
+    env.setdefault("SOA_STORE", "sqlite")
+    env["SOA_SHARD_IDS"] = f"{shard_ids.start}-{shard_ids.stop - 1}"
+    env["SOA_SHARD_COUNT"] = str(shards)
+    env["SOA_METRICS_PORT"] = str(METRICS_PORT + worker)
+    print(f"worker {worker}: shards {env['SOA_SHARD_IDS']} of {shards}, metrics on {env['SOA_METRICS_PORT']}")
+    return subprocess.Popen([sys.executable, str(MAIN_PATH)], env=env)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the bot as sharded worker processes")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--shards", type=int, required=True)
+    args = parser.parse_args()
+
+    ranges = split_shards(args.shards, args.workers)
+    processes = {worker: spawn(worker, ids, args.shards) for worker, ids in enumerate(ranges)}
+    try:
+        while True:
+            time.sleep(5)
+            for worker, process in processes.items():
+                if process.poll() is not None:
+                    print(f"worker {worker} exited with {process.returncode}, restarting")
+                    processes[worker] = spawn(worker, ranges[worker], args.shards)
+    except KeyboardInterrupt:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,588 @@
+#Path: app/loadtest.py
+
+"""
+Offline load test of the slash commands.
+
+The command coroutines are called directly with fake interactions, the
+upstreams (Binance, Spotify, YouTube, tibiadata, axsddlr and imgur) are local
+aiohttp stubs answering generated payloads after `latency` seconds, so the
+whole run works without network or a Discord connection. The documents are
+copied to a temporary SOA_DATA_PATH, the real ones are never written.
+
+Usage:
+    >>> python app/benchmark.py load --requests 200 --concurrency 20
+    >>> python app/benchmark.py load --commands price,char --latency 0.05
+    >>> python app/benchmark.py load --fixtures app/fixtures --latency-scale 0.5
+
+With --fixtures the upstreams that have recordings (see fixtures.py) are
+replayed instead of stubbed, with their recorded latencies.
+"""
+import asyncio
+import contextlib
+import itertools
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import types
+from pathlib import Path
+from types import SimpleNamespace
+from urllib.parse import urlparse, parse_qs
+from urllib.request import urlopen
+import discord
+from aiohttp import web
+
+APP_PATH = Path(__file__).parent
+DAY = 24 * 3600 * 1000
+
+
+class FakeResponse:
+    """interaction.response, answers are recorded on the interaction."""
+    def __init__(self, interaction) -> None:
+        self.interaction = interaction
+        self.done = False
+
+    def is_done(self):
+        return self.done
+
+    async def send_message(self, content=None, embed=None, **kwargs):
+        if self.done:
+            raise discord.InteractionResponded(self.interaction)
+        self.done = True
+        self.interaction.messages.append((content, embed))
+
+    async def defer(self, **kwargs):
+        if self.done:
+            raise discord.InteractionResponded(self.interaction)
+        self.done = True
+
+
+class FakeInteraction:
+    """The attributes of a discord.Interaction the commands use."""
+    ids = itertools.count(1)
+
+    def __init__(self, command, user, channel) -> None:
+        self.id = next(self.ids)
+        self.command = SimpleNamespace(name=command)
+        self.user = user
+        self.guild_id = user.guild.id
+        self.channel = channel
+        self.channel_id = channel.id
+        self.namespace = SimpleNamespace(game=None)
+        self.extras = {}
+        self.response = FakeResponse(self)
+        self.messages = []
+
+    async def edit_original_response(self, content=None, embed=None, **kwargs):
+        if not self.response.done:
+            raise RuntimeError("edit_original_response before the interaction was answered")
+        self.messages.append((content, embed))
+
+
+class FakeChannel:
+    def __init__(self, id, name="general") -> None:
+        self.id = id
+        self.name = name
+        self.sent = 0
+
+    def __str__(self):
+        return self.name
+
+    async def send(self, content=None, embed=None, **kwargs):
+        self.sent += 1
+
+
+class FakeVoiceClient:
+    def __init__(self, channel) -> None:
+        self.channel = channel
+        self.source = None
+
+    def play(self, source):
+        self.source = source
+
+    def is_playing(self):
+        return False
+
+    def is_paused(self):
+        return False
+
+    def pause(self):
+        pass
+
+    def resume(self):
+        pass
+
+    def stop(self):
+        self.source = None
+
+    async def disconnect(self, force=False):
+        pass
+
+
+class FakeVoiceChannel(FakeChannel):
+    async def connect(self):
+        return FakeVoiceClient(self)
+
+
+class FakeAudio:
+    """Stands for discord.FFmpegPCMAudio, the queue reads the path from its process arguments."""
+    def __init__(self, path, **kwargs) -> None:
+        self._process = SimpleNamespace(args=["ffmpeg", "-i", str(path)])
+
+
+class FakeMember:
+    def __init__(self, id, guild, roles, voice_channel) -> None:
+        self.id = id
+        self.name = f"user{id}"
+        self.guild = guild
+        self.roles = [SimpleNamespace(id=role) for role in roles]
+        self.voice = SimpleNamespace(channel=voice_channel)
+        self.display_avatar = "https://cdn.discordapp.com/embed/avatars/0.png"
+
+    def __str__(self):
+        return self.name
+
+
+class FakeClient:
+    def __init__(self) -> None:
+        self.channels = {}
+        self.user = SimpleNamespace(id=0, name="soa")
+
+    def get_channel(self, id):
+        return self.channels.setdefault(id, FakeChannel(id))
+
+    def get_user(self, id):
+        return None
+
+
+class FakeExchange:
+    """
+    Generated exchange info, tickers and klines of `count` USDT pairs (and BTC
+    and ETH), deterministic so two runs compare.
+    """
+    def __init__(self, count=300, seed=0) -> None:
+        rng = random.Random(seed)
+        self.prices = {"BTC": 65000.0, "ETH": 3500.0}
+        for i in range(count):
+            self.prices[f"TK{i}"] = 10 ** rng.uniform(-4, 3)
+        self.listed = int(time.time() * 1000) - 1500 * DAY
+        self.info = {"symbols": [{
+            "symbol": f"{token}USDT", "status": "TRADING", "baseAsset": token, "quoteAsset": "USDT",
+            "filters": [{"filterType": "PRICE_FILTER", "tickSize": "0.01" if price > 1 else "0.00000100"},
+                        {"filterType": "LOT_SIZE", "stepSize": "0.00010000"}]
+        } for token, price in self.prices.items()]}
+        self.changes = {token: rng.gauss(0, 5) for token in self.prices}
+
+    def ticker(self, symbol):
+        token = symbol[:-4]
+        price, change = self.prices[token], self.changes[token]
+        values = {"lastPrice": price, "openPrice": price / (1 + change / 100), "highPrice": price * 1.03,
+                  "lowPrice": price * 0.96, "prevClosePrice": price / (1 + change / 100), "weightedAvgPrice": price * 0.99,
+                  "priceChange": price - price / (1 + change / 100)}
+        ticker = {key: f"{value:.8f}" for key, value in values.items()}
+        ticker.update(symbol=symbol, priceChangePercent=f"{change:.3f}", volume=f"{price * 1e4:.4f}",
+                      quoteVolume=f"{price * price * 1e4:.2f}")
+        return ticker
+
+    def klines(self, symbol, interval, start=None, end=None, limit=500):
+        from settings import CHART_INTERVALS
+        step = CHART_INTERVALS.get(interval, DAY)
+        now = int(time.time() * 1000) // step * step
+        end = now if end is None else min(end, now)
+        if start is None:
+            start = end - (limit - 1) * step
+        # the first open time at or after `start`, nothing before the listing
+        start = -(-max(start, self.listed) // step) * step
+        base = self.prices[symbol[:-4]]
+        klines = []
+        for open_time in range(start, end + 1, step):
+            t = open_time / DAY
+            close = base * (1 + 0.3 * math.sin(t / 90) + 0.05 * math.sin(t * 1.7))
+            klines.append([open_time, f"{close * 0.99:.8f}", f"{close * 1.02:.8f}", f"{close * 0.97:.8f}", f"{close:.8f}",
+                           "1000.0", open_time + step - 1, "0", 100, "0", "0", "0"])
+            if len(klines) == limit:
+                break
+        return klines
+
+
+class Stub:
+    """
+    Local HTTP server standing for an upstream, every answer waits `latency`
+    seconds (with 20% jitter) first.
+
+    Args:
+        name (str): The upstream.
+        routes (list): (method, path, handler) with aiohttp handlers returning payloads.
+    """
+    def __init__(self, name, routes, latency=0.02, seed=0) -> None:
+        self.name = name
+        self.routes = routes
+        self.latency = latency
+        self.requests = 0
+        self.rng = random.Random(seed)
+        self.runner = None
+        self.url = None
+
+    def wrap(self, handler):
+        async def handle(request):
+            self.requests += 1
+            await asyncio.sleep(self.latency * self.rng.uniform(0.8, 1.2))
+            payload = await handler(request)
+            if isinstance(payload, web.StreamResponse):
+                return payload
+            return web.json_response(payload)
+        return handle
+
+    async def start(self):
+        app = web.Application()
+        for method, path, handler in self.routes:
+            app.router.add_route(method, path, self.wrap(handler))
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+        return self
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+def binance_routes(exchange):
+    async def exchange_info(request):
+        return exchange.info
+
+    async def ticker_24hr(request):
+        symbol = request.query.get("symbol")
+        if symbol:
+            return exchange.ticker(symbol)
+        return [exchange.ticker(entry["symbol"]) for entry in exchange.info["symbols"]]
+
+    async def ticker_price(request):
+        symbol = request.query["symbol"]
+        return {"symbol": symbol, "price": exchange.ticker(symbol)["lastPrice"]}
+
+    async def klines(request):
+        query = request.query
+        return exchange.klines(query["symbol"], query["interval"],
+                               start=int(query["startTime"]) if "startTime" in query else None,
+                               end=int(query["endTime"]) if "endTime" in query else None,
+                               limit=int(query.get("limit", 500)))
+
+    return [("GET", "/api/v3/exchangeInfo", exchange_info), ("GET", "/api/v3/ticker/24hr", ticker_24hr),
+            ("GET", "/api/v3/ticker/price", ticker_price), ("GET", "/api/v3/klines", klines)]
+
+
+def spotify_routes():
+    async def token(request):
+        return {"access_token": "stub", "token_type": "Bearer", "expires_in": 3600}
+
+    async def search(request):
+        query = request.query["q"]
+        return {"tracks": {"items": [{
+            "name": query.title(), "artists": [{"name": "Stub Artist"}], "external_urls": {"spotify": "https://open.spotify.com/track/stub"},
+            "album": {"name": "Stub Album", "images": [{"url": "https://i.scdn.co/image/stub"}], "release_date": "2020-01-01",
+                      "album_type": "album"},
+            "duration_ms": 215000, "explicit": False, "popularity": 50, "disc_number": 1,
+        }]}}
+
+    return [("POST", "/api/token", token), ("GET", "/v1/search", search)]
+
+
+def youtube_routes(size):
+    audio = bytes(size)
+
+    async def watch(request):
+        video = request.query["v"]
+        return {"title": f"Stub Song {video}", "author": "Stub Channel", "thumbnail_url": "https://i.ytimg.com/vi/stub/hq720.jpg",
+                "publish_date": "2020-01-01", "description": "Generated by the load test", "rating": None, "views": 1000}
+
+    async def download(request):
+        return web.Response(body=audio, content_type="audio/mpeg")
+
+    return [("GET", "/watch", watch), ("GET", "/audio/{video}", download)]
+
+
+def tibiadata_routes():
+    async def character(request):
+        name = request.match_info["name"]
+        return {"characters": {
+            "character": {"name": name.title(), "sex": "male", "vocation": "Knight", "level": 100, "world": "Antica",
+                          "residence": "Thais", "guild": {"name": "Stub Guild", "rank": "Member"}, "account_status": "Free Account"},
+            "deaths": [], "other_characters": [], "achievements": [], "account_badges": [],
+        }, "information": {"api_version": 3, "timestamp": "2024-01-01T00:00:00Z"}}
+
+    counter = itertools.count()
+
+    async def news(request):
+        n = next(counter)
+        return {"news": [{"id": n, "date": "2024-01-01", "news": f"Stub news {n}", "category": "development",
+                          "type": "news", "url": f"https://www.tibia.com/news/?id={n}"}]}
+
+    return [("GET", "/v3/character/{name}", character), ("GET", "/v3/news/archive", news)]
+
+
+def axsddlr_routes(games):
+    """Every patch notes feed answers a new update on each request, so each run posts them all."""
+    counter = itertools.count()
+
+    def item(n):
+        return {"id": n, "title": f"Stub patch {n}", "description": f"Patch notes {n}", "flair": "News",
+                "url": f"https://example.com/{n}", "url_path": f"/{n}", "thumbnail": "https://example.com/thumb.jpg",
+                "thumbnail_url": "https://example.com/thumb.jpg", "author": "Stub Author", "date": "2024-01-01T00:00:00"}
+
+    def handler(node):
+        async def feed(request):
+            update = item(next(counter))
+            if node == 1:
+                return {"data": {"segments": [update]}}
+            if node == 2:
+                return {"data": {"featured": [update]}}
+            return {"data": [update]}
+        return feed
+
+    return [("GET", game["path"], handler(game["node"])) for game in games if game.get("api") != "tibiadata"]
+
+
+def imgur_routes():
+    counter = itertools.count()
+
+    async def upload(request):
+        await request.read()
+        return {"data": {"link": f"https://i.imgur.com/stub{next(counter)}.png"}, "success": True}
+
+    return [("POST", "/3/image", upload)]
+
+
+def fake_pytube(base, downloaded):
+    """A pytube module whose YouTube objects read from the YouTube stub at `base`."""
+    class Stream:
+        def __init__(self, video) -> None:
+            self.video = video
+
+        def filter(self, **kwargs):
+            return self
+
+        def first(self):
+            return self
+
+        def download(self, output_path, filename):
+            os.makedirs(output_path, exist_ok=True)
+            path = os.path.join(output_path, filename)
+            with urlopen(f"{base}/audio/{self.video}", timeout=30) as response, open(path, "wb") as f:
+                shutil.copyfileobj(response, f)
+            downloaded.append(path)
+            return path
+
+    class YouTube:
+        def __init__(self, url) -> None:
+            self.video = parse_qs(urlparse(url).query)["v"][0]
+            with urlopen(f"{base}/watch?v={self.video}", timeout=30) as response:
+                info = json.load(response)
+            self.watch_url = url
+            self.title, self.author = info["title"], info["author"]
+            self.thumbnail_url, self.publish_date = info["thumbnail_url"], info["publish_date"]
+            self.description, self.rating, self.views = info["description"], info["rating"], info["views"]
+            self.streams = Stream(self.video)
+
+    module = types.ModuleType("pytube")
+    module.YouTube = YouTube
+    return module
+
+
+class LoadTest:
+    """
+    The bot components wired to the stubs, and the scenarios driving them.
+
+    Args:
+        data (Path): The temporary SOA_DATA_PATH, the documents were copied there.
+        latency (float): Seconds each stub waits before answering.
+        fixtures (Path, optional): Directory of recordings replayed instead of the stubs.
+        scale (float): Latency multiplier of the replayed recordings.
+    """
+    def __init__(self, data, latency=0.02, fixtures=None, scale=1.0, users=50, seed=0) -> None:
+        self.data = data
+        self.latency = latency
+        self.fixtures = fixtures
+        self.scale = scale
+        self.rng = random.Random(seed)
+        self.exchange = FakeExchange()
+        self.downloaded = []
+        self.guild = SimpleNamespace(id=1)
+        self.voice = FakeVoiceChannel(2, "music")
+        self.text = FakeChannel(3)
+        from settings import EDITORS
+        self.users = [FakeMember(1000 + i, self.guild, EDITORS[:1], self.voice) for i in range(users)]
+        self.stubs = {}
+
+    async def start(self):
+        import cripto, music, utils, webscrap
+        from net import http
+        from settings import PATCH_NOTES_DATA
+        games = [dict(game, filepath=self.data / "patchnotes" / Path(game["filepath"]).name) for game in PATCH_NOTES_DATA]
+        (self.data / "patchnotes").mkdir(exist_ok=True)
+        routes = {"binance": binance_routes(self.exchange), "spotify": spotify_routes(), "youtube": youtube_routes(256 * 1024),
+                  "tibiadata": tibiadata_routes(), "axsddlr": axsddlr_routes(games), "imgur": imgur_routes()}
+        replays = {}
+        if self.fixtures:
+            from fixtures import replay_servers
+            replays = replay_servers(self.fixtures, self.scale)
+        for name, upstream in routes.items():
+            server = replays.get(name) or Stub(name, upstream, self.latency)
+            self.stubs[name] = await server.start()
+
+        cripto.BINANCE_API = self.stubs["binance"].url
+        music.SPOTIFY_API = self.stubs["spotify"].url + "/v1"
+        music.SPOTIFY_TOKEN_URL = self.stubs["spotify"].url + "/api/token"
+        utils.IMGUR_UPLOAD_URL = self.stubs["imgur"].url + "/3/image"
+        webscrap.TIBIADATA_API = self.stubs["tibiadata"].url
+        webscrap.AXSDDLR_API = self.stubs["axsddlr"].url
+        webscrap.PATCH_NOTES_DATA = games
+        sys.modules["pytube"] = fake_pytube(self.stubs["youtube"].url, self.downloaded)
+        discord.FFmpegPCMAudio = FakeAudio
+        await http.start()
+
+        self.client = FakeClient()
+        self.cripto = cripto.CriptoCurrency(self.client)
+        self.cripto.plotpath_target = self.data
+        self.music = music.MusicPlayer(self.client)
+        self.music.voice_client = FakeVoiceClient(self.voice)
+        # a song is playing, /play only queues (the playback loop needs a real voice connection)
+        self.music.running = True
+        self.patchnotes = webscrap.PatchNotes(self.client)
+        from game import registry
+        self.games = registry.games()
+        await self.cripto.catalog.refresh()
+        self.tokens = [token for token in self.cripto.catalog.quotes if "USDT" in self.cripto.catalog.quotes[token]][:50]
+        return self
+
+    async def stop(self):
+        from net import http
+        await http.close()
+        for stub in self.stubs.values():
+            await stub.stop()
+        for path in self.downloaded:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+
+    def interaction(self, command):
+        return FakeInteraction(command, self.rng.choice(self.users), self.text)
+
+    async def cfg(self):
+        from commands import cfg
+        return await cfg(self.interaction("cfg"), self.rng.choice(self.games), self.rng.choice(("show", "show", "history")))
+
+    async def edit(self):
+        from commands import edit
+        from game import registry
+        game = self.rng.choice(self.games)
+        setting = self.rng.choice(registry.search_settings(game, "") or ["name"])
+        return await edit(self.interaction("edit"), game, setting, str(self.rng.randint(0, 100)))
+
+    async def price(self):
+        token = self.rng.choice(self.tokens)
+        return await self.cripto.price(self.interaction("price"), token, "USDT", self.rng.choice(("", "", "sma", "ema,bollinger")),
+                                       self.rng.choice(("1h", "1d")), self.rng.choice(("1m", "1y", "all")))
+
+    async def mycripto(self):
+        action = self.rng.choice(("", "add", "remove"))
+        return await self.cripto.mycripto(self.interaction("mycripto"), action, self.rng.choice(self.tokens[:20]),
+                                          "USDT", self.rng.uniform(0, 10))
+
+    async def play(self):
+        if len(self.music.queue) > 20:
+            self.music.queue.clear()
+        return await self.music.play(self.interaction("play"), f"https://www.youtube.com/watch?v=stub{self.rng.randrange(1000)}")
+
+    async def mqueue(self):
+        return await self.music.mqueue(self.interaction("mqueue"), self.rng.choice(("show", "show", "shuffle")))
+
+    async def musicinfo(self):
+        return await self.music.musicinfo(self.interaction("musicinfo"), f"stub song {self.rng.randrange(200)}")
+
+    async def char(self):
+        return await self.patchnotes.char(self.interaction("char"), f"stub knight {self.rng.randrange(200)}")
+
+    async def getLatestUpdates(self):
+        return await self.patchnotes.getLatestUpdates()
+
+    SCENARIOS = ("cfg", "edit", "price", "mycripto", "play", "mqueue", "musicinfo", "char", "getLatestUpdates")
+
+    async def run(self, scenario, requests, concurrency):
+        """Run a scenario `requests` times, `concurrency` at once.
+
+        A command returning False refused the request (validation, unknown
+        token), it is counted apart and its latency left out of the percentiles.
+
+        Returns:
+            tuple: (latencies in seconds of the served requests, errors, refused requests, wall time in seconds).
+        """
+        function = getattr(self, scenario)
+        latencies, errors = [], []
+        rejected = 0
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            nonlocal rejected
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    if await function() is False:
+                        rejected += 1
+                        return
+                except Exception as e:
+                    errors.append(e)
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        return latencies, errors, rejected, time.perf_counter() - start
+
+
+def percentile(samples, q):
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def report(scenario, latencies, errors, rejected, wall):
+    latencies = sorted(latencies) or [0.0]
+    print(f"{scenario:<17} n={len(latencies):<5} err={len(errors):<4} rej={rejected:<4} {len(latencies) / wall:>8.1f} req/s  "
+          f"p50={percentile(latencies, 0.5) * 1000:.1f}ms p95={percentile(latencies, 0.95) * 1000:.1f}ms "
+          f"p99={percentile(latencies, 0.99) * 1000:.1f}ms max={latencies[-1] * 1000:.1f}ms")
+    for error in {f"{type(e).__name__}: {e}" for e in errors}:
+        print(f"    {error[:160]}")
+
+
+async def main(scenarios, requests, concurrency, latency, fixtures=None, scale=1.0, verbose=False):
+    """Run the scenarios one after the other and print a line per scenario, returns False if any request failed."""
+    with tempfile.TemporaryDirectory(prefix="soa-load-") as data:
+        data = Path(data)
+        for document in (APP_PATH / "users").glob("*.json"):
+            shutil.copy(document, data)
+        os.environ["SOA_DATA_PATH"] = str(data)
+        if "store" in sys.modules:
+            raise RuntimeError("The load test must run before store is imported, the documents would be the real ones")
+
+        # the commands log through print, keep the report readable
+        output = sys.stdout if verbose else open(os.devnull, "w")
+        load = LoadTest(data, latency, fixtures, scale)
+        failed = False
+        try:
+            with contextlib.redirect_stdout(output):
+                await load.start()
+            for scenario in scenarios:
+                with contextlib.redirect_stdout(output):
+                    await load.run(scenario, min(requests, concurrency), concurrency)  # warm up
+                    result = await load.run(scenario, requests, concurrency)
+                report(scenario, *result)
+                failed |= bool(result[1])
+            print("upstream requests: " + ", ".join(f"{name} {stub.requests}" for name, stub in load.stubs.items()))
+        finally:
+            with contextlib.redirect_stdout(output):
+                await load.stop()
+            if output is not sys.stdout:
+                output.close()
+        return not failed
@@ -1,3 +1,6 @@
+import time
+STARTED = time.perf_counter()
+
 import discord
 import dotenv
 import os
@@ -8,20 +11,69 @@ from commands import help, cfg, edit, clear, invite
 from tester import Test
 from music import MusicPlayer
 from cripto import CriptoCurrency
-from settings import SOA, COMMANDS
+from alerts import AlertEngine
+from settings import COMMANDS, METRICS_PORT
+from launcher import shard_config
+from registration import CommandRegistrar
 from utils import debug
 from webscrap import PatchNotes
+from watchdog import watchdog
+from gateway import client_options, MessageLog
+from ratelimit import limiter
+from jobs import JobFailed
+from net import http
+import metrics
+
+STARTUP = metrics.registry.gauge("soa_startup_seconds", "Seconds from process start to the first on_ready.")
 
 #!TODO - > Move the data to a postgree database
 
-class Client(discord.Client):
+class Tree(app_commands.CommandTree):
+    """Command tree that stamps every interaction so the handling time can be measured
+    and refuses the ones above the rate limits."""
+    async def interaction_check(self, interaction):
+        if interaction.type is discord.InteractionType.autocomplete or interaction.command is None:
+            return True
+        refused = limiter.acquire(interaction)
+        if refused:
+            await interaction.response.send_message(refused, ephemeral=True)
+            return False
+        interaction.extras["started"] = time.perf_counter()
+        watchdog.attribute(interaction)
+        metrics.COMMANDS.inc(interaction.command.name)
+        return True
+
+    async def on_error(self, interaction, error):
+        limiter.release(interaction)
+        if interaction.command is not None:
+            metrics.COMMAND_ERRORS.inc(interaction.command.name)
+            observe_command(interaction, interaction.command)
+        if isinstance(error, JobFailed):
+            # the user was already told, no need for a traceback
+            debug(f"{interaction.command.name} job {error}", function="client.on_error", type="ERROR")
+            return
+        await super().on_error(interaction, error)
+
+def observe_command(interaction, command):
+    started = interaction.extras.get("started")
+    if started is not None:
+        metrics.COMMAND_LATENCY.observe(time.perf_counter() - started, command.name)
+
+class Client(discord.AutoShardedClient):
     def __init__(self) -> None:
-        intents = discord.Intents.all()
-        super().__init__(intents=intents)
-        self.guild = discord.Object(id=SOA) 
-        self.tree = app_commands.CommandTree(self)
+        message_log = MessageLog()
+        shard_ids, shard_count = shard_config()
+        super().__init__(shard_ids=shard_ids, shard_count=shard_count, **client_options(log_messages=message_log.enabled))
+        self.message_log = message_log
+        # the process owning shard 0 does the once per bot work (command sync, patch notes)
+        self.primary = shard_ids is None or 0 in shard_ids
+        self.tree = Tree(self)
+        self.registrar = CommandRegistrar(self.tree)
         self.patchnotes = PatchNotes(self)
         self.patchNotesLoop: asyncio.AbstractEventLoop = asyncio.new_event_loop()
+        self.ready_once = False
+        # coroutines run once per bot, by the primary worker, after the first on_ready
+        self.background = [self.patchNotesTask]
         
     async def update_presence(self):
         #!TODO -> https://qwertyquerty.github.io/pypresence/html/doc/presence.html#Presence
@@ -30,14 +82,34 @@ class Client(discord.Client):
 
     # setup slash commands
     async def setup_hook(self):
-        self.tree.copy_global_to(guild=self.guild)
-        await self.tree.sync(guild=self.guild)
+        await http.start()
+        if self.primary:
+            await self.registrar.sync()
+        else:
+            self.registrar.targets()
+        metrics.GATEWAY_LATENCY.set_function(lambda: self.latency)
+        self.metrics_runner = await metrics.start_server(port=int(os.getenv("SOA_METRICS_PORT", METRICS_PORT)))
+        self.loop.create_task(metrics.monitor_loop())
+        # on by default in debug mode, SOA_WATCHDOG=1 keeps it on in production
+        if os.getenv("SOA_DEBUG") == "1" or os.getenv("SOA_WATCHDOG") == "1":
+            watchdog.start()
+
+    async def close(self):
+        await super().close()
+        await http.close()
 
     async def on_ready(self):
         #change presence
         await self.change_presence(activity=discord.Activity(type=discord.ActivityType.listening, name=COMMANDS))
-        self.loop.create_task(self.patchNotesTask())
+        if self.primary and not self.ready_once:
+            for task in self.background:
+                self.loop.create_task(task())
         debug("Logged on as {0}!".format(self.user), function="client.on_ready")
+        if not self.ready_once:
+            self.ready_once = True
+            elapsed = time.perf_counter() - STARTED
+            STARTUP.set(elapsed)
+            debug(f"Time to ready {elapsed:.2f}s", function="client.on_ready", type="INFO")
         
     async def patchNotesTask(self):
         """Event that sends patch notes to a channel every setted interval"""
@@ -48,19 +120,24 @@ class Client(discord.Client):
             debug(f"Sleeping for {max_interval}s for next call for patch notes update...", function="client.patchNotesTask", type="INFO")
             await asyncio.sleep(max_interval)
             
+    async def on_app_command_completion(self, interaction, command):
+        limiter.release(interaction)
+        observe_command(interaction, command)
+
     async def on_message(self, message):
         # don't respond to ourselves
-        if message.author == self.user:
-            return
-        else:
-            debug(f"{message.channel} {message.author} {message.content}", function="client.on_message")
+        if message.author != self.user and self.message_log.wants(message):
+            self.message_log.log(message)
 
 class App:
     def __init__(self) -> None:
         self.client = Client()
         self.music_player = MusicPlayer(self.client)
         self.cripto = CriptoCurrency(self.client)
+        self.alerts = AlertEngine(self.client, self.cripto)
+        self.client.background.append(self.alerts.run)
         self.test = Test(self.client)
+        metrics.QUEUE_DEPTH.set_function(lambda: len(self.music_player.queue), "music")
         
         self.__setup()
 
@@ -91,6 +168,9 @@ class App:
         #Cripto Tree Commands
         self.client.tree.command()(self.cripto.price)
         self.client.tree.command()(self.cripto.mycripto)
+        self.client.tree.command()(self.cripto.market)
+        self.client.tree.command()(self.alerts.alert)
+        self.client.tree.command()(self.alerts.alerts)
         
         #Webscrap Tree Commands
         self.client.tree.command()(self.client.patchnotes.char)
@@ -0,0 +1,184 @@
+#Path: app/metrics.py
+
+import asyncio
+import math
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from aiohttp import web
+from settings import METRICS_HOST, METRICS_PORT, LATENCY_BUCKETS
+from utils import debug
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+def _number(value):
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonic counter, one value per label combination."""
+    kind = "counter"
+
+    def __init__(self, name, doc, labels=()):
+        self.name = name
+        self.doc = doc
+        self.labels = labels
+        self.values = defaultdict(float)
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] += amount
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield self.name, _labels(self.labels, labels), value
+
+
+class Gauge:
+    """Value that goes up and down, optionally read from a callback at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name, doc, labels=()):
+        self.name = name
+        self.doc = doc
+        self.labels = labels
+        self.values = {}
+        self.functions = {}
+
+    def set(self, value, *labels):
+        self.values[labels] = value
+
+    def set_function(self, function, *labels):
+        self.functions[labels] = function
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield self.name, _labels(self.labels, labels), value
+        for labels, function in self.functions.items():
+            try:
+                value = float(function())
+            except Exception:
+                value = float("nan")
+            yield self.name, _labels(self.labels, labels), value
+
+
+class Histogram:
+    """Cumulative histogram with fixed upper bounds."""
+    kind = "histogram"
+
+    def __init__(self, name, doc, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.doc = doc
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self.counts = {}
+        self.sums = defaultdict(float)
+
+    def observe(self, value, *labels):
+        counts = self.counts.get(labels)
+        if counts is None:
+            counts = self.counts[labels] = [0] * (len(self.buckets) + 1)
+        counts[bisect_left(self.buckets, value)] += 1
+        self.sums[labels] += value
+
+    def samples(self):
+        for labels, counts in self.counts.items():
+            total = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                total += count
+                le = _labels(self.labels + ("le",), labels + (_number(bound),))
+                yield f"{self.name}_bucket", le, total
+            yield f"{self.name}_sum", _labels(self.labels, labels), self.sums[labels]
+            yield f"{self.name}_count", _labels(self.labels, labels), total
+
+
+class Registry:
+    """Holds every metric of the process and renders the text exposition format."""
+    def __init__(self) -> None:
+        self.metrics = {}
+
+    def _register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, doc, labels=()):
+        return self._register(Counter(name, doc, labels))
+
+    def gauge(self, name, doc, labels=()):
+        return self._register(Gauge(name, doc, labels))
+
+    def histogram(self, name, doc, labels=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, doc, labels, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.doc}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+COMMANDS = registry.counter("soa_commands_total", "Slash commands invoked.", ("command",))
+COMMAND_ERRORS = registry.counter("soa_command_errors_total", "Slash commands that raised.", ("command",))
+COMMAND_LATENCY = registry.histogram("soa_command_latency_seconds", "Slash command handling time.", ("command",))
+UPSTREAM_LATENCY = registry.histogram("soa_upstream_latency_seconds", "Upstream API call time.", ("upstream",))
+UPSTREAM_ERRORS = registry.counter("soa_upstream_errors_total", "Upstream API calls that failed.", ("upstream",))
+QUEUE_DEPTH = registry.gauge("soa_queue_depth", "Items waiting in a queue.", ("queue",))
+GATEWAY_LATENCY = registry.gauge("soa_gateway_latency_seconds", "Discord gateway heartbeat latency.")
+LOOP_LAG = registry.gauge("soa_event_loop_lag_seconds", "Delay of the last event loop wake up.")
+
+
+@contextmanager
+def upstream(name):
+    """Time a call to an upstream API and count it as an error if it raises.
+
+    Example:
+        >>> with upstream("binance"):
+        ...     api.get_ticker(symbol="BTCUSDT")
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        UPSTREAM_ERRORS.inc(name)
+        raise
+    finally:
+        UPSTREAM_LATENCY.observe(time.perf_counter() - start, name)
+
+async def monitor_loop(interval=1.0):
+    """Measure how late the event loop wakes up from a sleep of `interval` seconds."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG.set(max(0.0, loop.time() - start - interval))
+
+async def start_server(host=METRICS_HOST, port=METRICS_PORT):
+    """Expose the registry on http://host:port/metrics
+
+    Returns:
+        web.AppRunner: The runner, call `cleanup()` on it to stop the server.
+    """
+    async def handle(request):
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    debug(f"Metrics available on http://{host}:{port}/metrics", function="metrics.start_server", type="INFO")
+    return runner
@@ -3,16 +3,17 @@
 import os
 import asyncio
 import random
+import time
+import aiohttp
 import discord
 from dotenv import load_dotenv
 from discord import app_commands
-from pytube import YouTube
 from pathlib import Path
-from spotipy import Spotify
-from spotipy.oauth2 import SpotifyClientCredentials
-from spotipy.exceptions import SpotifyException
 from settings import *
-from utils import debug, flagger, url_checker, filter_str, del_file
+from utils import debug, url_checker, filter_str, del_file
+from jobs import jobs, reply
+from net import http
+from cache import StaleCache, stale_note
 
 
 
@@ -81,8 +82,8 @@ class MusicPlayer:
         voice_client (discord.VoiceClient): The voice client object.
         running (bool): Indicates whether the music player is running or not.
         queue (list): The queue of music to be played.
-        __connected (bool): Indicates whether the music player is connected to Spotify or not.
-        __api (spotipy.Spotify): The Spotify API object.
+        __token (str): The Spotify access token (client credentials).
+        __expires (float): When the token expires (time.monotonic).
     """
 
     def __init__(self, client):
@@ -90,43 +91,51 @@ class MusicPlayer:
         self.voice_client = None
         self.running = False
         self.queue = []
-        self.__connected = False
-        self.__connect()
+        self.__token = None
+        self.__expires = 0
+        self.__searches = StaleCache("spotify", *SPOTIFY_CACHE)
 
-    def __connect(self):
+    async def __connect(self):
         """
-        Connects to the Spotify API using the provided client credentials.
+        Gets a Spotify access token with the client credentials, renewed a minute before it expires.
+        Called on the first search so the bot doesn't authenticate on startup.
         """
-        try:
-            load_dotenv()
-            auth = SpotifyClientCredentials(os.getenv("SI"), os.getenv("SS"))
-            self.__api = Spotify(auth_manager=auth)
-            self.__connected = True
-            debug("Spotify Connected", function="music.MusicPlayer.__connect")
-        except Exception as e:
-            debug(f'Spotify Connection Error {e}', function="music.MusicPlayer.__connect", type="ERROR")
-
-    def __getinfo(self, name):
+        if self.__token and time.monotonic() < self.__expires:
+            return
+        load_dotenv()
+        response = await http.post("spotify", SPOTIFY_TOKEN_URL, data={"grant_type": "client_credentials"},
+                                   auth=aiohttp.BasicAuth(os.getenv("SI") or "", os.getenv("SS") or ""))
+        self.__token = response["access_token"]
+        self.__expires = time.monotonic() + response.get("expires_in", 3600) - 60
+        debug("Spotify Connected", function="music.MusicPlayer.__connect")
+
+    async def __search(self, name):
+        await self.__connect()
+        return await http.get("spotify", SPOTIFY_API + "/search", params={"q": name, "limit": "1", "type": "track"},
+                              headers={"Authorization": f"Bearer {self.__token}"})
+
+    async def __getinfo(self, name):
         """
         Searches for a song on Spotify and returns the search results.
+        Searches are cached, when Spotify fails the last result of the query is served.
 
         Args:
             name (str): The name of the song to search for.
 
         Returns:
-            dict: The search results from Spotify.
+            tuple: (search results, age in seconds if they are stale else None), (None, None) on error.
         """
-        if not self.__connected:
-            self.__connect()
         try:
-            search = self.__api.search(q=name, limit=1, type='track')
-            return search
+            info, age, stale = await self.__searches.get(name.strip().lower(), lambda: self.__search(name))
+            return info, age if stale else None
         except Exception as e:
             debug(f'Spotify Search Error {e}', function="music.MusicPlayer.__getinfo", type="ERROR")
+            return None, None
 
-    async def download_music(self, url):
+    def download_music(self, url):
         """
-        Download a song from YouTube.
+        Download a song from YouTube, blocking, run it on the job pool.
+        pytube does its own urllib requests, it can't use the shared HTTP pool.
 
         Args:
             url (str): The URL of the song.
@@ -137,9 +146,11 @@ class MusicPlayer:
         """
         output_path = Path(__file__).parent / "music"
         try:
-            yt = YouTube(url)
-            filename = filter_str(yt.title) + ".mp3"
-            yt.streams.filter(only_audio=True).first().download(output_path=output_path, filename=filename)
+            from pytube import YouTube
+            with http.guard("youtube"):
+                yt = YouTube(url)
+                filename = filter_str(yt.title) + ".mp3"
+                yt.streams.filter(only_audio=True).first().download(output_path=output_path, filename=filename)
             music = Music(yt.title,
                           yt.author,
                           yt.watch_url,
@@ -249,8 +260,8 @@ class MusicPlayer:
         text_channel = interaction.channel
         music_info = ""
 
-        info = self.__getinfo(query)
-        if info is None:
+        info, age = await self.__getinfo(query)
+        if not info or not info['tracks']['items']:
             await interaction.response.send_message(SONG_NOT_FOUND, ephemeral=True)
             return False
         else:
@@ -274,7 +285,7 @@ class MusicPlayer:
 
             embed = discord.Embed(title="See below some interesting info!", description=music_info, color=0x00ff00)
             embed.set_thumbnail(url=image)
-            embed.set_footer(text=f"Requested by {interaction.user}")
+            embed.set_footer(text=f"Requested by {interaction.user}" + (f" | {stale_note(age)}" if age is not None else ""))
             await interaction.response.send_message(embed=embed, ephemeral=True)
             
             return True
@@ -322,27 +333,30 @@ class MusicPlayer:
         user = interaction.user
         debug(f"{user} requested to play {query}", function="music.MusicPlayer.play")
 
+        # Joining and downloading take longer than the interaction deadline
+        await jobs.defer(interaction, "Joining your voice channel...")
+
         # Try to join the voice channel
         await self.join(interaction)
 
         # Check if the user is in a voice channel
         if interaction.user.voice.channel != self.voice_client.channel:
-            await interaction.response.send_message(NOT_IN_YOUR_VOICE_CHANNEL, ephemeral=True)
+            await reply(interaction, NOT_IN_YOUR_VOICE_CHANNEL)
             debug(f"{user} is not in the voice channel", function="music.MusicPlayer.play", type="ERROR")
             return False
         
         # Check if the url is valid
         if not url_checker(query):
-            await interaction.response.send_message(ENTRY_NOT_URL, ephemeral=True)
+            await reply(interaction, ENTRY_NOT_URL)
             debug(f"{user} entered an invalid url {query}", function="music.MusicPlayer.play", type="ERROR")
             return False
         
         # Create the music object and download the song
-        music = await self.download_music(query)
+        music = await jobs.run(interaction, self.download_music, query, progress=f"Downloading {query}...")
         
         # Check if the song was downloaded
         if not music:
-            await interaction.response.send_message(SONG_NOT_VALID, ephemeral=True)
+            await reply(interaction, SONG_NOT_VALID)
             debug(f"{user} entered an invalid url {query}", function="music.MusicPlayer.play", type="ERROR")
             return False
         
@@ -367,7 +381,7 @@ class MusicPlayer:
         embed.add_field(name="Songs in queue", value=len(self.queue))
         embed.add_field(name="Queue", value="\n".join([f"{i+1}. **{song[1]}**" for i, song in enumerate(self.queue)]), inline=False)
         embed.set_footer(text=f"Requested by {interaction.user}")
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+        await reply(interaction, embed=embed)
         
         if self.running:
             return True
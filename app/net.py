@@ -0,0 +1,231 @@
+#Path: app/net.py
+
+import asyncio
+import random
+import time
+import aiohttp
+from contextlib import contextmanager
+from settings import HTTP_POLICIES, HTTP_DEFAULT_POLICY, HTTP_POOL_SIZE, HTTP_POOL_PER_HOST, HTTP_DNS_TTL, HTTP_KEEPALIVE
+from utils import debug
+from metrics import upstream
+import metrics
+
+BREAKER_STATE = metrics.registry.gauge("soa_circuit_open", "1 while the circuit breaker of an upstream is open.", ("upstream",))
+RETRIES = metrics.registry.counter("soa_upstream_retries_total", "Upstream requests retried.", ("upstream",))
+
+# answers worth retrying, everything else below 500 is the caller's fault
+RETRY_STATUSES = frozenset((408, 429, 500, 502, 503, 504))
+
+
+class UpstreamError(Exception):
+    """An upstream request failed, after the retries of its policy.
+
+    Attributes:
+        name (str): The upstream.
+        status (int or None): The HTTP status, None for connection errors and timeouts.
+    """
+    def __init__(self, name, message, status=None) -> None:
+        super().__init__(f"{name}: {message}")
+        self.name = name
+        self.status = status
+
+
+class CircuitOpen(UpstreamError):
+    """The upstream failed too many times in a row, requests fail fast until the cooldown ends."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive failures counter of an upstream.
+
+    After `threshold` failures in a row the circuit opens and every request
+    fails immediately for `cooldown` seconds. Then one request goes through
+    (half open), its success closes the circuit, its failure opens it again.
+    """
+    def __init__(self, name, threshold, cooldown) -> None:
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened = None
+        self.probing = False
+
+    @property
+    def state(self):
+        if self.opened is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened >= self.cooldown else "open"
+
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def success(self):
+        if self.opened is not None:
+            debug(f"{self.name} circuit closed", function="CircuitBreaker.success", type="INFO")
+        self.failures = 0
+        self.opened = None
+        self.probing = False
+        BREAKER_STATE.set(0, self.name)
+
+    def release(self):
+        """End a probe that neither succeeded nor failed (cancelled), the next call probes again."""
+        self.probing = False
+
+    def failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.opened is not None or self.failures >= self.threshold:
+            if self.opened is None:
+                debug(f"{self.name} circuit open after {self.failures} failures", function="CircuitBreaker.failure", type="ERROR")
+            self.opened = time.monotonic()
+            BREAKER_STATE.set(1, self.name)
+
+
+class HttpPool:
+    """
+    The HTTP client of every outbound integration.
+
+    One aiohttp session shares a connector with per host connection pools,
+    keep-alive and a DNS cache, so the calls to an upstream reuse their TLS
+    connections. Each upstream has a policy (HTTP_POLICIES, defaults in
+    HTTP_DEFAULT_POLICY): timeout, retries with exponential backoff and jitter,
+    and the threshold and cooldown of its circuit breaker, so one failing
+    upstream doesn't slow down the others.
+
+    Requests are coroutines awaited on the bot loop, the job pool only gets
+    the CPU work done with their results.
+    """
+    def __init__(self, policies=HTTP_POLICIES, default=HTTP_DEFAULT_POLICY) -> None:
+        self.policies = policies
+        self.default = default
+        self.session = None
+        self.breakers = {}
+
+    def policy(self, name):
+        return {**self.default, **self.policies.get(name, {})}
+
+    def breaker(self, name):
+        if name not in self.breakers:
+            policy = self.policy(name)
+            self.breakers[name] = CircuitBreaker(name, policy["threshold"], policy["cooldown"])
+        return self.breakers[name]
+
+    async def start(self):
+        """Create the session on the running loop, called on setup_hook."""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=HTTP_POOL_SIZE, limit_per_host=HTTP_POOL_PER_HOST,
+                                             ttl_dns_cache=HTTP_DNS_TTL, keepalive_timeout=HTTP_KEEPALIVE)
+            self.session = aiohttp.ClientSession(connector=connector)
+        return self
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def request(self, name, method, url, parse="json", **kwargs):
+        """Send a request to an upstream with its policy.
+
+        Args:
+            name (str): The upstream, selects the policy and the circuit breaker.
+            method (str): The HTTP method.
+            url (str): The URL.
+            parse (str, optional): "json" (default), "text" or "bytes".
+            **kwargs: Passed to aiohttp (params, data, json, headers, auth...).
+
+        Returns:
+            The parsed body.
+
+        Raises:
+            CircuitOpen: If the circuit of the upstream is open.
+            UpstreamError: If the request failed after the retries, or with a status that isn't retried.
+        """
+        if self.session is None or self.session.closed:
+            await self.start()
+        policy = self.policy(name)
+        breaker = self.breaker(name)
+        if not breaker.allow():
+            raise CircuitOpen(name, "circuit open")
+        # this call is the half open probe, it must end it even when cancelled
+        probe = breaker.probing
+
+        try:
+            timeout = aiohttp.ClientTimeout(total=policy["timeout"])
+            for attempt in range(policy["retries"] + 1):
+                delay = policy["backoff"] * 2 ** attempt * (0.5 + random.random())
+                try:
+                    with upstream(name):
+                        async with self.session.request(method, url, timeout=timeout, **kwargs) as response:
+                            if response.status in RETRY_STATUSES:
+                                retry_after = response.headers.get("Retry-After", "")
+                                if retry_after.isdigit():
+                                    delay = max(delay, int(retry_after))
+                                raise UpstreamError(name, f"{method} {url} answered {response.status}", response.status)
+                            if response.status >= 400:
+                                # the upstream is fine, the request isn't
+                                breaker.success()
+                                raise UpstreamError(name, f"{method} {url} answered {response.status}", response.status)
+                            if parse == "json":
+                                body = await response.json(content_type=None)
+                            elif parse == "text":
+                                body = await response.text()
+                            else:
+                                body = await response.read()
+                    breaker.success()
+                    return body
+                except UpstreamError as e:
+                    if e.status not in RETRY_STATUSES:
+                        raise
+                    error = e
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                    error = UpstreamError(name, f"{method} {url} failed: {type(e).__name__} {e}")
+                if attempt < policy["retries"]:
+                    RETRIES.inc(name)
+                    await asyncio.sleep(delay)
+            breaker.failure()
+            raise error
+        finally:
+            if probe:
+                breaker.release()
+
+    @contextmanager
+    def guard(self, name):
+        """The circuit breaker of an upstream around a call that doesn't go through the pool (a library doing its own requests).
+
+        Raises:
+            CircuitOpen: If the circuit of the upstream is open.
+
+        Example:
+            >>> with http.guard("youtube"):
+            ...     YouTube(url).streams
+        """
+        breaker = self.breaker(name)
+        if not breaker.allow():
+            raise CircuitOpen(name, "circuit open")
+        # this call is the half open probe, it must end it even when cancelled
+        probe = breaker.probing
+        try:
+            with upstream(name):
+                yield
+        except Exception:
+            breaker.failure()
+            raise
+        finally:
+            if probe:
+                breaker.release()
+        breaker.success()
+
+    async def get(self, name, url, **kwargs):
+        return await self.request(name, "GET", url, **kwargs)
+
+    async def post(self, name, url, **kwargs):
+        return await self.request(name, "POST", url, **kwargs)
+
+
+http = HttpPool()
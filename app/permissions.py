@@ -0,0 +1,77 @@
+#Path: app/permissions.py
+
+import time
+from settings import COMMAND_ROLES, PERMISSIONS_CHECK_INTERVAL
+from store import store
+from utils import debug
+
+
+class Permissions:
+    """
+    Role based permissions of the privileged commands.
+
+    The allowed roles of each command come from COMMAND_ROLES and can be
+    overridden per guild in the "permissions" store document
+    ({"<guild id>": {"<command>": [role ids]}}). The tables are precomputed as
+    frozensets and the commands are cached per (guild, set of roles), so a
+    check is a dict lookup. The roles come with each interaction, a role change
+    applies on the next command without the members intent (and its member
+    updates). The cache is dropped when the document is edited.
+    """
+    def __init__(self, defaults=COMMAND_ROLES) -> None:
+        self.defaults = {command: frozenset(roles) for command, roles in defaults.items()}
+        self.tables = {}
+        self.members = {}
+        self.overrides = {}
+        self.version = None
+        self.checked = 0
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        if not force and self.version is not None and now - self.checked < PERMISSIONS_CHECK_INTERVAL:
+            return
+        self.checked = now
+        version = store.version("permissions")
+        if version == self.version:
+            return
+        self.version = version
+        self.tables.clear()
+        self.members.clear()
+        self.overrides = store.load("permissions") or {}
+
+    def table(self, guild_id):
+        """Command -> frozenset of allowed role ids for a guild."""
+        if guild_id not in self.tables:
+            table = dict(self.defaults)
+            for command, roles in self.overrides.get(str(guild_id), {}).items():
+                table[command] = frozenset(roles)
+            self.tables[guild_id] = table
+        return self.tables[guild_id]
+
+    def effective(self, member):
+        """Frozenset of the privileged commands a member can use."""
+        role_ids = frozenset(role.id for role in member.roles)
+        key = (member.guild.id, role_ids)
+        commands = self.members.get(key)
+        if commands is None:
+            commands = frozenset(command for command, roles in self.table(member.guild.id).items() if roles & role_ids)
+            self.members[key] = commands
+        return commands
+
+    def allowed(self, member, command):
+        """Check if a member can use a privileged command, users outside a guild never can."""
+        if getattr(member, "guild", None) is None:
+            return False
+        self.refresh()
+        return command in self.effective(member)
+
+    def set_roles(self, guild_id, command, role_ids):
+        """Override the allowed roles of a command on a guild."""
+        self.refresh(force=True)
+        self.overrides.setdefault(str(guild_id), {})[command] = sorted(role_ids)
+        store.save("permissions", self.overrides)
+        self.refresh(force=True)
+        debug(f"{command} on {guild_id} allowed to {role_ids}", function="Permissions.set_roles", type="INFO")
+
+
+permissions = Permissions()
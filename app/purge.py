@@ -0,0 +1,154 @@
+#Path: app/purge.py
+
+import asyncio
+import re
+import time
+import discord
+from datetime import datetime, timedelta, timezone
+from settings import PURGE_SCAN_FACTOR, PURGE_SINGLE_DELAY
+from utils import debug
+
+# Discord refuses bulk deletes of messages older than 14 days, keep a margin
+BULK_MAX_AGE = timedelta(days=14) - timedelta(minutes=5)
+BULK_SIZE = 100
+
+
+def parse_bound(text):
+    """Parse a before/after argument, a message id or a YYYY-MM-DD[ HH:MM] date (UTC).
+
+    Returns:
+        discord.Object or datetime or None
+    """
+    if not text:
+        return None
+    text = text.strip()
+    if text.isdigit():
+        return discord.Object(id=int(text))
+    for fmt in ("%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(text, fmt).replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid date or message id: {text}")
+
+
+class Purge:
+    """
+    Deletes up to `limit` messages of a channel that match the filters.
+
+    The history is streamed, recent messages are deleted in bulk chunks of 100
+    as soon as a chunk is full and messages older than 14 days (which can't be
+    bulk deleted) fall back to single, throttled deletes. A clear stops after
+    `budget` seconds (single deletes take a second each) and sets `truncated`.
+
+    Attributes:
+        channel (discord.TextChannel): The channel to clean.
+        limit (int): Maximum number of messages to delete.
+        user (discord.Member, optional): Only delete messages from this user.
+        pattern (re.Pattern, optional): Only delete messages whose content matches.
+        before, after (optional): Message or datetime bounds passed to the history.
+        budget (float, optional): Seconds the clear may take, unlimited by default.
+        deleted (int): Messages deleted so far.
+        scanned (int): Messages read so far.
+        truncated (bool): Whether the clear stopped at the end of its budget.
+    """
+    running = set()
+
+    def __init__(self, channel, limit, user=None, pattern=None, before=None, after=None, budget=None) -> None:
+        self.channel = channel
+        self.limit = limit
+        self.user = user
+        self.pattern = re.compile(pattern, re.IGNORECASE) if pattern else None
+        self.before = before
+        self.after = after
+        self.deleted = 0
+        self.scanned = 0
+        self.failed = 0
+        self.deadline = None if budget is None else time.monotonic() + budget
+        self.truncated = False
+
+    @property
+    def expired(self):
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.truncated = True
+        return self.truncated
+
+    @property
+    def filtered(self):
+        return self.user is not None or self.pattern is not None
+
+    def matches(self, message):
+        if self.user is not None and message.author.id != self.user.id:
+            return False
+        if self.pattern is not None and not self.pattern.search(message.content):
+            return False
+        return True
+
+    async def run(self, progress=None):
+        """Delete the messages, `progress(purge)` is awaited after every chunk.
+
+        Returns:
+            int: Number of messages deleted.
+        """
+        if self.channel.id in Purge.running:
+            raise RuntimeError("A clear is already running on this channel")
+        Purge.running.add(self.channel.id)
+        try:
+            cutoff = discord.utils.utcnow() - BULK_MAX_AGE
+            # without filters every message matches, with filters read a bounded window
+            scan_limit = self.limit * PURGE_SCAN_FACTOR if self.filtered else self.limit
+            batch, old = [], []
+            matched = 0
+            async for message in self.channel.history(limit=scan_limit, before=self.before, after=self.after):
+                if self.expired:
+                    break
+                self.scanned += 1
+                if not self.matches(message):
+                    continue
+                matched += 1
+                if message.created_at < cutoff:
+                    old.append(message)
+                else:
+                    batch.append(message)
+                    if len(batch) == BULK_SIZE:
+                        await self.__bulk(batch, progress)
+                        batch = []
+                if matched >= self.limit:
+                    break
+            if batch:
+                await self.__bulk(batch, progress)
+            for message in old:
+                if self.expired:
+                    break
+                await self.__single(message)
+                if progress and self.deleted % 10 == 0:
+                    await progress(self)
+            if progress:
+                await progress(self)
+            return self.deleted
+        finally:
+            Purge.running.discard(self.channel.id)
+
+    async def __bulk(self, messages, progress):
+        try:
+            await self.channel.delete_messages(messages)
+            self.deleted += len(messages)
+        except discord.NotFound:
+            # someone else deleted one of them, retry one by one
+            for message in messages:
+                await self.__single(message)
+        if progress:
+            await progress(self)
+
+    async def __single(self, message):
+        try:
+            await message.delete()
+            self.deleted += 1
+        except discord.NotFound:
+            pass
+        except discord.Forbidden:
+            raise
+        except discord.HTTPException as e:
+            self.failed += 1
+            debug(f"Failed to delete {message.id}: {e}", function="Purge.single", type="ERROR")
+        await asyncio.sleep(PURGE_SINGLE_DELAY)
@@ -0,0 +1,106 @@
+#Path: app/ratelimit.py
+
+import time
+from settings import RATE_LIMITS, DEFAULT_RATE_LIMIT, GUILD_RATE_LIMIT, EXPENSIVE_COMMANDS, EXPENSIVE_CONCURRENCY
+import metrics
+
+LIMITED = metrics.registry.counter("soa_rate_limited_total", "Commands refused by the rate limiter.", ("command", "reason"))
+
+
+class TokenBucket:
+    """
+    Bucket of `capacity` tokens refilled at `rate` tokens per second.
+
+    Attributes:
+        rate (float): Tokens added per second.
+        capacity (float): Maximum tokens, the allowed burst.
+    """
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate, capacity) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, now=None):
+        """Take a token.
+
+        Returns:
+            float: 0 if a token was taken, otherwise the seconds until one is available.
+        """
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def full(self, now):
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class RateLimiter:
+    """
+    Per (user, command) and per guild token buckets, plus a global cap on how
+    many expensive commands run at the same time.
+
+    Buckets that refilled completely are dropped once the table grows past
+    `max_buckets`, a full bucket is the same as a missing one.
+    """
+    def __init__(self, limits=RATE_LIMITS, default=DEFAULT_RATE_LIMIT, guild=GUILD_RATE_LIMIT,
+                 expensive=EXPENSIVE_COMMANDS, concurrency=EXPENSIVE_CONCURRENCY, max_buckets=10000) -> None:
+        self.limits = limits
+        self.default = default
+        self.guild = guild
+        self.expensive = frozenset(expensive)
+        self.concurrency = concurrency
+        self.max_buckets = max_buckets
+        self.buckets = {}
+        self.active = 0
+
+    def bucket(self, key, limit):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= self.max_buckets:
+                self.prune()
+            bucket = self.buckets[key] = TokenBucket(*limit)
+        return bucket
+
+    def prune(self):
+        now = time.monotonic()
+        self.buckets = {key: bucket for key, bucket in self.buckets.items() if not bucket.full(now)}
+
+    def acquire(self, interaction):
+        """Check the limits of an interaction and take a concurrency slot for expensive commands.
+
+        Returns:
+            str or None: The reason the command was refused, None if it can run.
+        """
+        command = interaction.command.name
+        now = time.monotonic()
+        wait = self.bucket((interaction.user.id, command), self.limits.get(command, self.default)).take(now)
+        if wait:
+            LIMITED.inc(command, "user")
+            return f"You are using /{command} too fast, try again in {wait:.1f}s."
+        if interaction.guild_id is not None:
+            wait = self.bucket(("guild", interaction.guild_id), self.guild).take(now)
+            if wait:
+                LIMITED.inc(command, "guild")
+                return f"This server is using the bot too fast, try again in {wait:.1f}s."
+        if command in self.expensive:
+            if self.active >= self.concurrency:
+                LIMITED.inc(command, "busy")
+                return "The bot is busy right now, try again in a few seconds."
+            self.active += 1
+            interaction.extras["slot"] = True
+        return None
+
+    def release(self, interaction):
+        """Give back the concurrency slot of an interaction, if it took one."""
+        if interaction.extras.pop("slot", False):
+            self.active -= 1
+
+
+limiter = RateLimiter()
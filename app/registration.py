@@ -0,0 +1,82 @@
+#Path: app/registration.py
+
+import json
+import hashlib
+import discord
+from pathlib import Path
+from settings import COMMAND_GUILDS, GLOBAL_COMMANDS
+from utils import debug, load_json, save_json
+
+
+class CommandRegistrar:
+    """
+    Registers the slash commands on Discord only where they changed.
+
+    Every scope (global or one guild) has a hash of its command definitions stored
+    in users/commandsync.json, a scope is synced only when its hash differs from
+    the stored one. Guilds removed from the rollout list get their commands cleared.
+
+    Attributes:
+        tree (app_commands.CommandTree): The tree holding the global commands.
+        guilds (list): Guild ids that receive a guild scoped copy of the commands.
+        global_sync (bool): Whether the commands are also registered globally.
+    """
+    def __init__(self, tree, guilds=COMMAND_GUILDS, global_sync=GLOBAL_COMMANDS) -> None:
+        self.tree = tree
+        self.guilds = list(guilds)
+        self.global_sync = global_sync
+        self.path = Path(__file__).parent / "users" / "commandsync.json"
+
+    @staticmethod
+    def key(guild):
+        return "global" if guild is None else str(guild.id)
+
+    def scope_hash(self, guild=None):
+        """Hash of the commands registered on a scope, None is the global scope."""
+        payload = [command.to_dict() for command in self.tree.get_commands(guild=guild)]
+        payload.sort(key=lambda command: command["name"])
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def targets(self):
+        scopes = [discord.Object(id=guild_id) for guild_id in self.guilds]
+        for guild in scopes:
+            self.tree.copy_global_to(guild=guild)
+        if self.global_sync:
+            scopes.append(None)
+        return scopes
+
+    async def sync(self):
+        """Sync every changed scope and clear the ones no longer in the rollout.
+
+        Returns:
+            list: Keys of the scopes that were synced.
+        """
+        stored = load_json(self.path) if self.path.exists() else {}
+        stored = stored or {}
+        synced = []
+
+        scopes = self.targets()
+        for guild in scopes:
+            key = self.key(guild)
+            digest = self.scope_hash(guild)
+            if stored.get(key) == digest:
+                continue
+            await self.tree.sync(guild=guild)
+            stored[key] = digest
+            save_json(self.path, stored)
+            synced.append(key)
+
+        wanted = {self.key(guild) for guild in scopes}
+        for key in [key for key in stored if key not in wanted]:
+            guild = None if key == "global" else discord.Object(id=int(key))
+            self.tree.clear_commands(guild=guild)
+            await self.tree.sync(guild=guild)
+            del stored[key]
+            save_json(self.path, stored)
+            synced.append(key)
+
+        if synced:
+            debug(f"Synced commands on {synced}", function="CommandRegistrar.sync", type="INFO")
+        else:
+            debug("Commands unchanged, skipping tree sync", function="CommandRegistrar.sync", type="INFO")
+        return synced
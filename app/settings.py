@@ -17,8 +17,98 @@ MANOFMAYHEM_ID = 1105685490088288266
 
 PATCH_NOTES_CHANNEL = 853493671798505492
 
+# Roles allowed to use the privileged commands, overridable per guild in users/permissions.json
+EDITORS = (UNHOLY_ONES_ID, PRESIDENT_ID, VICE_PRESIDENT_ID, MANOFMAYHEM_ID, DEV_ID)
+COMMAND_ROLES = {
+    "edit": EDITORS,
+    "revert": EDITORS,
+    "clear": (PRESIDENT_ID, MANOFMAYHEM_ID, VICE_PRESIDENT_ID),
+    "test": (PRESIDENT_ID, VICE_PRESIDENT_ID),
+}
+PERMISSIONS_CHECK_INTERVAL = 5.0
+
+# Token buckets as (tokens per second, burst)
+RATE_LIMITS = {
+    "price": (1 / 10, 3),
+    "play": (1 / 5, 3),
+    "mycripto": (1 / 3, 5),
+    "market": (1 / 5, 3),
+    "char": (1 / 5, 3),
+    "alert": (1 / 5, 3),
+}
+DEFAULT_RATE_LIMIT = (1, 5)
+GUILD_RATE_LIMIT = (5, 30)
+# Commands that hold a slot of the global concurrency cap while running.
+# /play is left out because its handler keeps running while the queue plays.
+EXPENSIVE_COMMANDS = ("price", "mycripto", "char")
+EXPENSIVE_CONCURRENCY = 4
+
 INVITE = "https://discord.gg/kJ6vaJ9"
 
+# Guilds that get an instant, guild scoped copy of the slash commands.
+# GLOBAL_COMMANDS also registers them globally (takes up to an hour to propagate).
+COMMAND_GUILDS = [SOA]
+GLOBAL_COMMANDS = False
+
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+GAMECFG_CHECK_INTERVAL = 1.0
+HISTORY_COMPACTION = 100
+HISTORY_ARCHIVE = 1000
+CFG_HISTORY_SIZE = 10
+
+PURGE_MAX = 1000
+PURGE_SCAN_FACTOR = 5
+PURGE_SINGLE_DELAY = 1.0
+# interaction tokens expire after 15 minutes, a clear stops in time to report
+PURGE_TIME_BUDGET = 12 * 60
+
+JOB_WORKERS = 4
+JOB_TIMEOUT = 120
+
+HTTP_POOL_SIZE = 100
+HTTP_POOL_PER_HOST = 10
+HTTP_DNS_TTL = 300
+HTTP_KEEPALIVE = 30
+HTTP_DEFAULT_POLICY = {"timeout": 10, "retries": 2, "backoff": 0.5, "threshold": 5, "cooldown": 30}
+HTTP_POLICIES = {
+    "binance": {"timeout": 10, "retries": 2},
+    "spotify": {"timeout": 10, "retries": 2},
+    "imgur": {"timeout": 30, "retries": 1},
+    "tibiadata": {"timeout": 15, "retries": 1},
+    "axsddlr": {"timeout": 15, "retries": 1},
+    "youtube": {"threshold": 3, "cooldown": 60},
+}
+# stale while revalidate caches of slow changing upstream answers: (ttl, max age) in seconds
+CHAR_CACHE = (300, 24 * 3600)
+SPOTIFY_CACHE = (3600, 7 * 24 * 3600)
+BINANCE_API = "https://api.binance.com"
+SPOTIFY_API = "https://api.spotify.com/v1"
+SPOTIFY_TOKEN_URL = "https://accounts.spotify.com/api/token"
+IMGUR_UPLOAD_URL = "https://api.imgur.com/3/image"
+TIBIADATA_API = "https://api.tibiadata.com"
+AXSDDLR_API = "https://api.axsddlr.xyz"
+
+WATCHDOG_THRESHOLD = 0.25
+WATCHDOG_INTERVAL = 0.1
+
+# Gateway intents and caches, SOA_INTENTS picks the profile
+INTENT_PROFILES = {
+    # every intent, the member, presence and message caches grow with the servers
+    "all": {"intents": "all", "member_cache": "intents", "max_messages": 1000, "chunk": True},
+    # what the features use: slash commands, voice for the music, message content for /clear pattern
+    "lean": {"intents": ("guilds", "voice_states", "message_content"), "member_cache": ("voice",), "max_messages": None, "chunk": False},
+    # /clear pattern can't read the messages
+    "minimal": {"intents": ("guilds", "voice_states"), "member_cache": ("voice",), "max_messages": None, "chunk": False},
+}
+DEFAULT_INTENT_PROFILE = "lean"
+# on_message logging, off by default: share of the messages logged (SOA_MESSAGE_LOG_SAMPLE) and channels
+# always logged. Either one adds the guild_messages intent, without them the gateway doesn't send the messages.
+MESSAGE_LOG_SAMPLE = 0.0
+MESSAGE_LOG_CHANNELS = ()
+
 ACCESS_DENIED = "Sorry but you dont have the roles to edit this setting."
 INVITE_TO_SERVER = "Here is the invite to the server: {0}"
 
@@ -43,6 +133,46 @@ SONG_NOT_VALID = "Your song was not validated to be processed!"
 ACTION_TXT = "The action you want to do on mycripto dashboard"
 TOKEN_TXT = "The token you want to check the price"
 PAIR_TXT = "The pair of the tokem you want to check the price"
+QUANTITY_TXT = "How much of the token you hold, used to value your portfolio"
+TICKER_TTL = 10
+TICKER_MAX_AGE = 60
+SYMBOL_CATALOG_TTL = 3600
+SYMBOL_CATALOG_MAX_AGE = 24 * 3600
+PRICE_KEYS = ("price", "priceChange", "lastPrice", "weightedAvgPrice", "openPrice", "prevClosePrice", "highPrice", "lowPrice")
+MARKET_TOP = 5
+MARKET_HEATMAP_SIZE = 20
+# 24h change % bins of the /market heatmap and their colors
+MARKET_HEATMAP_BINS = (-5, -1, 1, 5)
+MARKET_HEATMAP_COLORS = ("🟥", "🟧", "⬜", "🟦", "🟩")
+KLINE_TTL = 60
+KLINE_LIMIT = 1000
+KLINE_SERIES = 64
+# candles kept per series, a chart range needing more (warmup included) is drawn with a coarser interval
+KLINE_CANDLES = 4000
+SMA_PERIOD = 20
+EMA_PERIOD = 50
+RSI_PERIOD = 14
+MACD_PERIODS = (12, 26, 9)
+BOLLINGER_PERIOD = 20
+BOLLINGER_WIDTH = 2
+INDICATOR_OVERLAYS = ("sma", "ema", "bollinger")
+# interval -> milliseconds of a candle
+CHART_INTERVALS = {"1h": 3600000, "4h": 4 * 3600000, "1d": 24 * 3600000, "1w": 7 * 24 * 3600000}
+# candles loaded before the range so the indicators are warmed up at its beginning
+CHART_WARMUP = 100
+# range -> seconds of history, None is all time
+CHART_RANGES = {"1d": 86400, "1w": 7 * 86400, "1m": 30 * 86400, "3m": 90 * 86400, "1y": 365 * 86400, "all": None}
+# open time (ms) of the first Binance klines (July 2017), where the "all" range starts
+CHART_HISTORY_START = 1500000000000
+CHART_POINTS = 400
+CHART_DOWNSAMPLE = "lttb"
+CHART_SIZE = (8, 4.5)
+CHART_DPI = 100
+INTERVAL_TXT = "Candle interval of the chart: 1h, 4h, 1d or 1w"
+RANGE_TXT = "History shown on the chart: 1d, 1w, 1m, 3m, 1y or all"
+OVERLAYS_TXT = "Indicators drawn on the chart, comma separated: sma, ema, bollinger"
+ALERT_INTERVAL = 15
+ALERTS_PER_USER = 20
 BINANCE_PNG = "https://w7.pngwing.com/pngs/792/230/png-transparent-binance-macos-bigsur-icon.png"
 NO_PLOT_PNG = "https://upload.wikimedia.org/wikipedia/commons/d/d1/Image_not_available.png"
 NO_TOKENS_SAVED = """
@@ -68,13 +198,11 @@ CONFIG_HELP = """
 ```
 Your game is not supported yet. Please contact the developer to add support for your game.
 Try using the command like this (upper or lower case doenst matter):
-Example:  /config cs2
-          /config dota2
+Example:  /cfg cs2
+          /cfg dota2
 
 Games that are currently supported:
--CS2
--DOTA2
--TARKOV
+{0}
 ```
 """
 
@@ -84,11 +212,13 @@ HELP_MESSAGE = """
 **/help** - Displays this message
 **/join** - Joins the voice channel of the user who sent the interaction
 **/leave** - Leaves the voice channel of the user who sent the interaction
-**/clear [quantity]** - Clears a number of messages in the current channel
+**/clear [quantity] [user] [pattern] [before] [after]** - Clears a number of messages in the current channel
 **/invite** - Creates a invite to the server
 
 🎮 **GAMES COMMANDS**:
 **/cfg [game]** - Displays the best perfomance settings for a game
+**/cfg [game] history** - Displays the last changes of a game settings
+**/cfg [game] revert [change]** - Reverts a change of a game settings
 **/edit [game]** - Edit the best perfomance settings for a game
 **/char [name]** - Displays info about a character from tibia.com
 
@@ -102,9 +232,12 @@ HELP_MESSAGE = """
 **/resume** - Resumes the music
 
 🪙 **CRIPTO COMMANDS**:
-**/price [token] [pair]** - Check the current prices for a token and the plot graph
+**/price [token] [pair] [overlays] [interval] [range]** - Check the current prices for a token, its indicators and the plot graph
+**/market [quote]** - Top gainers, losers and volume of a quote asset, with a heatmap
 **/mycripto** - Display all your saved tokens
-**/mycripto [action] [token] [pair]** - Manage your tokens, actions: **add, remove, clear**
+**/mycripto [action] [token] [pair] [quantity]** - Manage your tokens, actions: **add, remove, clear**
+**/alert [token] [pair] [above|below] [price]** - Get a DM when a token crosses a price
+**/alerts** - List your alerts, **/alerts remove [number]** to remove one
 """
 
 TIBIA_PNG = "https://p1.hiclipart.com/preview/30/103/592/tibia-ico-tibia-render-style-png-clipart.jpg"
@@ -265,7 +398,8 @@ PATCH_NOTES_DATA = [
             {
                 "name": "Tibia Notice",
                 "color": 0xFFA500,
-                "path": "https://api.tibiadata.com/v3/news/archive",
+                "api": "tibiadata",
+                "path": "/v3/news/archive",
                 "filepath": PN_PATH / "tibia.json",
                 "node": 3,
                 "mapping": {
@@ -0,0 +1,203 @@
+#Path: app/store.py
+
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from dotenv import load_dotenv
+from utils import debug
+
+# SOA_DATA_PATH moves the documents (and the config history) out of the source tree
+USERS_PATH = Path(os.getenv("SOA_DATA_PATH") or Path(__file__).parent / "users")
+
+
+class JsonStore:
+    """
+    Documents stored as users/<name>.json, the single process default.
+
+    Saves hold an exclusive lock on users/<name>.lock, so the compare and set
+    of `save_if` holds between threads and worker processes. The version of a
+    document is a save counter (users/<name>.version) with the mtime and size
+    of its file, two saves of the same size never share a version and a hand
+    edit still changes it.
+    """
+    def __init__(self, path=USERS_PATH) -> None:
+        self.path = Path(path)
+
+    def file(self, name):
+        return self.path / f"{name}.json"
+
+    @contextmanager
+    def lock(self, name):
+        with open(self.path / f"{name}.lock", "a+") as f:
+            try:
+                import fcntl
+                fcntl.flock(f, fcntl.LOCK_EX)
+            except ImportError:
+                # windows, lock the first byte
+                import msvcrt
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            # closing the file releases the lock
+            yield
+
+    def load(self, name):
+        """Load a document, None if it doesn't exist."""
+        try:
+            with open(self.file(name), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, name, data, sort_keys=False):
+        with self.lock(name):
+            self.__write(name, data, sort_keys)
+
+    def save_if(self, name, data, expected, sort_keys=False):
+        """Save only if the document is still at version `expected`.
+
+        Returns:
+            The new version, None if the document changed (every backend).
+        """
+        with self.lock(name):
+            if self.version(name) != expected:
+                return None
+            self.__write(name, data, sort_keys)
+            return self.version(name)
+
+    def __write(self, name, data, sort_keys):
+        """Replace the document and bump its counter, the lock is held."""
+        temp = self.file(name).with_suffix(".tmp")
+        with open(temp, "w") as f:
+            json.dump(data, f, indent=4, sort_keys=sort_keys)
+        counter = self.path / f"{name}.version"
+        with open(counter.with_suffix(".vtmp"), "w") as f:
+            f.write(str(self.__counter(name) + 1))
+        os.replace(counter.with_suffix(".vtmp"), counter)
+        os.replace(temp, self.file(name))
+
+    def __counter(self, name):
+        try:
+            return int((self.path / f"{name}.version").read_text() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def version(self, name):
+        try:
+            stat = self.file(name).stat()
+        except FileNotFoundError:
+            return 0
+        return (self.__counter(name), stat.st_mtime_ns, stat.st_size)
+
+
+class SqliteStore:
+    """
+    Documents stored in a local SQLite database shared by every worker process.
+
+    Missing documents are seeded from users/<name>.json so switching backends
+    keeps the current data. The version is a counter bumped on every save.
+    """
+    def __init__(self, path=USERS_PATH / "soa.db") -> None:
+        self.path = str(path)
+        self.seed = JsonStore()
+        self.local = threading.local()
+        with self.connection() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS documents (name TEXT PRIMARY KEY, data TEXT NOT NULL, version INTEGER NOT NULL)")
+
+    def connection(self):
+        db = getattr(self.local, "db", None)
+        if db is None:
+            db = self.local.db = sqlite3.connect(self.path, timeout=10)
+            db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def load(self, name):
+        row = self.connection().execute("SELECT data FROM documents WHERE name = ?", (name,)).fetchone()
+        if row is not None:
+            return json.loads(row[0])
+        data = self.seed.load(name)
+        if data is not None:
+            self.save(name, data)
+        return data
+
+    def save(self, name, data, sort_keys=False):
+        with self.connection() as db:
+            db.execute("INSERT INTO documents (name, data, version) VALUES (?, ?, 1) "
+                       "ON CONFLICT(name) DO UPDATE SET data = excluded.data, version = version + 1",
+                       (name, json.dumps(data, sort_keys=sort_keys)))
+
+    def save_if(self, name, data, expected, sort_keys=False):
+        with self.connection() as db:
+            if expected == 0:
+                cursor = db.execute("INSERT OR IGNORE INTO documents (name, data, version) VALUES (?, ?, 1)",
+                                    (name, json.dumps(data, sort_keys=sort_keys)))
+            else:
+                cursor = db.execute("UPDATE documents SET data = ?, version = version + 1 WHERE name = ? AND version = ?",
+                                    (json.dumps(data, sort_keys=sort_keys), name, expected))
+        # only this write could move the version from `expected`
+        return expected + 1 if cursor.rowcount == 1 else None
+
+    def version(self, name):
+        row = self.connection().execute("SELECT version FROM documents WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+
+class RedisStore:
+    """
+    Documents stored in Redis under soa:<name>, for workers spread over several hosts.
+    """
+    def __init__(self, url) -> None:
+        import redis
+        self.db = redis.Redis.from_url(url)
+        self.seed = JsonStore()
+
+    def load(self, name):
+        raw = self.db.get(f"soa:{name}")
+        if raw is not None:
+            return json.loads(raw)
+        data = self.seed.load(name)
+        if data is not None:
+            self.save(name, data)
+        return data
+
+    def save(self, name, data, sort_keys=False):
+        pipe = self.db.pipeline()
+        pipe.set(f"soa:{name}", json.dumps(data, sort_keys=sort_keys))
+        pipe.incr(f"soa:{name}:version")
+        pipe.execute()
+
+    def save_if(self, name, data, expected, sort_keys=False):
+        import redis
+        with self.db.pipeline() as pipe:
+            try:
+                pipe.watch(f"soa:{name}:version")
+                if int(pipe.get(f"soa:{name}:version") or 0) != expected:
+                    return None
+                pipe.multi()
+                pipe.set(f"soa:{name}", json.dumps(data, sort_keys=sort_keys))
+                pipe.incr(f"soa:{name}:version")
+                return pipe.execute()[1]
+            except redis.WatchError:
+                return None
+
+    def version(self, name):
+        return int(self.db.get(f"soa:{name}:version") or 0)
+
+
+def open_store(kind=None):
+    """Open the store selected by SOA_STORE: 'json' (default), 'sqlite' or a redis:// url."""
+    load_dotenv()
+    kind = kind or os.getenv("SOA_STORE", "json")
+    if kind == "sqlite":
+        backend = SqliteStore()
+    elif kind.startswith("redis://") or kind.startswith("rediss://"):
+        backend = RedisStore(kind)
+    else:
+        backend = JsonStore()
+    debug(f"Using {backend.__class__.__name__}", function="store.open_store", type="INFO")
+    return backend
+
+
+store = open_store()
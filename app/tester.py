@@ -1,7 +1,8 @@
 import discord
 from discord import app_commands
 from settings import *
-from utils import debug, flagger
+from utils import debug
+from permissions import permissions
 
 class Test:
     """Test class for testing new commands"""
@@ -18,11 +19,7 @@ class Test:
     async def test(self, interaction):
         """Test command"""
 
-        user = interaction.user
-        roles = user.roles # cargos do user que chamou o comando
-        flag = flagger(roles, PRESIDENT_ID, VICE_PRESIDENT_ID) # check if user is president
-
-        if not flag:
+        if not permissions.allowed(interaction.user, "test"):
             await interaction.response.send_message("Only the president or devs can use this command :(", ephemeral=True)
             return
         
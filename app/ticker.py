@@ -0,0 +1,280 @@
+#Path: app/ticker.py
+
+import asyncio
+import time
+import numpy as np
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from settings import TICKER_TTL, TICKER_MAX_AGE, SYMBOL_CATALOG_TTL, SYMBOL_CATALOG_MAX_AGE, KLINE_TTL, KLINE_SERIES, KLINE_CANDLES
+from utils import PrefixIndex, debug
+
+
+class Refreshable(ABC):
+    """
+    Upstream data refreshed every `ttl` seconds, stale while revalidate.
+
+    Data older than the ttl but younger than `max_age` is served as is while a
+    background task refreshes it, so callers never wait for the upstream.
+    Older data is refreshed before answering, and if that fails (the upstream
+    is down, or its circuit is open and fails fast) the last good data is
+    served anyway. Only a first load can raise.
+
+    Subclasses implement the `load` coroutine, which fetches and replaces the
+    data. Concurrent callers wait for the same refresh task instead of sending
+    their own request, and a caller cancelled while waiting doesn't cancel it.
+    """
+    def __init__(self, ttl, max_age) -> None:
+        self.ttl = ttl
+        self.max_age = max_age
+        self.updated = None
+        self.task = None
+
+    @abstractmethod
+    async def load(self):
+        """Fetch the data and replace the current one."""
+
+    @property
+    def age(self):
+        """Seconds since the last successful load, inf before it."""
+        return float("inf") if self.updated is None else time.monotonic() - self.updated
+
+    @property
+    def stale(self):
+        return self.age > self.ttl
+
+    async def refresh(self):
+        if not self.stale:
+            return
+        if self.age <= self.max_age:
+            self.refresh_soon()
+            return
+        try:
+            await asyncio.shield(self.update())
+        except Exception as e:
+            if self.updated is None:
+                raise
+            debug(f"Serving {self.age:.0f}s old data, refresh failed {e}", function=f"{type(self).__name__}.refresh", type="ERROR")
+
+    def update(self):
+        """The running refresh task, started if there is none."""
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.__update())
+            self.task.add_done_callback(self.__done)
+        return self.task
+
+    def refresh_soon(self):
+        """Refresh stale data on a background task without waiting for it, call it on the loop."""
+        if self.stale:
+            self.update()
+
+    async def __update(self):
+        await self.load()
+        self.updated = time.monotonic()
+
+    def __done(self, task):
+        self.task = None
+        # retrieved here so a background refresh that nobody awaits doesn't warn
+        if not task.cancelled() and task.exception() is not None:
+            debug(f"Refresh failed {task.exception()}", function=f"{type(self).__name__}.update", type="ERROR")
+
+
+class TickerSnapshot(Refreshable):
+    """
+    Every 24h ticker of the exchange, fetched with a single request and shared
+    by all the commands for `ttl` seconds (stale while revalidate up to `max_age`).
+
+    Args:
+        fetch (callable): Coroutine function returning the list of 24h tickers (dicts with a "symbol" key).
+        ttl (float): Seconds a snapshot is served before it is refreshed.
+        max_age (float): Seconds a snapshot is served while it is refreshed in the background.
+    """
+    def __init__(self, fetch, ttl=TICKER_TTL, max_age=TICKER_MAX_AGE) -> None:
+        super().__init__(ttl, max_age)
+        self.fetch = fetch
+        self.tickers = {}
+
+    async def load(self):
+        self.tickers = {ticker["symbol"]: ticker for ticker in await self.fetch()}
+
+    async def get(self):
+        """Symbol -> 24h ticker, refreshed if older than the ttl."""
+        await self.refresh()
+        return self.tickers
+
+
+def step_decimals(step):
+    """Decimals of a tick or lot step given as a string, "0.01000000" -> 2."""
+    step = step.rstrip("0")
+    return len(step.split(".")[1]) if "." in step else 0
+
+
+def format_price(value, decimals=None):
+    """
+    Formats a price (float or numeric string) with a fixed number of decimals.
+
+    Without `decimals` (symbol unknown) values above 1 get 2 decimals and the
+    others 7, as the old Decimal quantize did.
+    """
+    value = float(value)
+    if decimals is None:
+        decimals = 2 if abs(value) > 1 else 7
+    return f"{value:.{decimals}f}"
+
+
+class SymbolCatalog(Refreshable):
+    """
+    The symbols traded on the exchange, indexed from one exchange info request.
+
+    Answers from memory whether a pair exists (O(1)), the quotes of a token and
+    the tokens of a quote (O(k)), the token autocomplete and the display
+    precision of each symbol (from its tick and lot size). The lookups only
+    read memory, callers await `refresh` first, which reloads the catalog
+    every `ttl` seconds, listings change a few times a week.
+
+    Args:
+        fetch (callable): Coroutine function returning the exchange info (a dict with a "symbols" list),
+            set by CriptoCurrency which owns the Binance client.
+        ttl (float): Seconds before the catalog is refreshed.
+        max_age (float): Seconds the catalog is served while it is refreshed in the background.
+    """
+    def __init__(self, fetch=None, ttl=SYMBOL_CATALOG_TTL, max_age=SYMBOL_CATALOG_MAX_AGE) -> None:
+        super().__init__(ttl, max_age)
+        self.fetch = fetch
+        self.symbols = {}
+        self.quotes = {}
+        self.bases = {}
+        self.precision = {}
+        self.index = PrefixIndex(())
+
+    async def load(self):
+        self.build(await self.fetch())
+
+    def build(self, info):
+        """Rebuild the indexes from an exchange info payload, only the symbols trading now are kept."""
+        symbols, quotes, bases, precision = {}, {}, {}, {}
+        for entry in info["symbols"]:
+            if entry.get("status", "TRADING") != "TRADING":
+                continue
+            base, quote = entry["baseAsset"], entry["quoteAsset"]
+            symbols[entry["symbol"]] = (base, quote)
+            filters = {f["filterType"]: f for f in entry.get("filters", ())}
+            precision[entry["symbol"]] = (
+                step_decimals(filters["PRICE_FILTER"]["tickSize"]) if "PRICE_FILTER" in filters else None,
+                step_decimals(filters["LOT_SIZE"]["stepSize"]) if "LOT_SIZE" in filters else None,
+            )
+            quotes.setdefault(base, []).append(quote)
+            bases.setdefault(quote, []).append(base)
+        self.symbols = symbols
+        self.precision = precision
+        self.quotes = {base: tuple(sorted(q)) for base, q in quotes.items()}
+        self.bases = {quote: tuple(sorted(b)) for quote, b in bases.items()}
+        self.index = PrefixIndex(self.quotes)
+
+    def exists(self, token, pair):
+        return f"{token}{pair}".upper() in self.symbols
+
+    def pairs(self, token):
+        """The symbols with `token` as base asset."""
+        token = token.upper()
+        return [token + quote for quote in self.quotes.get(token, ())]
+
+    def tokens(self, pair):
+        """The symbols with `pair` as quote asset."""
+        pair = pair.upper()
+        return [base + pair for base in self.bases.get(pair, ())]
+
+    def decimals(self, symbol):
+        """(price decimals, quantity decimals) of a symbol from its tick and lot size, None when unknown."""
+        return self.precision.get(symbol.upper(), (None, None))
+
+    def search_tokens(self, text, limit=25):
+        return self.index.search(text, limit)
+
+    def search_pairs(self, token, text, limit=25):
+        text = text.strip().upper()
+        return [quote for quote in self.quotes.get(token.upper(), ()) if quote.startswith(text)][:limit]
+
+
+def kline_columns(klines):
+    """(open times, closes) arrays of klines as returned by the Binance API, int64 ms and float64."""
+    return (np.fromiter((kline[0] for kline in klines), dtype=np.int64, count=len(klines)),
+            np.array([kline[4] for kline in klines], dtype=np.float64))
+
+
+class KlineStore:
+    """
+    The kline history of the most recently used (symbol, interval) series.
+
+    A series is kept as two numpy arrays, the open times and the closes, the
+    only columns the charts use, and cut to its last `candles` candles. It is
+    downloaded once, after `ttl` seconds a refresh only asks for the candles
+    from the last one on (which was still open) and appends them. Asking for
+    older history than the series has downloads only the missing older
+    candles. When a refresh fails the last good series is served. Each
+    refresh builds new arrays, callers can keep the ones they got.
+
+    Args:
+        fetch (callable): Coroutine function, fetch(symbol, interval, start=None, end=None) returns the klines
+            with open times between `start` and `end` (ms), the latest ones by default.
+        ttl (float): Seconds a series is served before it is refreshed.
+        size (int): Number of series kept, the least recently used are dropped.
+        candles (int): Candles kept per series, the oldest are dropped.
+    """
+    def __init__(self, fetch, ttl=KLINE_TTL, size=KLINE_SERIES, candles=KLINE_CANDLES) -> None:
+        self.fetch = fetch
+        self.ttl = ttl
+        self.size = size
+        self.candles = candles
+        self.series = OrderedDict()
+
+    async def get(self, symbol, interval, start=None):
+        """The klines of a series, refreshed if older than the ttl.
+
+        Args:
+            symbol (str): The symbol.
+            interval (str): The kline interval.
+            start (int, optional): Open time (ms) the series must go back to, within the last `candles` candles.
+
+        Returns:
+            tuple: (open times, closes) arrays, possibly starting before `start`.
+        """
+        key = (symbol, interval)
+        entry = self.series.get(key)
+        if entry:
+            self.series.move_to_end(key)
+        times, closes, updated, since = entry or (None, None, None, None)
+        # `since` is the oldest start asked for, the series may begin later when the symbol was listed after it
+        covered = entry is not None and (start is None or times[0] <= start or (since is not None and since <= start))
+        if covered and time.monotonic() - updated <= self.ttl:
+            return times, closes
+        if start is not None:
+            since = start if since is None else min(since, start)
+
+        try:
+            if entry:
+                if not covered:
+                    older_times, older_closes = kline_columns(await self.fetch(symbol, interval, start=start, end=int(times[0]) - 1))
+                    times, closes = np.concatenate((older_times, times)), np.concatenate((older_closes, closes))
+                new_times, new_closes = kline_columns(await self.fetch(symbol, interval, start=int(times[-1])))
+                if len(new_times):
+                    cut = int(np.searchsorted(times, new_times[0]))
+                    times, closes = np.concatenate((times[:cut], new_times)), np.concatenate((closes[:cut], new_closes))
+            else:
+                times, closes = kline_columns(await self.fetch(symbol, interval, start=start))
+        except Exception as e:
+            if not covered:
+                raise
+            # the last good series is better than no chart
+            debug(f"Serving stale {symbol} {interval} klines, refresh failed {e}", function="KlineStore.get", type="ERROR")
+            return entry[0], entry[1]
+
+        if not len(times):
+            return times, closes
+        if len(times) > self.candles:
+            times, closes = times[-self.candles:], closes[-self.candles:]
+            since = int(times[0])
+        self.series[key] = (times, closes, time.monotonic(), since)
+        self.series.move_to_end(key)
+        while len(self.series) > self.size:
+            self.series.popitem(last=False)
+        return times, closes
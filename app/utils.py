@@ -1,16 +1,18 @@
+import asyncio
 import json
 import functools
 import uuid
-import requests
 import os
 import logging
-import matplotlib.pyplot as plt
+import difflib
+from bisect import bisect_left
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from colorama import Fore, Style
 from urllib.parse import urlparse
 from pathlib import Path
 from collections import defaultdict
+from settings import CHART_SIZE, CHART_DPI, IMGUR_UPLOAD_URL
 
 def time_now():
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -48,23 +50,6 @@ def ddbug(func):
                 debug(f"-> {result}", function=func.__name__, type="ALERT")
     return wrapper
 
-def flagger(roles, *args):
-    """Check if user has the specified roles
-    
-    Args:
-        roles (list): list of ojebct roles of the user
-        *args (list): roles_ids to be checked
-        
-    Returns:
-        (bool): True if the user has the role, False if not
-    """
-    if not args:
-        return False
-    for role in roles:
-        if role.id in args:
-            return True
-    return False
-
 def load_json(path):
     """Load a json file
     
@@ -123,6 +108,68 @@ def filter_str(string):
         string = string.replace(char, "")
     return string
 
+class PrefixIndex:
+    """Case insensitive search over a set of names, used to answer autocompletes.
+
+    Prefix matches come from a sorted array (O(log n + k)), when they don't fill
+    the limit the result is completed with substring matches and then with
+    fuzzy matches ranked by similarity, so typos still get an answer.
+
+    Args:
+        names (iterable): Names to index, the original case is kept in the results.
+        aliases (iterable, optional): Extra (alias, name) pairs, typing the alias finds the name.
+    """
+    def __init__(self, names, aliases=()):
+        entries = {(name.lower(), name) for name in names}
+        entries.update((alias.lower(), name) for alias, name in aliases)
+        self.entries = sorted(entries)
+        self.keys = [key for key, _ in self.entries]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def search(self, text, limit=25):
+        """Return up to `limit` names matching `text`, best matches first."""
+        text = text.strip().lower()
+        found, seen = [], set()
+        if not text:
+            for _, name in self.entries:
+                if len(found) >= limit:
+                    break
+                if name not in seen:
+                    found.append(name)
+                    seen.add(name)
+            return found
+
+        start = bisect_left(self.keys, text)
+        for key, name in self.entries[start:]:
+            if not key.startswith(text):
+                break
+            if name not in seen:
+                found.append(name)
+                seen.add(name)
+        found.sort(key=len)
+        if len(found) >= limit:
+            return found[:limit]
+
+        for key, name in self.entries:
+            if len(found) >= limit:
+                return found
+            if text in key and name not in seen:
+                found.append(name)
+                seen.add(name)
+
+        close = set(difflib.get_close_matches(text, self.keys, n=limit, cutoff=0.5))
+        ranked = sorted((entry for entry in self.entries if entry[0] in close),
+                        key=lambda entry: -difflib.SequenceMatcher(None, text, entry[0]).ratio())
+        for _, name in ranked:
+            if len(found) >= limit:
+                break
+            if name not in seen:
+                found.append(name)
+                seen.add(name)
+        return found
+
 class ImageManager:
     """Class to upload images to imgur"""
     def __init__(self):
@@ -142,35 +189,58 @@ class ImageManager:
         Returns:
             (str): url to the image
         """
+        from net import http
         try:
             with open(path, "rb") as f:
-                r = requests.post("https://api.imgur.com/3/image", headers=self.api, data={"image": f.read()})
-                return r.json()["data"]["link"]
+                image = f.read()
+            response = await http.post("imgur", IMGUR_UPLOAD_URL, headers=self.api, data={"image": image})
+            return response["data"]["link"]
         except Exception as e:
             debug(f"failed with error {e}", function="ImageUploader.upload", type="ERROR")
             return False
         
-    async def plot(self, klines, title, x, y, path):
-        """Generate a plot and upload it to imgur
+    async def plot(self, times, closes, title, x, y, path, overlays=None):
+        """Generate a plot (on a worker thread) and upload it to imgur
 
         Args:
-            kline (list): list of klines
+            times (array): open times of the klines (ms)
+            closes (array): close prices of the klines
             title (str): title of the plot
             x (str): title of the x axis
             y (str): title of the y axis
             path (str): path where the image is going to be saved
+            overlays (dict, optional): label -> values aligned with the klines, or (upper, lower) for a band
 
         Returns:
             (str): url to the image
         """
-        closes = [float(entry[4]) for entry in klines]
-        plt.plot(closes)
-        plt.title(title)
-        plt.xlabel(x)
-        plt.ylabel(y)
-        plt.savefig(path)
-        plt.close()
+        await asyncio.to_thread(self.render, times, closes, title, x, y, path, overlays)
         return await self.upload(path)
+
+    def render(self, times, closes, title, x, y, path, overlays=None):
+        """Draw the close prices of the klines (by open time) and the overlays to a png.
+
+        Uses a Figure instead of pyplot, pyplot's global state is not thread safe.
+        The figure size is fixed, the callers bound the number of points.
+        """
+        from matplotlib.figure import Figure
+
+        dates = [datetime.fromtimestamp(open_time / 1000) for open_time in times.tolist()]
+        figure = Figure(figsize=CHART_SIZE, dpi=CHART_DPI)
+        axes = figure.subplots()
+        axes.plot(dates, closes, label="Close")
+        for label, values in (overlays or {}).items():
+            if isinstance(values, tuple):
+                axes.fill_between(dates, values[0], values[1], alpha=0.2, label=label)
+            else:
+                axes.plot(dates, values, linewidth=1, label=label)
+        if overlays:
+            axes.legend()
+        axes.set_title(title)
+        axes.set_xlabel(x)
+        axes.set_ylabel(y)
+        figure.autofmt_xdate()
+        figure.savefig(path)
     
 async def del_file(path):
     if os.path.exists(path):
@@ -0,0 +1,90 @@
+#Path: app/watchdog.py
+
+import asyncio
+import sys
+import threading
+import time
+import traceback
+import weakref
+from settings import WATCHDOG_THRESHOLD, WATCHDOG_INTERVAL
+from utils import debug
+import metrics
+
+BLOCKED = metrics.registry.counter("soa_loop_blocked_total", "Event loop stalls above the watchdog threshold.", ("command",))
+
+
+class Watchdog:
+    """
+    Detects callbacks that block the event loop.
+
+    A coroutine on the loop refreshes a heartbeat every `interval` seconds and a
+    daemon thread checks it. When the heartbeat is older than `threshold` the
+    thread captures the stack of the loop thread, which is exactly the code that
+    is blocking, and attributes it to the slash command whose task is running.
+
+    Attributes:
+        threshold (float): Seconds without a heartbeat before a stall is reported.
+        interval (float): Seconds between heartbeats and checks.
+        commands (WeakKeyDictionary): Task -> name of the command it is handling.
+    """
+    def __init__(self, threshold=WATCHDOG_THRESHOLD, interval=WATCHDOG_INTERVAL) -> None:
+        self.threshold = threshold
+        self.interval = interval
+        self.commands = weakref.WeakKeyDictionary()
+        self.loop = None
+        self.loop_thread = None
+        self.beat = time.monotonic()
+        self.reported = False
+        self.running = False
+
+    def attribute(self, interaction):
+        """Remember which command the current task is running."""
+        task = asyncio.current_task()
+        if task is not None and interaction.command is not None:
+            self.commands[task] = interaction.command.name
+
+    def start(self):
+        """Start watching the running event loop."""
+        if self.running:
+            return
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        self.beat = time.monotonic()
+        self.running = True
+        self.loop.create_task(self.__heartbeat())
+        threading.Thread(target=self.__watch, name="loop-watchdog", daemon=True).start()
+        debug(f"Watching the event loop, threshold {self.threshold}s", function="Watchdog.start", type="INFO")
+
+    def stop(self):
+        self.running = False
+
+    async def __heartbeat(self):
+        while self.running:
+            now = time.monotonic()
+            stalled = now - self.beat
+            if self.reported:
+                debug(f"Event loop unblocked after {stalled:.3f}s", function="Watchdog.heartbeat", type="ALERT")
+                self.reported = False
+            self.beat = now
+            await asyncio.sleep(self.interval)
+
+    def __watch(self):
+        while self.running:
+            time.sleep(self.interval)
+            stalled = time.monotonic() - self.beat
+            if stalled > self.threshold and not self.reported:
+                self.reported = True
+                self.report(stalled)
+
+    def report(self, stalled):
+        """Log the stack of the blocked loop thread and the command responsible for it."""
+        frame = sys._current_frames().get(self.loop_thread)
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else "stack unavailable\n"
+        task = asyncio.current_task(self.loop)
+        command = self.commands.get(task, "none") if task is not None else "none"
+        BLOCKED.inc(command)
+        debug(f"Event loop blocked for {stalled:.3f}s+ in command '{command}' (task {task.get_name() if task else None}):\n{stack}",
+              function="Watchdog.report", type="ALERT")
+
+
+watchdog = Watchdog()
@@ -1,4 +1,3 @@
-import requests
 import json
 import discord
 import inspect
@@ -8,7 +7,9 @@ from discord import app_commands
 from settings import *
 from datetime import datetime
 from utils import debug, load_json, save_json, new_exist
-from requests.exceptions import JSONDecodeError
+from jobs import jobs, reply
+from net import http, UpstreamError
+from cache import StaleCache, stale_note
 
 class PatchNotes:
     """
@@ -29,14 +30,15 @@ class PatchNotes:
     def __init__(self, client) -> None:
         self.client = client
         self.channel = PATCH_NOTES_CHANNEL
+        self.characters = StaleCache("tibiadata", *CHAR_CACHE)
 
         
-    def getJsonUpdates(self, url):
+    async def getJsonUpdates(self, url):
+        name = "tibiadata" if url.startswith(TIBIADATA_API) else "axsddlr"
         try:
-            response = requests.get(url)
-            return response.json()
-        except JSONDecodeError:
-            debug(f"Error decoding json from {url}", function="PatchNotes.getJsonUpdates", type="ERROR")
+            return await http.get(name, url)
+        except UpstreamError as e:
+            debug(f"Error getting json from {url} {e}", function="PatchNotes.getJsonUpdates", type="ERROR")
             return None
 
     def pushUpdate(self,previous_update, new_update, path):
@@ -82,7 +84,7 @@ class PatchNotes:
             _type_: _description_
         """
 
-        json_response = self.getJsonUpdates(api)
+        json_response = await self.getJsonUpdates(api)
         
         if node == 0:
             new_update = json_response["data"][0]
@@ -125,10 +127,8 @@ class PatchNotes:
 
         for game in games:
             try:
-                if "https://api.tibiadata.com" in game["path"]:
-                    currentUpdate = await self.getUpdate(game["path"], game["filepath"], node=game["node"])
-                else:
-                    currentUpdate = await self.getUpdate("https://api.axsddlr.xyz" + game["path"], game["filepath"], node=game["node"])
+                api = TIBIADATA_API if game.get("api") == "tibiadata" else AXSDDLR_API
+                currentUpdate = await self.getUpdate(api + game["path"], game["filepath"], node=game["node"])
                     
                 
                 if not currentUpdate:
@@ -175,17 +175,23 @@ class PatchNotes:
     @app_commands.describe(name="Name of the character to get info")
     async def char(self, interaction, name:str):
         """Get character info from tibia.com"""
-        url = "https://api.tibiadata.com/v3/character/" + name
-        r = self.getJsonUpdates(url)
+        url = TIBIADATA_API + "/v3/character/" + name
+        await jobs.defer(interaction, f"Looking for {name} on tibia.com...")
+        try:
+            # served from the cache while tibiadata is slow or down
+            r, age, stale = await self.characters.get(name.strip().lower(), lambda: http.get("tibiadata", url))
+        except UpstreamError as e:
+            debug(f"Error getting json from {url} {e}", function="PatchNotes.char", type="ERROR")
+            r, age, stale = None, 0, False
         user = interaction.user
         
         if not r:
-            await interaction.response.send_message("Character not found", ephemeral=True)
+            await reply(interaction, "Character not found")
             debug(f"{user} Character {name} not found", function="PatchNotes.char", type="INFO")
             return
         data = r["characters"]
         if not data["character"]["name"]:
-            await interaction.response.send_message("Character not found", ephemeral=True)
+            await reply(interaction, "Character not found")
             debug(f"{user} Character {name} not found", function="PatchNotes.char", type="INFO")
             return
         
@@ -220,7 +226,7 @@ class PatchNotes:
             "thumbnail": {
                 "url": TIBIA_PNG},
             "footer" : {
-                "text": f"{TITLE} | {VERSION} | /char {name}",
+                "text": f"{TITLE} | {VERSION} | /char {name}" + (f" | {stale_note(age)}" if stale else ""),
                 }
         }
         
@@ -243,7 +249,7 @@ class PatchNotes:
                         
         
         debug(f"{user} Character {name} found", function="PatchNotes.char", type="INFO")
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+        await reply(interaction, embed=embed)
         
     
     